@@ -37,12 +37,14 @@ class PPO(Algo, Serializable):
         super(PPO, self).__init__(policy)
 
         self.recurrent = getattr(self.policy, 'recurrent', False)
+        num_minibatches = kwargs.get('num_minibatches', 1)
         if self.recurrent:
             backprop_steps = kwargs.get('backprop_steps', 32)
             self.optimizer = RL2FirstOrderOptimizer(learning_rate=learning_rate, max_epochs=max_epochs,
-                                                    backprop_steps=backprop_steps)
+                                                    backprop_steps=backprop_steps, num_minibatches=num_minibatches)
         else:
-            self.optimizer = FirstOrderOptimizer(learning_rate=learning_rate, max_epochs=max_epochs)
+            self.optimizer = FirstOrderOptimizer(learning_rate=learning_rate, max_epochs=max_epochs,
+                                                 num_minibatches=num_minibatches)
         self._optimization_keys = ['observations', 'actions', 'advantages', 'agent_infos']
         self.name = name
         self._clip_eps = clip_eps
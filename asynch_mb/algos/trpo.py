@@ -2,6 +2,7 @@ from asynch_mb.logger import logger
 from asynch_mb.algos.base import Algo
 from asynch_mb.optimizers.conjugate_gradient_optimizer import ConjugateGradientOptimizer
 import tensorflow as tf
+import time
 from collections import OrderedDict
 
 
@@ -13,6 +14,8 @@ class TRPO(Algo):
         policy (Policy): policy object
         name (str): tf variable scope
         step_size (int): trust region size for the meta policy optimization through TPRO
+        hvp_approach (str or obj): Hessian vector product approach of the conjugate gradient optimizer
+        in_graph_cg (bool): whether to run the conjugate gradient iterations inside the graph
         inner_type (str): One of 'log_likelihood', 'likelihood_ratio', 'dice', choose which inner update to use
         exploration (bool): whether to use E-MAML or MAML
         inner_lr (float) : gradient step size used for inner step
@@ -25,6 +28,8 @@ class TRPO(Algo):
             *args,
             name="trpo",
             step_size=0.01,
+            hvp_approach='finite_difference',
+            in_graph_cg=False,
             **kwargs
             ):
         super(TRPO, self).__init__(*args, **kwargs)
@@ -36,7 +41,7 @@ class TRPO(Algo):
         self.name = name
         self._optimization_keys = ['observations', 'actions', 'advantages', 'agent_infos']
 
-        self.optimizer = ConjugateGradientOptimizer()
+        self.optimizer = ConjugateGradientOptimizer(hvp_approach=hvp_approach, in_graph_cg=in_graph_cg)
 
         self.build_graph()
 
@@ -106,7 +111,9 @@ class TRPO(Algo):
         loss_before = self.optimizer.loss(input_val_dict=input_dict)
         if verbose:
             logger.log("Optimizing")
+        time_optimize = time.time()
         self.optimizer.optimize(input_val_dict=input_dict)
+        time_optimize = time.time() - time_optimize
         if verbose:
             logger.log("Computing loss after")
         loss_after = self.optimizer.loss(input_val_dict=input_dict)
@@ -120,4 +127,5 @@ class TRPO(Algo):
 
             logger.logkv(prefix+'LossBefore', loss_before)
             logger.logkv(prefix+'LossAfter', loss_after)
-            logger.logkv(prefix+'dLoss', loss_before - loss_after)
\ No newline at end of file
+            logger.logkv(prefix+'dLoss', loss_before - loss_after)
+            logger.logkv(prefix+'TimeOptimize', time_optimize)
\ No newline at end of file
@@ -46,6 +46,20 @@ class Baseline():
         """
         raise NotImplementedError
 
+    def fit_predict(self, paths, target_key='returns'):
+        """
+        Fits the baseline model with the provided paths and predicts the reward baselines of the same paths
+
+        Args:
+            paths: list of paths
+            target_key (str): path dictionary key of the target that shall be fitted (e.g. "returns")
+
+        Returns: list with one numpy array of reward baselines per path
+
+        """
+        self.fit(paths, target_key=target_key)
+        return [self.predict(path) for path in paths]
+
     def log_diagnostics(self, paths, prefix):
         """
         Log extra information per iteration based on the collected paths
@@ -1,18 +1,32 @@
 from asynch_mb.baselines.base import Baseline
 from asynch_mb.utils.serializable import Serializable
+from asynch_mb.utils import utils
 import numpy as np
+import scipy.linalg
 
 
 class LinearBaseline(Baseline):
     """
     Abstract class providing the functionality for fitting a linear baseline
     Don't instantiate this class. Instead use LinearFeatureBaseline or LinearTimeBaseline
+
+    The features of all paths are computed in one vectorized pass and the damped normal equations are solved via
+    Cholesky factorization. If gram_decay > 0, the normal equations of the previous fits are kept as exponentially
+    decayed running sums, such that the baseline is fitted on a (down-weighted) stream of all past samples.
+
+    Args:
+        reg_coeff (float): regularization coefficient of the damped least squares
+        gram_decay (float): decay of the normal equations of the previous fits - 0 fits on the current paths only
     """
 
-    def __init__(self, reg_coeff=1e-5):
+    def __init__(self, reg_coeff=1e-5, gram_decay=0.):
         super(LinearBaseline, self).__init__()
+        assert 0 <= gram_decay < 1, 'gram_decay must be in [0,1)'
         self._coeffs = None
         self._reg_coeff = reg_coeff
+        self._gram_decay = gram_decay
+        self._gram = None
+        self._moment = None
 
     def predict(self, path):
         """
@@ -30,7 +44,7 @@ class LinearBaseline(Baseline):
         """
         if self._coeffs is None:
             return np.zeros(len(path["observations"]))
-        return self._features(path).dot(self._coeffs)
+        return self._paths_features([path]).dot(self._coeffs)
 
     def get_param_values(self, **tags):
         """
@@ -63,20 +77,52 @@ class LinearBaseline(Baseline):
         """
         assert all([target_key in path.keys() for path in paths])
 
-        featmat = np.concatenate([self._features(path) for path in paths], axis=0)
-        target = np.concatenate([path[target_key] for path in paths], axis=0)
+        self._fit(self._paths_features(paths), np.concatenate([path[target_key] for path in paths], axis=0))
+
+    def fit_predict(self, paths, target_key='returns'):
+        """
+        Fits the linear baseline model with the provided paths and predicts the reward baselines of the same paths,
+        reusing the feature matrix of the fit
+
+        Args:
+            paths (list): list of paths
+            target_key (str): path dictionary key of the target that shall be fitted (e.g. "returns")
+
+        Returns:
+            (list): list with one numpy array of reward baselines per path
+
+        """
+        assert all([target_key in path.keys() for path in paths])
+
+        featmat = self._paths_features(paths)
+        self._fit(featmat, np.concatenate([path[target_key] for path in paths], axis=0))
+        return utils.split_paths(featmat.dot(self._coeffs), [len(path["observations"]) for path in paths])
+
+    def _fit(self, featmat, target):
+        gram = featmat.T.dot(featmat)
+        moment = featmat.T.dot(target)
+        if self._gram_decay > 0 and self._gram is not None:
+            gram += self._gram_decay * self._gram
+            moment += self._gram_decay * self._moment
+        self._gram, self._moment = gram, moment
+
         reg_coeff = self._reg_coeff
         for _ in range(5):
-            self._coeffs = np.linalg.lstsq(
-                featmat.T.dot(featmat) + reg_coeff * np.identity(featmat.shape[1]),
-                featmat.T.dot(target),
-                rcond=-1
-            )[0]
-            if not np.any(np.isnan(self._coeffs)):
-                break
+            try:
+                cho_factor = scipy.linalg.cho_factor(gram + reg_coeff * np.identity(gram.shape[0]))
+                self._coeffs = scipy.linalg.cho_solve(cho_factor, moment)
+                if not np.any(np.isnan(self._coeffs)):
+                    break
+            except np.linalg.LinAlgError:
+                pass
             reg_coeff *= 10
 
-    def _features(self, path):
+    def _paths_features(self, paths):
+        _, time_steps = utils.path_indices([len(path["observations"]) for path in paths])
+        observations = np.concatenate([path["observations"] for path in paths], axis=0)
+        return self._features(observations, time_steps)
+
+    def _features(self, observations, time_steps):
         raise NotImplementedError("this is an abstract class, use either LinearFeatureBaseline or LinearTimeBaseline")
 
 
@@ -90,19 +136,17 @@ class LinearFeatureBaseline(LinearBaseline):
     reward = b0 + b1*obs + b2*obs^2 + b3*t + b4*t^2+  b5*t^3
 
     Args:
-        reg_coeff: list of paths
+        reg_coeff (float): regularization coefficient of the damped least squares
+        gram_decay (float): decay of the normal equations of the previous fits - 0 fits on the current paths only
 
     """
-    def __init__(self, reg_coeff=1e-5):
-        super(LinearFeatureBaseline, self).__init__()
-        self._coeffs = None
-        self._reg_coeff = reg_coeff
+    def __init__(self, reg_coeff=1e-5, gram_decay=0.):
+        super(LinearFeatureBaseline, self).__init__(reg_coeff=reg_coeff, gram_decay=gram_decay)
 
-    def _features(self, path):
-        obs = np.clip(path["observations"], -10, 10)
-        path_length = len(path["observations"])
-        time_step = np.arange(path_length).reshape(-1, 1) / 100.0
-        return np.concatenate([obs, obs ** 2, time_step, time_step ** 2, time_step ** 3, np.ones((path_length, 1))],
+    def _features(self, observations, time_steps):
+        obs = np.clip(observations, -10, 10)
+        time_step = time_steps.reshape(-1, 1) / 100.0
+        return np.concatenate([obs, obs ** 2, time_step, time_step ** 2, time_step ** 3, np.ones((len(obs), 1))],
                               axis=1)
 
 
@@ -119,9 +163,8 @@ class LinearTimeBaseline(LinearBaseline):
 
     """
 
-    def _features(self, path):
-        path_length = len(path["observations"])
-        time_step = np.arange(path_length).reshape(-1, 1) / 100.0
-        return np.concatenate([time_step, time_step ** 2, time_step ** 3, np.ones((path_length, 1))],
+    def _features(self, observations, time_steps):
+        time_step = time_steps.reshape(-1, 1) / 100.0
+        return np.concatenate([time_step, time_step ** 2, time_step ** 3, np.ones((len(time_steps), 1))],
                               axis=1)
 
@@ -162,6 +162,51 @@ class MLP(Layer):
                                     for var in trainable_policy_vars])
 
 
+class EnsembleMLP(Layer):
+    """
+    Ensemble of multi-layer perceptrons whose weights are stored as stacked (num_models, in, out) tensors.
+    All the members are evaluated together with one batched matmul per layer
+
+    Args:
+        name (str): name of the network used as tf variable scope
+        num_models (int): number of networks in the ensemble
+        input_dim (int): dimensionality of the input of each network
+        output_dim (int): dimensionality of the output of each network
+        hidden_sizes (tuple): tuple of integers specifying the hidden layer sizes of the MLP
+        hidden_nonlinearity (tf.op): nonlinearity function of the hidden layers
+        output_nonlinearity (tf.op or None): nonlinearity function of the output layer
+        input_var (tf.Tensor): input of shape (num_models, batch_size, input_dim)
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        # store the init args for serialization and call the super constructors
+        Serializable.quick_init(self, locals())
+        Layer.__init__(self, *args, **kwargs)
+        self.num_models = kwargs['num_models']
+
+        self.build_graph()
+
+    def build_graph(self):
+        """
+        Builds computational graph for the ensemble
+        """
+        self.input_var, self.output_var = create_ensemble_mlp(name='mlp',
+                                                              num_models=self.num_models,
+                                                              output_dim=self.output_dim,
+                                                              hidden_sizes=self.hidden_sizes,
+                                                              hidden_nonlinearity=self.hidden_nonlinearity,
+                                                              output_nonlinearity=self.output_nonlinearity,
+                                                              input_dim=(self.num_models, None, self.input_dim,),
+                                                              input_var=self.input_var,
+                                                              )
+
+        current_scope = self.name
+        trainable_vars = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope=current_scope)
+        self._params = OrderedDict([(remove_scope_from_name(var.name, current_scope), var)
+                                    for var in trainable_vars])
+
+
 class RNN(Layer):
     """
     Gaussian multi-layer perceptron policy (diagonal covariance matrix)
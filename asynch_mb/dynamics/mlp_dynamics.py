@@ -1,6 +1,7 @@
 # from asynch_mb.core import MLP
 from asynch_mb.dynamics.layers import MLP
 from asynch_mb.dynamics.utils import normalize, denormalize, train_test_split
+from asynch_mb.dynamics.replay_buffer import EnsembleReplayBuffer
 import tensorflow as tf
 import numpy as np
 from asynch_mb.utils.serializable import Serializable
@@ -49,6 +50,8 @@ class MLPDynamicsModel(Serializable):
 
         self._dataset_train = None
         self._dataset_test = None
+        self._buffer_train = None
+        self._buffer_test = None
         self.next_batch = None
 
         self.valid_split_ratio = valid_split_ratio
@@ -127,20 +130,13 @@ class MLPDynamicsModel(Serializable):
                                                                                              test_split_ratio=valid_split_ratio)
 
         if self._dataset_test is None:
-            self._dataset_test = dict(obs=obs_test, act=act_test, delta=delta_test)
-            self._dataset_train = dict(obs=obs_train, act=act_train, delta=delta_train)
-        else:
-            n_test_new_samples = len(obs_test)
-            n_max_test = self.buffer_size - n_test_new_samples
-            n_train_new_samples = len(obs_train)
-            n_max_train = self.buffer_size - n_train_new_samples
-            self._dataset_test['obs'] = np.concatenate([self._dataset_test['obs'][-n_max_test:], obs_test])
-            self._dataset_test['act'] = np.concatenate([self._dataset_test['act'][-n_max_test:], act_test])
-            self._dataset_test['delta'] = np.concatenate([self._dataset_test['delta'][-n_max_test:], delta_test])
-
-            self._dataset_train['obs'] = np.concatenate([self._dataset_train['obs'][-n_max_train:], obs_train])
-            self._dataset_train['act'] = np.concatenate([self._dataset_train['act'][-n_max_train:], act_train])
-            self._dataset_train['delta'] = np.concatenate([self._dataset_train['delta'][-n_max_train:], delta_train])
+            self._buffer_train = EnsembleReplayBuffer(1, self.buffer_size)
+            self._buffer_test = EnsembleReplayBuffer(1, self.buffer_size)
+
+        self._buffer_train.add(obs=[obs_train], act=[act_train], delta=[delta_train])
+        self._buffer_test.add(obs=[obs_test], act=[act_test], delta=[delta_test])
+        self._dataset_train = {key: value[0] for key, value in self._buffer_train.datasets().items()}
+        self._dataset_test = {key: value[0] for key, value in self._buffer_test.datasets().items()}
 
         # create data queue
         if self.next_batch is None:
@@ -153,8 +149,7 @@ class MLPDynamicsModel(Serializable):
         valid_loss_rolling_average = None
 
         if (self.normalization is None or compute_normalization) and self.normalize_input:
-            self.compute_normalization(self._dataset_train['obs'], self._dataset_train['act'],
-                                       self._dataset_train['delta'])
+            self.update_normalization()
 
         if self.normalize_input:
             # normalize data
@@ -293,11 +288,21 @@ class MLPDynamicsModel(Serializable):
         assert delta.ndim == 2 and delta.shape[0] == obs_next.shape[0]
 
         # store means and std in dict
-        self.normalization = OrderedDict()
-        self.normalization['obs'] = (np.mean(obs, axis=0), np.std(obs, axis=0))
-        self.normalization['delta'] = (np.mean(delta, axis=0), np.std(delta, axis=0))
-        self.normalization['act'] = (np.mean(act, axis=0), np.std(act, axis=0))
+        normalization = OrderedDict()
+        normalization['obs'] = (np.mean(obs, axis=0), np.std(obs, axis=0))
+        normalization['delta'] = (np.mean(delta, axis=0), np.std(delta, axis=0))
+        normalization['act'] = (np.mean(act, axis=0), np.std(act, axis=0))
+        self._assign_normalization(normalization)
+
+    def update_normalization(self):
+        """
+        Sets the normalization to the statistics of the current train buffer, which are maintained incrementally
+        by the buffer (no pass over the data)
+        """
+        self._assign_normalization(self._buffer_train.normalization()[0])
 
+    def _assign_normalization(self, normalization):
+        self.normalization = normalization
         sess = tf.get_default_session()
         sess.run(self._assignations, feed_dict={self._mean_obs_ph: self.normalization['obs'][0],
                                                 self._std_obs_ph: self.normalization['obs'][1],
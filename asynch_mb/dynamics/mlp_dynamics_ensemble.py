@@ -1,10 +1,11 @@
-from asynch_mb.dynamics.layers import MLP
+from asynch_mb.dynamics.layers import MLP, EnsembleMLP
 import tensorflow as tf
 import numpy as np
 from asynch_mb.utils.serializable import Serializable
 from asynch_mb.utils import compile_function
 from asynch_mb.logger import logger
 from asynch_mb.dynamics.mlp_dynamics import MLPDynamicsModel
+from asynch_mb.dynamics.replay_buffer import EnsembleReplayBuffer
 import time
 from collections import OrderedDict
 from asynch_mb.dynamics.utils import normalize, denormalize, train_test_split
@@ -13,6 +14,16 @@ from asynch_mb.dynamics.utils import tf_normalize, tf_denormalize
 class MLPDynamicsEnsemble(MLPDynamicsModel):
     """
     Class for MLP continous dynamics model
+
+    If fused is True, the weights of all the models are stored as stacked (num_models, in, out) tensors and each
+    layer of the ensemble is evaluated with a single batched matmul instead of num_models separate subgraphs.
+
+    If in_graph_data is True, the training buffer is kept in tf variables and the (per-model shuffled and
+    normalized) minibatches are produced in-graph, such that each training step is a single sess.run without
+    any host copies.
+
+    The train and test datasets of the models are stored in preallocated ring buffers (see EnsembleReplayBuffer),
+    which also keep track of the normalization statistics incrementally.
     """
 
     def __init__(self,
@@ -31,6 +42,8 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
                  rolling_average_persitency=0.99,
                  buffer_size=50000,
                  loss_str='MSE',
+                 fused=False,
+                 in_graph_data=False,
                  ):
 
         Serializable.quick_init(self, locals())
@@ -54,6 +67,11 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
         self.name = name
         self._dataset_train = None
         self._dataset_test = None
+        self._buffer_train = None
+        self._buffer_test = None
+        self.fused = fused
+        self.in_graph_data = in_graph_data
+        self._data_vars_stale = False
 
         # determine dimensionality of state and action space
         self.obs_space_dims = obs_space_dims = env.observation_space.shape[0]
@@ -64,6 +82,10 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
         self.hidden_nonlinearity = hidden_nonlinearity = self._activations[hidden_nonlinearity]
         self.output_nonlinearity = output_nonlinearity = self._activations[output_nonlinearity]
 
+        if fused:
+            self._build_fused_graph(optimizer, loss_str)
+            return
+
         """ computation graph for training and simple inference """
         with tf.variable_scope(name, reuse=tf.AUTO_REUSE):
             # placeholders
@@ -72,6 +94,8 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
             self.delta_ph = tf.placeholder(tf.float32, shape=(None, obs_space_dims))
 
             self._create_stats_vars()
+            if in_graph_data:
+                self._build_data_pipeline()
 
             # concatenate action and observation --> NN input
             self.nn_input = tf.concat([self.obs_ph, self.act_ph], axis=1)
@@ -114,9 +138,7 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
         """ computation graph for inference where each of the models receives a different batch"""
         with tf.variable_scope(name, reuse=True):
             # placeholders
-            self.obs_model_batches_stack_ph = tf.placeholder(tf.float32, shape=(None, obs_space_dims))
-            self.act_model_batches_stack_ph = tf.placeholder(tf.float32, shape=(None, action_space_dims))
-            self.delta_model_batches_stack_ph = tf.placeholder(tf.float32, shape=(None, obs_space_dims))
+            self._create_model_batches_placeholders()
 
             # split stack into the batches for each model --> assume each model receives a batch of the same size
             self.obs_model_batches = tf.split(self.obs_model_batches_stack_ph, self.num_models, axis=0)
@@ -170,6 +192,7 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
         assert act.ndim == 2 and act.shape[1] == self.action_space_dims
 
         self.timesteps_counter += obs.shape[0]
+        self._data_vars_stale = True
 
         if valid_split_ratio is None: valid_split_ratio = self.valid_split_ratio
 
@@ -196,40 +219,26 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
             # create data queue
 
         # If case should be entered exactly once
-        if check_init and self._dataset_test is None:
-            self._dataset_test = dict(obs=obs_test_batches, act=act_test_batches, delta=delta_test_batches)
-            self._dataset_train = dict(obs=obs_train_batches, act=act_train_batches, delta=delta_train_batches)
+        init = check_init and self._dataset_test is None
+        if init:
+            self._buffer_train = EnsembleReplayBuffer(self.num_models, self.buffer_size_train)
+            self._buffer_test = EnsembleReplayBuffer(self.num_models, self.buffer_size_test)
+
+        self._buffer_train.add(obs=obs_train_batches, act=act_train_batches, delta=delta_train_batches)
+        self._buffer_test.add(obs=obs_test_batches, act=act_test_batches, delta=delta_test_batches)
+        self._dataset_train = self._buffer_train.datasets()
+        self._dataset_test = self._buffer_test.datasets()
 
+        if init:
             # assert self.next_batch is None
-            self.next_batch, self.iterator = self._data_input_fn(self._dataset_train['obs'],
-                                                                 self._dataset_train['act'],
-                                                                 self._dataset_train['delta'],
-                                                                 batch_size=self.batch_size)
+            if not self.in_graph_data:
+                self.next_batch, self.iterator = self._data_input_fn(self._dataset_train['obs'],
+                                                                     self._dataset_train['act'],
+                                                                     self._dataset_train['delta'],
+                                                                     batch_size=self.batch_size)
             # assert self.normalization is None
             if self.normalize_input:
-                self.compute_normalization(self._dataset_train['obs'],
-                                           self._dataset_train['act'],
-                                           self._dataset_train['delta'])
-        else:
-            n_test_new_samples = len(obs_test_batches[0])
-            n_max_test = self.buffer_size_test - n_test_new_samples
-            n_train_new_samples = len(obs_train_batches[0])
-            n_max_train = self.buffer_size_train - n_train_new_samples
-            for i in range(self.num_models):
-
-                self._dataset_test['obs'][i] = np.concatenate([self._dataset_test['obs'][i][-n_max_test:],
-                                                               obs_test_batches[i]])
-                self._dataset_test['act'][i] = np.concatenate([self._dataset_test['act'][i][-n_max_test:],
-                                                               act_test_batches[i]])
-                self._dataset_test['delta'][i] = np.concatenate([self._dataset_test['delta'][i][-n_max_test:],
-                                                                 delta_test_batches[i]])
-
-                self._dataset_train['obs'][i] = np.concatenate([self._dataset_train['obs'][i][-n_max_train:],
-                                                                obs_train_batches[i]])
-                self._dataset_train['act'][i] = np.concatenate([self._dataset_train['act'][i][-n_max_train:],
-                                                                act_train_batches[i]])
-                self._dataset_train['delta'][i] = np.concatenate(
-                    [self._dataset_train['delta'][i][-n_max_train:], delta_train_batches[i]])
+                self.update_normalization()
 
         logger.log('Model has dataset_train, dataset_test with size {}, {}'.format(len(self._dataset_train['obs'][0]),
                                                                                    len(self._dataset_test['obs'][0])))
@@ -245,31 +254,34 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
 
         if with_new_data:
             if compute_normalization and self.normalize_input:
-                self.compute_normalization(self._dataset_train['obs'],
-                                           self._dataset_train['act'],
-                                           self._dataset_train['delta'])
+                self.update_normalization()
 
         self.used_timesteps_counter += len(self._dataset_train['obs'][0])
-        if self.normalize_input:
-            # normalize data
-            obs_train, act_train, delta_train = self._normalize_data(self._dataset_train['obs'],
-                                                                     self._dataset_train['act'],
-                                                                     self._dataset_train['delta'])
-        else:
-            obs_train, act_train, delta_train = self._dataset_train['obs'], self._dataset_train['act'], \
-                                                self._dataset_train['delta']
 
         valid_loss_rolling_average = valid_loss_rolling_average_prev
         assert remaining_model_idx is not None
-        train_op_to_do = [op for idx, op in enumerate(self.train_op_model_batches) if idx in remaining_model_idx]
+        train_op_to_do, train_op_feed_dict = self._get_train_ops(remaining_model_idx)
 
         # initialize data queue
-        feed_dict = dict(
-            list(zip(self.obs_batches_dataset_ph, obs_train)) +
-            list(zip(self.act_batches_dataset_ph, act_train)) +
-            list(zip(self.delta_batches_dataset_ph, delta_train))
-        )
-        sess.run(self.iterator.initializer, feed_dict=feed_dict)
+        if self.in_graph_data:
+            self._load_data_vars()
+            sess.run(self.iterator.initializer)
+        else:
+            if self.normalize_input:
+                # normalize data
+                obs_train, act_train, delta_train = self._normalize_data(self._dataset_train['obs'],
+                                                                         self._dataset_train['act'],
+                                                                         self._dataset_train['delta'])
+            else:
+                obs_train, act_train, delta_train = self._dataset_train['obs'], self._dataset_train['act'], \
+                                                    self._dataset_train['delta']
+
+            feed_dict = dict(
+                list(zip(self.obs_batches_dataset_ph, obs_train)) +
+                list(zip(self.act_batches_dataset_ph, act_train)) +
+                list(zip(self.delta_batches_dataset_ph, delta_train))
+            )
+            sess.run(self.iterator.initializer, feed_dict=feed_dict)
 
         # preparations for recording training stats
         batch_losses = []
@@ -277,16 +289,10 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
         """ ------- Looping through the shuffled and batched dataset for one epoch -------"""
         while True:
             try:
-                obs_act_delta = sess.run(self.next_batch)
-                obs_batch_stack = np.concatenate(obs_act_delta[:self.num_models], axis=0)
-                act_batch_stack = np.concatenate(obs_act_delta[self.num_models:2*self.num_models], axis=0)
-                delta_batch_stack = np.concatenate(obs_act_delta[2*self.num_models:], axis=0)
-
                 # run train op
-                batch_loss_train_ops = sess.run(self.loss_model_batches + train_op_to_do,
-                                                feed_dict={self.obs_model_batches_stack_ph: obs_batch_stack,
-                                                           self.act_model_batches_stack_ph: act_batch_stack,
-                                                           self.delta_model_batches_stack_ph: delta_batch_stack})
+                feed_dict = self._next_batch_feed_dict()
+                feed_dict.update(train_op_feed_dict)
+                batch_loss_train_ops = sess.run(self.loss_model_batches + train_op_to_do, feed_dict=feed_dict)
 
                 batch_loss = np.array(batch_loss_train_ops[:self.num_models])
                 batch_losses.append(batch_loss)
@@ -373,11 +379,11 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
             self.update_buffer(obs, act, obs_next, valid_split_ratio, compute_normalization)
 
         if compute_normalization and self.normalize_input:
-            self.compute_normalization(self._dataset_train['obs'],
-                                       self._dataset_train['act'],
-                                       self._dataset_train['delta'])
+            self.update_normalization()
 
-        if self.normalize_input:
+        if self.in_graph_data:
+            self._load_data_vars()
+        elif self.normalize_input:
             # normalize data
             obs_train, act_train, delta_train = self._normalize_data(self._dataset_train['obs'],
                                                                      self._dataset_train['act'],
@@ -387,7 +393,7 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
                                                 self._dataset_train['delta']
 
         valid_loss_rolling_average = None
-        train_op_to_do = self.train_op_model_batches
+        train_op_to_do, train_op_feed_dict = self._get_train_ops(range(self.num_models))
         idx_to_remove = []
         epoch_times = []
         epochs_per_model = []
@@ -396,12 +402,15 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
         for epoch in range(epochs):
 
             # initialize data queue
-            feed_dict = dict(
-                list(zip(self.obs_batches_dataset_ph, obs_train)) +
-                list(zip(self.act_batches_dataset_ph, act_train)) +
-                list(zip(self.delta_batches_dataset_ph, delta_train))
-            )
-            sess.run(self.iterator.initializer, feed_dict=feed_dict)
+            if self.in_graph_data:
+                sess.run(self.iterator.initializer)
+            else:
+                feed_dict = dict(
+                    list(zip(self.obs_batches_dataset_ph, obs_train)) +
+                    list(zip(self.act_batches_dataset_ph, act_train)) +
+                    list(zip(self.delta_batches_dataset_ph, delta_train))
+                )
+                sess.run(self.iterator.initializer, feed_dict=feed_dict)
 
             # preparations for recording training stats
             epoch_start_time = time.time()
@@ -410,16 +419,10 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
             """ ------- Looping through the shuffled and batched dataset for one epoch -------"""
             while True:
                 try:
-                    obs_act_delta = sess.run(self.next_batch)
-                    obs_batch_stack = np.concatenate(obs_act_delta[:self.num_models], axis=0)
-                    act_batch_stack = np.concatenate(obs_act_delta[self.num_models:2*self.num_models], axis=0)
-                    delta_batch_stack = np.concatenate(obs_act_delta[2*self.num_models:], axis=0)
-
                     # run train op
-                    batch_loss_train_ops = sess.run(self.loss_model_batches + train_op_to_do,
-                                                   feed_dict={self.obs_model_batches_stack_ph: obs_batch_stack,
-                                                              self.act_model_batches_stack_ph: act_batch_stack,
-                                                              self.delta_model_batches_stack_ph: delta_batch_stack})
+                    feed_dict = self._next_batch_feed_dict()
+                    feed_dict.update(train_op_feed_dict)
+                    batch_loss_train_ops = sess.run(self.loss_model_batches + train_op_to_do, feed_dict=feed_dict)
 
                     batch_loss = np.array(batch_loss_train_ops[:self.num_models])
                     batch_losses.append(batch_loss)
@@ -474,7 +477,8 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
                     if epoch < epochs - 1:
                         logger.log('At Epoch {}, stop model {} since its valid_loss_rolling_average decreased'.format(epoch, i))
 
-            train_op_to_do = [op for idx, op in enumerate(self.train_op_model_batches) if idx not in idx_to_remove]
+            train_op_to_do, train_op_feed_dict = self._get_train_ops(
+                [idx for idx in range(self.num_models) if idx not in idx_to_remove])
 
             if not idx_to_remove: epoch_times.append(time.time() - epoch_start_time) # only track epoch times while all models are trained
 
@@ -522,27 +526,33 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
             next_obs = tf.gather(next_obs_perm, perm_inv)
             return next_obs
 
-        delta_preds = []
-        with tf.variable_scope(self.name, reuse=tf.AUTO_REUSE):
-            for i in range(self.num_models):
-                with tf.variable_scope('model_{}'.format(i), reuse=True):
-                    assert self.normalize_input
-                    in_obs_var = tf_normalize(obs_ph, mean=self._mean_obs_var[i], std=self._std_obs_var[i])
-                    in_act_var = tf_normalize(act_ph, mean=self._mean_act_var[i], std=self._std_act_var[i])
-                    input_var = tf.concat([in_obs_var, in_act_var], axis=1)
-                    mlp = MLP(self.name+'/model_{}'.format(i),
-                              output_dim=self.obs_space_dims,
-                              hidden_sizes=self.hidden_sizes,
-                              hidden_nonlinearity=self.hidden_nonlinearity,
-                              output_nonlinearity=self.output_nonlinearity,
-                              input_var=input_var,
-                              input_dim=self.obs_space_dims + self.action_space_dims,
-                              )
-
-                    delta_pred = tf_denormalize(mlp.output_var, mean=self._mean_delta_var[i], std=self._std_delta_var[i])
-                    delta_preds.append(delta_pred)
-
-        delta_preds = tf.stack(delta_preds, axis=2)  # (batch_size, obs_dims, num_models)
+        if self.fused:
+            obs_stack = tf.tile(tf.expand_dims(obs_ph, axis=0), [self.num_models, 1, 1])
+            act_stack = tf.tile(tf.expand_dims(act_ph, axis=0), [self.num_models, 1, 1])
+            delta_preds = self._predict_fused_delta_sym(obs_stack, act_stack)
+            delta_preds = tf.transpose(delta_preds, perm=[1, 2, 0])  # (batch_size, obs_dims, num_models)
+        else:
+            delta_preds = []
+            with tf.variable_scope(self.name, reuse=tf.AUTO_REUSE):
+                for i in range(self.num_models):
+                    with tf.variable_scope('model_{}'.format(i), reuse=True):
+                        assert self.normalize_input
+                        in_obs_var = tf_normalize(obs_ph, mean=self._mean_obs_var[i], std=self._std_obs_var[i])
+                        in_act_var = tf_normalize(act_ph, mean=self._mean_act_var[i], std=self._std_act_var[i])
+                        input_var = tf.concat([in_obs_var, in_act_var], axis=1)
+                        mlp = MLP(self.name+'/model_{}'.format(i),
+                                  output_dim=self.obs_space_dims,
+                                  hidden_sizes=self.hidden_sizes,
+                                  hidden_nonlinearity=self.hidden_nonlinearity,
+                                  output_nonlinearity=self.output_nonlinearity,
+                                  input_var=input_var,
+                                  input_dim=self.obs_space_dims + self.action_space_dims,
+                                  )
+
+                        delta_pred = tf_denormalize(mlp.output_var, mean=self._mean_delta_var[i], std=self._std_delta_var[i])
+                        delta_preds.append(delta_pred)
+
+            delta_preds = tf.stack(delta_preds, axis=2)  # (batch_size, obs_dims, num_models)
         next_obs = tf.expand_dims(obs_ph, axis=2) + delta_preds
 
         if pred_type == 'all':
@@ -562,6 +572,14 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
         :return: (batch_size, obs_space_dims)
         """
         original_obs = obs_ph
+
+        if self.fused:
+            obs_stack = tf.reshape(obs_ph, [self.num_models, -1, self.obs_space_dims])
+            act_stack = tf.reshape(act_ph, [self.num_models, -1, self.action_space_dims])
+            delta_preds = self._predict_fused_delta_sym(obs_stack, act_stack)
+            next_obs = original_obs + tf.reshape(delta_preds, [-1, self.obs_space_dims])
+            return tf.clip_by_value(next_obs, -1e2, 1e2)
+
         obs_ph, act_ph = tf.split(obs_ph, self.num_models, axis=0), tf.split(act_ph, self.num_models, axis=0)
 
         delta_preds = []
@@ -705,10 +723,197 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
     def reinit_model(self):
         sess = tf.get_default_session()
         if '_reinit_model_op' not in dir(self):
-            self._reinit_model_op = [tf.variables_initializer(tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES,
-                                    scope=self.name+'/model_{}'.format(i))) for i in range(self.num_models)]
+            if self.fused:
+                self._reinit_model_op = [tf.variables_initializer(tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES,
+                                        scope=self.name+'/fused_model'))]
+            else:
+                self._reinit_model_op = [tf.variables_initializer(tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES,
+                                        scope=self.name+'/model_{}'.format(i))) for i in range(self.num_models)]
         sess.run(self._reinit_model_op)
 
+    def _build_fused_graph(self, optimizer, loss_str):
+        """
+        Builds the computation graph of the fused ensemble. Mirrors the per-model graph, but all models are
+        evaluated by one EnsembleMLP on inputs of shape (num_models, batch_size_per_model, dim)
+        """
+        obs_space_dims, action_space_dims = self.obs_space_dims, self.action_space_dims
+
+        """ computation graph for training and simple inference """
+        with tf.variable_scope(self.name, reuse=tf.AUTO_REUSE):
+            # placeholders
+            self.obs_ph = tf.placeholder(tf.float32, shape=(None, obs_space_dims))
+            self.act_ph = tf.placeholder(tf.float32, shape=(None, action_space_dims))
+            self.delta_ph = tf.placeholder(tf.float32, shape=(None, obs_space_dims))
+
+            self._create_stats_vars()
+            if self.in_graph_data:
+                self._build_data_pipeline()
+
+            # concatenate action and observation --> NN input, split along the ensemble axis
+            self.nn_input = tf.concat([self.obs_ph, self.act_ph], axis=1)
+            nn_input = tf.reshape(self.nn_input, [self.num_models, -1, obs_space_dims + action_space_dims])
+
+            with tf.variable_scope('fused_model', reuse=tf.AUTO_REUSE):
+                mlp = EnsembleMLP(self.name+'/fused_model',
+                                  num_models=self.num_models,
+                                  output_dim=obs_space_dims,
+                                  hidden_sizes=self.hidden_sizes,
+                                  hidden_nonlinearity=self.hidden_nonlinearity,
+                                  output_nonlinearity=self.output_nonlinearity,
+                                  input_var=nn_input,
+                                  input_dim=obs_space_dims+action_space_dims,
+                                  )
+
+            self.delta_pred = tf.transpose(mlp.output_var, perm=[1, 2, 0])  # shape: (batch_size, ndim_obs, n_models)
+
+            # define loss and train_op
+            if loss_str == 'L2':
+                self.loss = tf.reduce_mean(tf.linalg.norm(self.delta_ph[:, :, None] - self.delta_pred, axis=1))
+            elif loss_str == 'MSE':
+                self.loss = tf.reduce_mean((self.delta_ph[:, :, None] - self.delta_pred)**2)
+            else:
+                raise NotImplementedError
+
+            self.optimizer = optimizer(learning_rate=self.learning_rate)
+            self.train_op = self.optimizer.minimize(self.loss)
+
+            # tensor_utils
+            self.f_delta_pred = compile_function([self.obs_ph, self.act_ph], self.delta_pred)
+
+        """ computation graph for inference where each of the models receives a different batch"""
+        with tf.variable_scope(self.name, reuse=True):
+            # placeholders
+            self._create_model_batches_placeholders()
+            self.model_mask_ph = tf.placeholder_with_default(tf.ones((self.num_models,)), shape=(self.num_models,))
+
+            # split stack into the batches for each model --> assume each model receives a batch of the same size
+            nn_input = tf.concat([self.obs_model_batches_stack_ph, self.act_model_batches_stack_ph], axis=1)
+            nn_input = tf.reshape(nn_input, [self.num_models, -1, obs_space_dims + action_space_dims])
+            delta_model_batches = tf.reshape(self.delta_model_batches_stack_ph, [self.num_models, -1, obs_space_dims])
+
+            with tf.variable_scope('fused_model', reuse=True):
+                mlp_model_batches = EnsembleMLP(self.name+'/fused_model',
+                                                num_models=self.num_models,
+                                                output_dim=obs_space_dims,
+                                                hidden_sizes=self.hidden_sizes,
+                                                hidden_nonlinearity=self.hidden_nonlinearity,
+                                                output_nonlinearity=self.output_nonlinearity,
+                                                input_var=nn_input,
+                                                input_dim=obs_space_dims+action_space_dims,
+                                                )
+
+            # define loss and train_op -> one loss per model, shape: (num_models,)
+            if loss_str == 'L2':
+                losses = tf.reduce_mean(tf.linalg.norm(delta_model_batches - mlp_model_batches.output_var, axis=2), axis=1)
+            elif loss_str == 'MSE':
+                losses = tf.reduce_mean((delta_model_batches - mlp_model_batches.output_var) ** 2, axis=[1, 2])
+            else:
+                raise NotImplementedError
+            self.loss_model_batches = tf.unstack(losses, num=self.num_models)
+            self.train_op_model_batches = self._masked_train_op(optimizer, losses, list(mlp.get_params().values()))
+
+            # shape: (batch_size_per_model*num_models, ndim_obs)
+            self.delta_pred_model_batches_stack = tf.reshape(mlp_model_batches.output_var, [-1, obs_space_dims])
+
+            # tensor_utils
+            self.f_delta_pred_model_batches = compile_function([self.obs_model_batches_stack_ph,
+                                                                self.act_model_batches_stack_ph],
+                                                                self.delta_pred_model_batches_stack)
+
+        self._networks = [mlp]
+
+    def _masked_train_op(self, optimizer, losses, params):
+        """
+        Creates one train op for all models of the fused ensemble. Only the models with a non-zero entry in
+        self.model_mask_ph are updated. For Adam, the moments and the step counter of each model are kept separately
+        and only advanced for the masked-in models, such that the updates are the same as with one optimizer per
+        model. For other optimizers the weights of the masked-out models are restored after the optimizer step,
+        which is only exact for stateless optimizers (their slots still change).
+        """
+        mask = self.model_mask_ph
+        if issubclass(optimizer, tf.train.AdamOptimizer):
+            return self._masked_adam_op(losses, params)
+
+        old_params = [param.read_value() for param in params]
+        with tf.control_dependencies(old_params):
+            update_op = optimizer(learning_rate=self.learning_rate).minimize(tf.reduce_sum(losses * mask),
+                                                                              var_list=params)
+        with tf.control_dependencies([update_op]):
+            restore_ops = [tf.assign(param, tf.where(tf.cast(mask, tf.bool), param.read_value(), old_param))
+                           for param, old_param in zip(params, old_params)]
+        return tf.group(*restore_ops)
+
+    def _masked_adam_op(self, losses, params, beta1=0.9, beta2=0.999, epsilon=1e-8):
+        """
+        Adam update (with the default hyperparameters of tf.train.AdamOptimizer) of the stacked params, where each
+        model has its own moments and step counter that are only updated if the model is masked in
+        """
+        mask = tf.cast(self.model_mask_ph, tf.bool)
+        grads = tf.gradients(tf.reduce_sum(losses * self.model_mask_ph), params)
+
+        with tf.variable_scope('fused_model/masked_adam', reuse=tf.AUTO_REUSE):
+            step = tf.get_variable('step', shape=(self.num_models,), dtype=tf.float32,
+                                   initializer=tf.zeros_initializer(), trainable=False)
+            moments = [(tf.get_variable('m_%i' % i, shape=param.shape, dtype=tf.float32,
+                                        initializer=tf.zeros_initializer(), trainable=False),
+                        tf.get_variable('v_%i' % i, shape=param.shape, dtype=tf.float32,
+                                        initializer=tf.zeros_initializer(), trainable=False))
+                       for i, param in enumerate(params)]
+
+        new_step = step + self.model_mask_ph
+        safe_step = tf.maximum(new_step, 1.)
+        lr_t = self.learning_rate * tf.sqrt(1 - beta2 ** safe_step) / (1 - beta1 ** safe_step)
+
+        update_ops = [tf.assign(step, new_step)]
+        for param, grad, (m, v) in zip(params, grads, moments):
+            m_t = tf.where(mask, beta1 * m + (1 - beta1) * grad, m)
+            v_t = tf.where(mask, beta2 * v + (1 - beta2) * tf.square(grad), v)
+            param_lr_t = tf.reshape(lr_t, [self.num_models] + [1] * (param.shape.ndims - 1))
+            new_param = tf.where(mask, param - param_lr_t * m_t / (tf.sqrt(v_t) + epsilon), param.read_value())
+            update_ops.extend([tf.assign(m, m_t), tf.assign(v, v_t), tf.assign(param, new_param)])
+        return tf.group(*update_ops)
+
+    def _get_train_ops(self, model_idx):
+        """
+        Returns the list of train ops that update the models in model_idx and the feed_dict entries they require
+        """
+        model_idx = list(model_idx)
+        if self.fused:
+            mask = np.zeros((self.num_models,), dtype=np.float32)
+            mask[model_idx] = 1.
+            train_ops = [self.train_op_model_batches] if model_idx else []
+            return train_ops, {self.model_mask_ph: mask}
+        return [op for idx, op in enumerate(self.train_op_model_batches) if idx in model_idx], {}
+
+    def _predict_fused_delta_sym(self, obs_var, act_var):
+        """
+        Symbolic (denormalized) delta prediction of the fused ensemble
+        :param obs_var: (num_models, batch_size, obs_space_dims)
+        :param act_var: (num_models, batch_size, act_space_dims)
+        :return: (num_models, batch_size, obs_space_dims)
+        """
+        assert self.normalize_input
+        mean_obs, std_obs = tf.stack(self._mean_obs_var)[:, None, :], tf.stack(self._std_obs_var)[:, None, :]
+        mean_act, std_act = tf.stack(self._mean_act_var)[:, None, :], tf.stack(self._std_act_var)[:, None, :]
+        mean_delta, std_delta = tf.stack(self._mean_delta_var)[:, None, :], tf.stack(self._std_delta_var)[:, None, :]
+
+        with tf.variable_scope(self.name, reuse=tf.AUTO_REUSE):
+            with tf.variable_scope('fused_model', reuse=True):
+                in_obs_var = tf_normalize(obs_var, mean=mean_obs, std=std_obs)
+                in_act_var = tf_normalize(act_var, mean=mean_act, std=std_act)
+                input_var = tf.concat([in_obs_var, in_act_var], axis=2)
+                mlp = EnsembleMLP(self.name+'/fused_model',
+                                  num_models=self.num_models,
+                                  output_dim=self.obs_space_dims,
+                                  hidden_sizes=self.hidden_sizes,
+                                  hidden_nonlinearity=self.hidden_nonlinearity,
+                                  output_nonlinearity=self.output_nonlinearity,
+                                  input_var=input_var,
+                                  input_dim=self.obs_space_dims + self.action_space_dims,
+                                  )
+
+        return tf_denormalize(mlp.output_var, mean=mean_delta, std=std_delta)
+
     def _data_input_fn(self, obs_batches, act_batches, delta_batches, batch_size=500, buffer_size=5000):
         """ Takes in train data an creates an a symbolic nex_batch operator as well as an iterator object """
 
@@ -732,28 +937,119 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
 
         return next_batch, iterator
 
+    def _next_batch_feed_dict(self):
+        """
+        Returns the feed_dict of the model batches placeholders for the next training batch.
+        With in_graph_data the placeholders default to the in-graph iterator, so nothing needs to be fed.
+        Raises tf.errors.OutOfRangeError at the end of the epoch.
+        """
+        if self.in_graph_data:
+            return {}
+        obs_act_delta = tf.get_default_session().run(self.next_batch)
+        obs_batch_stack = np.concatenate(obs_act_delta[:self.num_models], axis=0)
+        act_batch_stack = np.concatenate(obs_act_delta[self.num_models:2*self.num_models], axis=0)
+        delta_batch_stack = np.concatenate(obs_act_delta[2*self.num_models:], axis=0)
+        return {self.obs_model_batches_stack_ph: obs_batch_stack,
+                self.act_model_batches_stack_ph: act_batch_stack,
+                self.delta_model_batches_stack_ph: delta_batch_stack}
+
+    def _build_data_pipeline(self):
+        """
+        Creates the in-graph training buffer - variables of shape (num_models, n_samples, dim) - together with an
+        iterator over per-model shuffled minibatch indices. The symbolic next batch is gathered and normalized
+        in-graph and stacked as (batch_size * num_models, dim), the layout of the model batches placeholders
+        """
+        num_models, obs_space_dims, action_space_dims = self.num_models, self.obs_space_dims, self.action_space_dims
+
+        self._train_data_vars, self._train_data_phs, self._train_data_assign_ops = [], [], []
+        for key, dim in [('obs', obs_space_dims), ('act', action_space_dims), ('delta', obs_space_dims)]:
+            data_var = tf.get_variable('train_%s_buffer' % key, initializer=tf.zeros((num_models, 0, dim)),
+                                       dtype=tf.float32, trainable=False, validate_shape=False)
+            data_ph = tf.placeholder(tf.float32, shape=(num_models, None, dim))
+            self._train_data_vars.append(data_var)
+            self._train_data_phs.append(data_ph)
+            self._train_data_assign_ops.append(tf.assign(data_var, data_ph, validate_shape=False))
+
+        # each model gets its own permutation of its data in every epoch
+        n_samples = tf.shape(self._train_data_vars[0])[1]
+        perms = tf.stack([tf.random_shuffle(tf.range(n_samples)) for _ in range(num_models)], axis=1)
+        dataset = tf.data.Dataset.from_tensor_slices(perms).batch(self.batch_size)
+        self.iterator = dataset.make_initializable_iterator()
+        batch_idx = tf.transpose(self.iterator.get_next())  # shape: (num_models, batch_size)
+
+        model_idx = tf.tile(tf.range(num_models)[:, None], [1, tf.shape(batch_idx)[1]])
+        gather_idx = tf.stack([model_idx, batch_idx], axis=-1)
+        obs, act, delta = [tf.gather_nd(data_var, gather_idx) for data_var in self._train_data_vars]
+
+        if self.normalize_input:
+            obs = tf_normalize(obs, mean=tf.stack(self._mean_obs_var)[:, None, :],
+                               std=tf.stack(self._std_obs_var)[:, None, :])
+            act = tf_normalize(act, mean=tf.stack(self._mean_act_var)[:, None, :],
+                               std=tf.stack(self._std_act_var)[:, None, :])
+            delta = tf_normalize(delta, mean=tf.stack(self._mean_delta_var)[:, None, :],
+                                 std=tf.stack(self._std_delta_var)[:, None, :])
+
+        self.next_batch = (tf.reshape(obs, [-1, obs_space_dims]),
+                           tf.reshape(act, [-1, action_space_dims]),
+                           tf.reshape(delta, [-1, obs_space_dims]))
+
+    def _create_model_batches_placeholders(self):
+        """
+        Creates the placeholders for the model batches stacked along axis 0. With in_graph_data they
+        default to the next batch of the in-graph data pipeline
+        """
+        if self.in_graph_data:
+            obs_batch, act_batch, delta_batch = self.next_batch
+            self.obs_model_batches_stack_ph = tf.placeholder_with_default(obs_batch, shape=(None, self.obs_space_dims))
+            self.act_model_batches_stack_ph = tf.placeholder_with_default(act_batch, shape=(None, self.action_space_dims))
+            self.delta_model_batches_stack_ph = tf.placeholder_with_default(delta_batch, shape=(None, self.obs_space_dims))
+        else:
+            self.obs_model_batches_stack_ph = tf.placeholder(tf.float32, shape=(None, self.obs_space_dims))
+            self.act_model_batches_stack_ph = tf.placeholder(tf.float32, shape=(None, self.action_space_dims))
+            self.delta_model_batches_stack_ph = tf.placeholder(tf.float32, shape=(None, self.obs_space_dims))
+
+    def _load_data_vars(self):
+        """ Copies the training buffer into the in-graph data variables if it has changed since the last copy """
+        if not self._data_vars_stale:
+            return
+        feed_dict = {data_ph: self._buffer_train.stacked(key)
+                     for data_ph, key in zip(self._train_data_phs, ['obs', 'act', 'delta'])}
+        tf.get_default_session().run(self._train_data_assign_ops, feed_dict=feed_dict)
+        self._data_vars_stale = False
+
     def compute_normalization(self, obs, act, delta):
         assert len(obs) == len(act) == len(delta) == self.num_models
         assert all([o.shape[0] == d.shape[0] == a.shape[0] for o, a, d in zip(obs, act, delta)])
         assert all([d.shape[1] == o.shape[1] for d, o in zip(obs, delta)])
 
         # store means and std in dict
-        self.normalization = []
+        normalization = []
+        for i in range(self.num_models):
+            model_normalization = OrderedDict()
+            model_normalization['obs'] = (np.mean(obs[i], axis=0), np.std(obs[i], axis=0))
+            model_normalization['delta'] = (np.mean(delta[i], axis=0), np.std(delta[i], axis=0))
+            model_normalization['act'] = (np.mean(act[i], axis=0), np.std(act[i], axis=0))
+            normalization.append(model_normalization)
+        self._assign_normalization(normalization)
+
+    def update_normalization(self):
+        """
+        Sets the normalization to the statistics of the current train buffer, which are maintained incrementally
+        by the buffer (no pass over the data)
+        """
+        self._assign_normalization(self._buffer_train.normalization())
+
+    def _assign_normalization(self, normalization):
+        self.normalization = normalization
         feed_dict = {}
         for i in range(self.num_models):
-            normalization = OrderedDict()
-            normalization['obs'] = (np.mean(obs[i], axis=0), np.std(obs[i], axis=0))
-            normalization['delta'] = (np.mean(delta[i], axis=0), np.std(delta[i], axis=0))
-            normalization['act'] = (np.mean(act[i], axis=0), np.std(act[i], axis=0))
-            self.normalization.append(normalization)
             feed_dict.update({self._mean_obs_ph[i]: self.normalization[i]['obs'][0],
-                         self._std_obs_ph[i]: self.normalization[i]['obs'][1],
-                         self._mean_act_ph[i]: self.normalization[i]['act'][0],
-                         self._std_act_ph[i]: self.normalization[i]['act'][1],
-                         self._mean_delta_ph[i]: self.normalization[i]['delta'][0],
-                         self._std_delta_ph[i]: self.normalization[i]['delta'][1],
-                         }
-                           )
+                              self._std_obs_ph[i]: self.normalization[i]['obs'][1],
+                              self._mean_act_ph[i]: self.normalization[i]['act'][0],
+                              self._std_act_ph[i]: self.normalization[i]['act'][1],
+                              self._mean_delta_ph[i]: self.normalization[i]['delta'][0],
+                              self._std_delta_ph[i]: self.normalization[i]['delta'][1],
+                              })
         sess = tf.get_default_session()
         sess.run(self._assignations, feed_dict=feed_dict)
 
@@ -820,10 +1116,21 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
             denorm_deltas.append(denorm_delta)
         return np.stack(denorm_deltas, axis=-1)
 
-    def get_shared_param_values(self): # to feed policy
+    @property
+    def num_networks(self):
+        """ number of networks holding the params - one per model or one for the fused ensemble """
+        return len(self._networks)
+
+    def get_shared_param_values(self, network_idxs=None): # to feed policy
+        """
+        Args:
+            network_idxs (list or None) : networks whose params are included, all if None - the entries of the
+                                          other networks are None and are skipped by set_shared_params
+        """
         state = dict()
         state['normalization'] = self.normalization
-        state['networks_params'] = [nn.get_param_values() for nn in self._networks]
+        state['networks_params'] = [nn.get_param_values() if network_idxs is None or i in network_idxs else None
+                                    for i, nn in enumerate(self._networks)]
         return state
 
     def set_shared_params(self, state):
@@ -841,5 +1148,6 @@ class MLPDynamicsEnsemble(MLPDynamicsModel):
         sess = tf.get_default_session()
         sess.run(self._assignations, feed_dict=feed_dict)
         for i in range(len(self._networks)):
-            self._networks[i].set_params(state['networks_params'][i])
+            if state['networks_params'][i] is not None:
+                self._networks[i].set_params(state['networks_params'][i])
 
@@ -0,0 +1,111 @@
+import numpy as np
+from collections import OrderedDict
+
+
+class EnsembleReplayBuffer(object):
+    """
+    Preallocated circular buffer holding one dataset (obs, act, delta) per model of an ensemble. Each model
+    stores its own bootstrap / train-test split of the data, but all models receive the same number of rows per
+    insertion, so they share the write pointer. Inserting n rows costs O(n): the oldest rows are overwritten in
+    place instead of re-concatenating the whole buffer.
+
+    The sums and squared sums of every array are maintained alongside the data (adding the new and subtracting
+    the overwritten rows), such that the normalization statistics are available without a pass over the buffer.
+    They are recomputed exactly whenever capacity rows have been inserted since the last recomputation, which
+    bounds the accumulation of rounding errors.
+
+    Args:
+        num_models (int) : number of models of the ensemble
+        capacity (int) : max number of rows per model
+        keys (tuple) : names of the stored arrays
+    """
+
+    def __init__(self, num_models, capacity, keys=('obs', 'act', 'delta')):
+        self.num_models = num_models
+        self.capacity = capacity
+        self.keys = keys
+
+        self.size = 0
+        self._ptr = 0
+        self._inserted_since_recompute = 0
+        self._arrays = None
+        self._sums = None
+        self._sq_sums = None
+
+    def add(self, **batches):
+        """
+        Args:
+            **batches : for each key a list (one entry per model) of arrays of shape (n_samples, dim)
+        """
+        assert set(batches.keys()) == set(self.keys)
+        num_rows = len(batches[self.keys[0]][0])
+        assert all(len(batch) == num_rows for model_batches in batches.values() for batch in model_batches)
+
+        if self._arrays is None:
+            self._allocate(batches)
+        if num_rows == 0 or self.capacity == 0:
+            return
+
+        # only the last capacity rows of an oversized batch survive
+        start = max(num_rows - self.capacity, 0)
+        num_rows -= start
+        idxs = (self._ptr + np.arange(num_rows)) % self.capacity
+        # the buffer is filled from the front, so the first capacity - size written slots are still empty
+        overwritten_idxs = idxs[self.capacity - self.size:]
+
+        for key in self.keys:
+            new_rows = np.stack([batch[start:] for batch in batches[key]], axis=0)
+            old_rows = self._arrays[key][:, overwritten_idxs].astype(np.float64)
+            self._sums[key] += new_rows.sum(axis=1) - old_rows.sum(axis=1)
+            self._sq_sums[key] += np.square(new_rows, dtype=np.float64).sum(axis=1) - np.square(old_rows).sum(axis=1)
+            self._arrays[key][:, idxs] = new_rows
+
+        self._ptr = (self._ptr + num_rows) % self.capacity
+        self.size = min(self.size + num_rows, self.capacity)
+
+        self._inserted_since_recompute += num_rows
+        if self._inserted_since_recompute >= self.capacity:
+            self._recompute_stats()
+
+    def datasets(self):
+        """
+        Returns:
+            (dict) : for each key a list (one entry per model) of views of shape (size, dim) into the buffer
+        """
+        return {key: [self._arrays[key][i, :self.size] for i in range(self.num_models)] for key in self.keys}
+
+    def stacked(self, key):
+        """
+        Returns:
+            (np.ndarray) : view of shape (num_models, size, dim) into the buffer
+        """
+        return self._arrays[key][:, :self.size]
+
+    def normalization(self):
+        """
+        Returns:
+            (list) : one OrderedDict per model with the (mean, std) of each array of the buffer
+        """
+        assert self.size > 0
+        normalization = [OrderedDict() for _ in range(self.num_models)]
+        for key in self.keys:
+            mean = self._sums[key] / self.size
+            std = np.sqrt(np.maximum(self._sq_sums[key] / self.size - np.square(mean), 0.))
+            for i in range(self.num_models):
+                normalization[i][key] = (mean[i], std[i])
+        return normalization
+
+    def _allocate(self, batches):
+        self._arrays, self._sums, self._sq_sums = dict(), dict(), dict()
+        for key in self.keys:
+            batch = np.asarray(batches[key][0])
+            self._arrays[key] = np.zeros((self.num_models, self.capacity) + batch.shape[1:], dtype=batch.dtype)
+            self._sums[key] = np.zeros((self.num_models,) + batch.shape[1:], dtype=np.float64)
+            self._sq_sums[key] = np.zeros((self.num_models,) + batch.shape[1:], dtype=np.float64)
+
+    def _recompute_stats(self):
+        for key in self.keys:
+            data = self.stacked(key).astype(np.float64)
+            self._sums[key] = data.sum(axis=1)
+            self._sq_sums[key] = np.square(data).sum(axis=1)
+        self._inserted_since_recompute = 0
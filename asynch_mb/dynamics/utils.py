@@ -276,6 +276,76 @@ def create_mlp(name,
     return input_var, output_var
 
 
+def stacked_initializer(initializer):
+    """
+    Wraps an initializer such that each slice along the leading (ensemble) axis is initialized independently,
+    i.e. a (num_models, in, out) kernel gets the same initialization as num_models separate (in, out) kernels
+    """
+    def _initializer(shape, dtype=tf.float32, partition_info=None):
+        return tf.stack([initializer(list(shape[1:]), dtype=dtype) for _ in range(shape[0])], axis=0)
+    return _initializer
+
+
+def create_ensemble_mlp(name,
+                        num_models,
+                        output_dim,
+                        hidden_sizes,
+                        hidden_nonlinearity,
+                        output_nonlinearity,
+                        input_dim=None,
+                        input_var=None,
+                        w_init=tf.contrib.layers.xavier_initializer(),
+                        b_init=tf.zeros_initializer(),
+                        ):
+    """
+    Creates an ensemble of MLP networks whose weights are stacked along a leading ensemble axis,
+    such that each layer of all the networks is evaluated with one batched matmul
+    Args:
+        name (str): scope of the neural network
+        num_models (int): number of networks in the ensemble
+        output_dim (int): dimension of the output
+        hidden_sizes (tuple): tuple with the hidden sizes of the fully connected network
+        hidden_nonlinearity (tf): non-linearity for the activations in the hidden layers
+        output_nonlinearity (tf or None): output non-linearity. None results in no non-linearity being applied
+        input_dim (tuple): dimensions of the input variable e.g. (num_models, None, action_dim)
+        input_var (tf.placeholder or tf.Variable or None): Input of the network as a symbolic variable
+                                                           of shape (num_models, batch_size, input_dim)
+        w_init (tf.initializer): initializer for the weights of each of the networks
+        b_init (tf.initializer): initializer for the biases
+
+    Returns:
+        input_var (tf.placeholder or tf.Variable): Input of the network as a symbolic variable
+        output_var (tf.Tensor): Output of the network as a symbolic variable - (num_models, batch_size, output_dim)
+
+    """
+
+    assert input_var is not None or input_dim is not None
+
+    if input_var is None:
+        input_var = tf.placeholder(dtype=tf.float32, shape=input_dim, name='input')
+    x = input_var
+
+    layer_sizes = list(hidden_sizes) + [output_dim]
+    nonlinearities = [hidden_nonlinearity] * len(hidden_sizes) + [output_nonlinearity]
+    layer_names = ['hidden_%d' % idx for idx in range(len(hidden_sizes))] + ['output']
+    in_size = x.get_shape().as_list()[-1]
+
+    for layer_name, out_size, nonlinearity in zip(layer_names, layer_sizes, nonlinearities):
+        with tf.variable_scope(layer_name):
+            kernel = tf.get_variable('kernel', shape=(num_models, in_size, out_size), dtype=tf.float32,
+                                     initializer=stacked_initializer(w_init), use_resource=True)
+            bias = tf.get_variable('bias', shape=(num_models, 1, out_size), dtype=tf.float32,
+                                   initializer=b_init, use_resource=True)
+        x = tf.matmul(x, kernel) + bias
+        if nonlinearity is not None:
+            x = nonlinearity(x)
+        in_size = out_size
+
+    output_var = x
+
+    return input_var, output_var
+
+
 def create_rnn(name,
                cell_type,
                output_dim,
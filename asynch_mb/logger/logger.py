@@ -8,15 +8,19 @@ import sys
 import shutil
 import os.path as osp
 import json
+import struct
 import time
 import datetime
 import tempfile
 import joblib
-from collections import defaultdict
+import pickle
+import threading
+import zlib
+from collections import defaultdict, OrderedDict
 
 LOG_OUTPUT_FORMATS     = ['stdout', 'log', 'csv']
 LOG_OUTPUT_FORMATS_MPI = ['log']
-# Also valid: json, tensorboard
+# Also valid: json, tensorboard, columnar
 
 DEBUG = 10
 INFO = 20
@@ -145,6 +149,93 @@ class CSVOutputFormat(KVWriter):
         self.file.close()
 
 
+class ColumnarOutputFormat(KVWriter):
+    """
+    Append-only binary progress log. The keys are stored in a schema side-file (one key per line, the line
+    number being the id of the key) and every dumpkvs appends one record of (key id, float64 value) pairs, so new
+    keys never require rewriting the file. Values that cannot be converted to float are stored as nan.
+    Use read_columnar_progress or columnar_to_csv to read it.
+    """
+    def __init__(self, filename):
+        self.file = open(filename, 'ab')
+        self.schema_file = open(filename + '.schema', 'a+t')
+        self.schema_file.seek(0)
+        self.key2id = {key: i for i, key in enumerate(self.schema_file.read().splitlines())}
+
+    def writekvs(self, kvs):
+        extra_keys = [k for k in kvs.keys() if k not in self.key2id]
+        if extra_keys:
+            for k in extra_keys:
+                self.key2id[k] = len(self.key2id)
+                self.schema_file.write(k + '\n')
+            self.schema_file.flush()  # the schema has to be on disk before records referencing it
+
+        record = [struct.pack('<I', len(kvs))]
+        for k, v in kvs.items():
+            try:
+                v = float(v)
+            except (TypeError, ValueError):
+                v = float('nan')
+            record.append(_COLUMNAR_FIELD.pack(self.key2id[k], v))
+        self.file.write(b''.join(record))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+        self.schema_file.close()
+
+
+_COLUMNAR_FIELD = struct.Struct('<Id')
+
+
+def read_columnar_progress(filename, fill_value=float('nan')):
+    """
+    Reads a progress file written by ColumnarOutputFormat
+
+    Args:
+        filename (str) : path of the progress file
+        fill_value (float) : value of the keys that are missing in a row
+
+    Returns:
+        (OrderedDict) : dict with one list of values (one per row) for each key
+    """
+    with open(filename + '.schema', 'rt') as f:
+        keys = f.read().splitlines()
+    with open(filename, 'rb') as f:
+        data = f.read()
+
+    columns = OrderedDict((k, []) for k in keys)
+    offset, num_rows = 0, 0
+    while offset + 4 <= len(data):
+        num_fields, = struct.unpack_from('<I', data, offset)
+        end = offset + 4 + num_fields * _COLUMNAR_FIELD.size
+        if end > len(data):
+            break  # truncated record of a run that was killed while writing
+        row = dict(_COLUMNAR_FIELD.unpack_from(data, offset + 4 + i * _COLUMNAR_FIELD.size)
+                   for i in range(num_fields))
+        for key_id, k in enumerate(keys):
+            columns[k].append(row.get(key_id, fill_value))
+        offset, num_rows = end, num_rows + 1
+    return columns
+
+
+def columnar_to_csv(filename, csv_filename=None):
+    """
+    Converts a progress file written by ColumnarOutputFormat into a csv file (missing values are left empty)
+    """
+    import csv
+    if csv_filename is None:
+        csv_filename = osp.splitext(filename)[0] + '.csv'
+    columns = read_columnar_progress(filename, fill_value=None)
+    num_rows = len(next(iter(columns.values()))) if columns else 0
+    with open(csv_filename, 'wt') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns.keys())
+        for i in range(num_rows):
+            writer.writerow(['' if column[i] is None else column[i] for column in columns.values()])
+    return csv_filename
+
+
 class TensorBoardOutputFormat(KVWriter):
     """
     Dumps key/value pairs into TensorBoard's numeric format.
@@ -193,9 +284,133 @@ def make_output_format(format, ev_dir, log_suffix=''):
         return CSVOutputFormat(osp.join(ev_dir, 'progress%s.csv' % log_suffix))
     elif format == 'tensorboard':
         return TensorBoardOutputFormat(osp.join(ev_dir, 'tb%s' % log_suffix))
+    elif format == 'columnar':
+        return ColumnarOutputFormat(osp.join(ev_dir, 'progress%s.bin' % log_suffix))
     else:
         raise ValueError('Unknown format specified: %s' % (format,))
 
+# ================================================================
+# Snapshots
+# ================================================================
+
+SNAPSHOT_MAGIC = b'AMBSNAP1'
+SNAPSHOT_CODECS = ['none', 'lz4', 'zlib']
+
+
+def _compress(data, codec):
+    if codec == 'lz4':
+        try:
+            import lz4.frame
+            return b'lz4 ', lz4.frame.compress(data)
+        except ImportError:
+            return b'zlb1', zlib.compress(data, 1)  # fast fallback if lz4 is not installed
+    elif codec == 'zlib':
+        return b'zlb6', zlib.compress(data, 6)
+    elif codec == 'none':
+        return b'raw ', data
+    else:
+        raise ValueError('Unknown snapshot codec specified: %s' % (codec,))
+
+
+def load_itr_params(file_name):
+    """
+    Loads a snapshot written by save_itr_params, both by the synchronous (joblib) and the asynchronous writer
+    """
+    with open(file_name, 'rb') as f:
+        magic = f.read(len(SNAPSHOT_MAGIC))
+        if magic != SNAPSHOT_MAGIC:
+            return joblib.load(file_name)
+        tag, data = f.read(4), f.read()
+    if tag == b'lz4 ':
+        import lz4.frame
+        data = lz4.frame.decompress(data)
+    elif tag in (b'zlb1', b'zlb6'):
+        data = zlib.decompress(data)
+    return pickle.loads(data)
+
+
+class SnapshotWriter(object):
+    """
+    Writes snapshots in a background thread, such that the compression and the disk io are not charged against
+    the training loop. The params are pickled in the calling thread (pickling the policy requires the default tf
+    session of that thread), compressed with the given codec and atomically moved into place once written.
+
+    At most max_pending snapshots are queued (submit blocks otherwise). A snapshot that is submitted for a file
+    that is still waiting to be written replaces the pending one (latest wins). If writing a snapshot fails, that
+    snapshot is dropped, the writer keeps draining the queue and the error is re-raised by the next submit / wait.
+
+    Args:
+        codec (str) : 'none', 'lz4' (falls back to fast zlib if lz4 is not installed) or 'zlib'
+        max_pending (int) : max number of snapshots waiting to be written
+    """
+    def __init__(self, codec='lz4', max_pending=2):
+        assert codec in SNAPSHOT_CODECS
+        self.codec = codec
+        self.max_pending = max_pending
+        self._pending = OrderedDict()
+        self._writing = False
+        self._error = None
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='SnapshotWriter', daemon=True)
+        self._thread.start()
+
+    def submit(self, file_name, params):
+        data = pickle.dumps(params, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._cond:
+            self._raise_error()
+            if file_name not in self._pending:
+                while len(self._pending) >= self.max_pending:
+                    self._cond.wait()
+            self._pending[file_name] = data
+            self._cond.notify_all()
+
+    def wait(self):
+        """
+        Blocks until all submitted snapshots are written
+        """
+        with self._cond:
+            while self._pending or self._writing:
+                self._cond.wait()
+            self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                file_name, data = self._pending.popitem(last=False)
+                self._writing = True
+                self._cond.notify_all()
+            error = None
+            try:
+                self._write(file_name, data)
+            except Exception as e:
+                error = e
+                print('Failed to write snapshot %s: %r' % (file_name, e))
+                try:
+                    os.remove(file_name + '.tmp')
+                except OSError:
+                    pass
+            with self._cond:
+                self._writing = False
+                if error is not None and self._error is None:
+                    self._error = error
+                self._cond.notify_all()
+
+    def _write(self, file_name, data):
+        tag, data = _compress(data, self.codec)
+        tmp_file_name = file_name + '.tmp'
+        with open(tmp_file_name, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(tag)
+            f.write(data)
+        os.replace(tmp_file_name, file_name)
+
 # ================================================================
 # API
 # ================================================================
@@ -280,6 +495,13 @@ def get_dir():
 def save_itr_params(*args):
     return Logger.CURRENT.save_itr_params(*args)
 
+
+def wait_for_snapshots():
+    """
+    Blocks until the snapshots that are written in the background are on disk
+    """
+    Logger.CURRENT.wait_for_snapshots()
+
 record_tabular = logkv
 dump_tabular = dumpkvs
 
@@ -320,7 +542,8 @@ class Logger(object):
                     # So that you can still log to the terminal without setting up any output files
     CURRENT = None  # Current logger being used by the free functions above
 
-    def __init__(self, dir, output_formats, snapshot_mode='last', snapshot_gap=1):
+    def __init__(self, dir, output_formats, snapshot_mode='last', snapshot_gap=1, snapshot_async=False,
+                 snapshot_codec='lz4'):
         self.name2val = defaultdict(float)  # values this iteration
         self.name2cnt = defaultdict(int)
         self.level = INFO
@@ -328,6 +551,7 @@ class Logger(object):
         self.output_formats = output_formats
         self.snapshot_mode = snapshot_mode
         self.snapshot_gap = snapshot_gap
+        self.snapshot_writer = SnapshotWriter(codec=snapshot_codec) if snapshot_async else None
 
     # Logging API, forwarded
     # ----------------------------------------
@@ -363,6 +587,7 @@ class Logger(object):
         return self.dir
 
     def close(self):
+        self.wait_for_snapshots()
         for fmt in self.output_formats:
             fmt.close()
 
@@ -377,28 +602,39 @@ class Logger(object):
         if self.dir:
             if self.snapshot_mode == 'all':
                 file_name = osp.join(self.dir, 'itr_%d.pkl' % itr)
-                joblib.dump(params, file_name, compress=3)
+                self._dump(params, file_name)
             elif self.snapshot_mode == 'last':
                 # override previous params
                 file_name = osp.join(self.dir, 'params.pkl')
-                joblib.dump(params, file_name, compress=3)
+                self._dump(params, file_name)
             elif self.snapshot_mode == "gap":
                 if itr % self.snapshot_gap == 0:
                     file_name = osp.join(self.dir, 'itr_%d.pkl' % itr)
-                    joblib.dump(params, file_name, compress=3)
+                    self._dump(params, file_name)
             elif self.snapshot_mode == 'last_gap':
                 if itr % self.snapshot_gap == 0:
                     file_name = osp.join(self.dir, 'params.pkl')
-                    joblib.dump(params, file_name, compress=3)
+                    self._dump(params, file_name)
             elif self.snapshot_mode == 'none':
                 pass
             else:
                 raise NotImplementedError
 
+    def wait_for_snapshots(self):
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.wait()
+
+    def _dump(self, params, file_name):
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.submit(file_name, params)
+        else:
+            joblib.dump(params, file_name, compress=3)
+
 Logger.DEFAULT = Logger.CURRENT = Logger(dir=None, output_formats=[HumanOutputFormat(sys.stdout)])
 
 
-def configure(dir=None, format_strs=None, snapshot_mode='last', snapshot_gap=1):
+def configure(dir=None, format_strs=None, snapshot_mode='last', snapshot_gap=1, snapshot_async=False,
+              snapshot_codec='lz4'):
     if dir is None:
         dir = os.getenv('OPENAI_LOGDIR')
     if dir is None:
@@ -424,7 +660,8 @@ def configure(dir=None, format_strs=None, snapshot_mode='last', snapshot_gap=1):
 
     output_formats = [make_output_format(f, dir, log_suffix) for f in format_strs]
 
-    Logger.CURRENT = Logger(dir=dir, output_formats=output_formats, snapshot_mode=snapshot_mode, snapshot_gap=snapshot_gap)
+    Logger.CURRENT = Logger(dir=dir, output_formats=output_formats, snapshot_mode=snapshot_mode, snapshot_gap=snapshot_gap,
+                            snapshot_async=snapshot_async, snapshot_codec=snapshot_codec)
     log('Logging to %s' % dir)
 
 
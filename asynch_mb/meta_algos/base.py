@@ -153,40 +153,89 @@ class MAMLAlgo(MetaAlgo):
 
         return obs_phs, action_phs, adv_phs, dist_info_phs, all_phs_dict
 
+    def _make_batched_input_placeholders(self, prefix=''):
+        """
+        Creates one placeholder per input type that holds the zero padded data of all meta tasks stacked along the
+        first axis, i.e. of shape (meta_batch_size, max_num_samples, dim), and a placeholder with the number of
+        samples of each task
+
+        Args:
+            prefix (str) : a string to prepend to the name of each variable
+
+        Returns:
+            (tuple) : a tuple containing the placeholders for each input type, and for convenience, an OrderedDict
+            containing all placeholders created
+        """
+        dist_info_specs = self.policy.distribution.dist_info_specs
+        all_phs_dict = OrderedDict()
+
+        obs_ph = tf.placeholder(dtype=tf.float32, shape=[self.meta_batch_size, None, self.policy.obs_dim],
+                                name='obs_' + prefix)
+        all_phs_dict['%s_%s' % (prefix, 'observations')] = obs_ph
+
+        action_ph = tf.placeholder(dtype=tf.float32, shape=[self.meta_batch_size, None, self.policy.action_dim],
+                                   name='action_' + prefix)
+        all_phs_dict['%s_%s' % (prefix, 'actions')] = action_ph
+
+        adv_ph = tf.placeholder(dtype=tf.float32, shape=[self.meta_batch_size, None], name='advantage_' + prefix)
+        all_phs_dict['%s_%s' % (prefix, 'advantages')] = adv_ph
+
+        dist_info_ph_dict = {}
+        for info_key, shape in dist_info_specs:
+            ph = tf.placeholder(dtype=tf.float32, shape=[self.meta_batch_size, None] + list(shape),
+                                name='%s_%s' % (info_key, prefix))
+            all_phs_dict['%s_agent_infos/%s' % (prefix, info_key)] = ph
+            dist_info_ph_dict[info_key] = ph
+
+        num_samples_ph = tf.placeholder(dtype=tf.int32, shape=[self.meta_batch_size], name='num_samples_' + prefix)
+        all_phs_dict['%s_%s' % (prefix, 'num_samples')] = num_samples_ph
+
+        return obs_ph, action_ph, adv_ph, dist_info_ph_dict, num_samples_ph, all_phs_dict
+
     def _adapt_objective_sym(self, action_sym, adv_sym, dist_info_old_sym, dist_info_new_sym):
+        """
+        Inner objective of a task, the mean of some per sample term multiplied with the advantage. It has to be
+        linear in adv_sym, which the batched inner adaptation relies on for masking the padded samples
+        """
         raise NotImplementedError
 
     def _build_inner_adaption(self):
         """
-        Creates the symbolic graph for the one-step inner gradient update (It'll be called several times if
-        more gradient steps are needed)
-
-        Args:
-            some placeholders
+        Creates the symbolic graph for the one-step inner gradient update of all tasks at once (It'll be called
+        several times if more gradient steps are needed). The data and the current params of the tasks are stacked
+        along the first axis, so a single forward pass and a single tf.gradients call yield the adapted params of
+        all tasks: the sum of the task objectives is differentiated, and each task objective only depends on the
+        params of its own task.
 
         Returns:
-            adapted_policies_params (list): list of Ordered Dict containing the symbolic post-update parameters
-            adapt_input_list_ph (list): list of placeholders
+            adapted_policies_params (OrderedDict): symbolic post-update parameters stacked along the first axis
+            adapt_input_ph_dict (OrderedDict): placeholders of the data and of the stacked current parameters
 
         """
-        obs_phs, action_phs, adv_phs, dist_info_old_phs, adapt_input_ph_dict = self._make_input_placeholders('adapt')
+        with tf.variable_scope("adapt_tasks"):
+            obs_ph, action_ph, adv_ph, dist_info_old_ph, num_samples_ph, adapt_input_ph_dict = \
+                self._make_batched_input_placeholders('adapt')
+
+            params_phs = OrderedDict()
+            for key in self.policy.policy_params_keys:
+                shape = self.policy.policy_params[key].get_shape().as_list()
+                params_phs[key] = tf.placeholder(dtype=tf.float32, shape=[self.meta_batch_size] + shape,
+                                                 name='%s_ph' % key)
+                adapt_input_ph_dict['adapt_params/%s' % key] = params_phs[key]
 
-        adapted_policies_params = []
+            with tf.variable_scope("adapt_objective"):
+                distribution_info_new = self.policy.distribution_info_sym(obs_ph, params=params_phs)
 
-        for i in range(self.meta_batch_size):
-            with tf.variable_scope("adapt_task_%i" % i):
-                with tf.variable_scope("adapt_objective"):
-                    distribution_info_new = self.policy.distribution_info_sym(obs_phs[i],
-                                                                              params=self.policy.policies_params_phs[i])
+                # re-weight the advantages such that the padding is ignored and the mean over all samples equals
+                # the sum of the per task means
+                mask = tf.sequence_mask(num_samples_ph, maxlen=tf.shape(obs_ph)[1], dtype=tf.float32)
+                weights = self.meta_batch_size * mask / tf.reduce_mean(mask, axis=1, keepdims=True)
 
-                    # inner surrogate objective
-                    surr_obj_adapt = self._adapt_objective_sym(action_phs[i], adv_phs[i],
-                                                               dist_info_old_phs[i], distribution_info_new)
+                surr_obj_adapt = self._adapt_objective_sym(action_ph, adv_ph * weights,
+                                                           dist_info_old_ph, distribution_info_new)
 
-                # get tf operation for adapted (post-update) policy
-                with tf.variable_scope("adapt_step"):
-                    adapted_policy_param = self._adapt_sym(surr_obj_adapt, self.policy.policies_params_phs[i])
-                adapted_policies_params.append(adapted_policy_param)
+            with tf.variable_scope("adapt_step"):
+                adapted_policies_params = self._adapt_sym(surr_obj_adapt, params_phs)
 
         return adapted_policies_params, adapt_input_ph_dict
 
@@ -228,20 +277,50 @@ class MAMLAlgo(MetaAlgo):
         sess = tf.get_default_session()
 
         # prepare feed dict
-        input_dict = self._extract_input_dict(samples, self._optimization_keys, prefix='adapt')
-        input_ph_dict = self.adapt_input_ph_dict
-
-        feed_dict_inputs = utils.create_feed_dict(placeholder_dict=input_ph_dict, value_dict=input_dict)
-        feed_dict_params = self.policy.policies_params_feed_dict
+        input_dict = self._extract_batched_input_dict(samples, self._optimization_keys, prefix='adapt')
+        for key in self.policy.policy_params_keys:
+            input_dict['adapt_params/%s' % key] = np.stack([params[key] for params in self.policy.policies_params_vals])
 
-        feed_dict = {**feed_dict_inputs, **feed_dict_params}  # merge the two feed dicts
+        feed_dict = utils.create_feed_dict(placeholder_dict=self.adapt_input_ph_dict, value_dict=input_dict)
 
         # compute the post-update / adapted policy parameters
         adapted_policies_params_vals = sess.run(self.adapted_policies_params, feed_dict=feed_dict)
 
         # store the new parameter values in the policy
-        self.policy.update_task_parameters(adapted_policies_params_vals)
+        self.policy.update_task_parameters(
+            [OrderedDict((key, value[i]) for key, value in adapted_policies_params_vals.items())
+             for i in range(self.meta_batch_size)])
+
+    def _extract_batched_input_dict(self, samples_data_meta_batch, keys, prefix=''):
+        """
+        Stacks the processed sample data of the meta-tasks into zero padded arrays of shape
+        (meta_batch_size, max_num_samples, ...) that match the placeholders of _make_batched_input_placeholders
 
+        Args:
+            samples_data_meta_batch (list) : list of dicts containing the processed data corresponding to each meta-task
+            keys (list) : a list of keys that should exist in each dict and whose values shall be extracted
+            prefix (str): prefix to prepend the keys in the resulting OrderedDict
+
+        Returns:
+            OrderedDict containing the stacked data. The data keys follow the naming convention:
+                '<prefix>_<key_name>', in addition '<prefix>_num_samples' holds the number of samples of each task
+        """
+        assert len(samples_data_meta_batch) == self.meta_batch_size
+
+        num_samples = np.array([len(samples_data['observations']) for samples_data in samples_data_meta_batch])
+        input_dict = OrderedDict()
+
+        for key in keys:
+            data = [samples_data[key] for samples_data in samples_data_meta_batch]
+            if isinstance(data[0], dict):
+                for k in data[0].keys():
+                    input_dict['%s_%s/%s' % (prefix, key, k)] = _stack_padded([d[k] for d in data], num_samples)
+            elif isinstance(data[0], np.ndarray):
+                input_dict['%s_%s' % (prefix, key)] = _stack_padded(data, num_samples)
+            else:
+                raise NotImplementedError
+        input_dict['%s_num_samples' % prefix] = num_samples
+        return input_dict
 
     def _extract_input_dict(self, samples_data_meta_batch, keys, prefix=''):
         """
@@ -311,4 +390,11 @@ class MAMLAlgo(MetaAlgo):
                 step_sizes[key] = tf.Variable(initial_value=init_stepsize,
                                               name='%s_step_size' % key,
                                               dtype=tf.float32, trainable=self.trainable_inner_step_size)
-        return step_sizes
\ No newline at end of file
+        return step_sizes
+
+
+def _stack_padded(arrays, num_samples):
+    padded = np.zeros((len(arrays), max(num_samples)) + arrays[0].shape[1:], dtype=np.float32)
+    for i, array in enumerate(arrays):
+        padded[i, :len(array)] = array
+    return padded
\ No newline at end of file
@@ -5,6 +5,7 @@ from asynch_mb.optimizers.conjugate_gradient_optimizer import ConjugateGradientO
 from asynch_mb import utils
 
 import tensorflow as tf
+import time
 import numpy as np
 from collections import OrderedDict
 
@@ -16,6 +17,8 @@ class TRPOMAML(MAMLAlgo):
         policy (Policy): policy object
         name (str): tf variable scope
         step_size (int): trust region size for the meta policy optimization through TPRO
+        hvp_approach (str or obj): Hessian vector product approach of the conjugate gradient optimizer
+        in_graph_cg (bool): whether to run the conjugate gradient iterations inside the graph
         inner_type (str): One of 'log_likelihood', 'likelihood_ratio', 'dice', choose which inner update to use
         exploration (bool): whether to use E-MAML or MAML
         inner_lr (float) : gradient step size used for inner step
@@ -28,6 +31,8 @@ class TRPOMAML(MAMLAlgo):
             *args,
             name="trpo_maml",
             step_size=0.01,
+            hvp_approach='finite_difference',
+            in_graph_cg=False,
             inner_type='likelihood_ratio',
             exploration=False,
             **kwargs
@@ -45,7 +50,7 @@ class TRPOMAML(MAMLAlgo):
             self._optimization_keys.append('adj_avg_rewards')
 
 
-        self.optimizer = ConjugateGradientOptimizer()
+        self.optimizer = ConjugateGradientOptimizer(hvp_approach=hvp_approach, in_graph_cg=in_graph_cg)
 
         self.build_graph()
 
@@ -194,7 +199,9 @@ class TRPOMAML(MAMLAlgo):
         loss_before = self.optimizer.loss(meta_op_input_dict)
         if verbose:
             logger.log("Optimizing")
+        time_optimize = time.time()
         self.optimizer.optimize(meta_op_input_dict)
+        time_optimize = time.time() - time_optimize
         if verbose:
             logger.log("Computing loss after")
         loss_after = self.optimizer.loss(meta_op_input_dict)
@@ -208,4 +215,5 @@ class TRPOMAML(MAMLAlgo):
 
             logger.logkv(prefix+'LossBefore', loss_before)
             logger.logkv(prefix+'LossAfter', loss_after)
-            logger.logkv(prefix+'dLoss', loss_before - loss_after)
\ No newline at end of file
+            logger.logkv(prefix+'dLoss', loss_before - loss_after)
+            logger.logkv(prefix+'TimeOptimize', time_optimize)
\ No newline at end of file
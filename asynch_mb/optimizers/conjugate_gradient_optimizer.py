@@ -104,6 +104,105 @@ class FiniteDifferenceHvp(Optimizer):
         return evaluate_hessian
 
 
+class PearlmutterHvp(Optimizer):
+    """
+    Exact Hessian vector product of the constraint objective, computed in-graph as the gradient of the
+    dot product between the constraint gradient and the vector (Pearlmutter, 1994). Each evaluation is a
+    single session call and, in contrast to FiniteDifferenceHvp, does not modify the parameters of the target.
+    """
+    def __init__(self):
+        self._target = None
+        self.reg_coeff = None
+        self._params = None
+        self._constraint_grads = None
+        self._x_ph = None
+        self._hvp = None
+        self._input_ph_dict = None
+
+    def build_graph(self, constraint_obj, target, input_val_dict, reg_coeff):
+        """
+        Sets the objective function and target weights for the optimize function
+
+        Args:
+            constraint_obj (tf_op) : constraint objective
+            target (Policy) : Policy whose values we are optimizing over
+            inputs (list) : tuple of tf.placeholders for input data which may be subsampled. The first dimension corresponds to the number of data points
+            reg_coeff (float): regularization coefficient
+        """
+        self._target = target
+        self.reg_coeff = reg_coeff
+        self._input_ph_dict = input_val_dict
+
+        params = list(target.get_params().values())
+        constraint_grads = tf.gradients(constraint_obj, xs=params)
+
+        for idx, (grad, param) in enumerate(zip(constraint_grads, params)):
+            if grad is None:
+                constraint_grads[idx] = tf.zeros_like(param)
+
+        self._params = params
+        self._constraint_grads = constraint_grads
+
+        num_params = sum([int(np.prod(param.get_shape().as_list())) for param in params])
+        self._x_ph = tf.placeholder(tf.float32, shape=(num_params,), name='hvp_vector')
+        self._hvp = self.hvp_sym(self._x_ph)
+
+    def hvp_sym(self, x):
+        """
+        Builds the symbolic Hessian vector product (without regularization)
+
+        Args:
+            x (tf.Tensor): flat vector of shape (num_params,)
+
+        Returns:
+            (tf.Tensor): flat Hessian vector product of shape (num_params,)
+        """
+        param_shapes = [param.get_shape().as_list() for param in self._params]
+        xs = tf.split(x, [int(np.prod(shape)) for shape in param_shapes])
+        xs = [tf.reshape(x_param, shape) for x_param, shape in zip(xs, param_shapes)]
+
+        grad_dot_x = tf.add_n([tf.reduce_sum(grad * x_param) for grad, x_param in zip(self._constraint_grads, xs)])
+        hvps = tf.gradients(grad_dot_x, xs=self._params)
+
+        for idx, (hvp, param) in enumerate(zip(hvps, self._params)):
+            if hvp is None:
+                hvps[idx] = tf.zeros_like(param)
+
+        return tf.concat([tf.reshape(hvp, [-1]) for hvp in hvps], axis=0)
+
+    def Hx(self, input_val_dict, x):
+        """
+        Compute the second derivative of the constraint val in the direction of the vector x
+        Args:
+            inputs (list): inputs needed to compute the gradient of the constraint objective
+            x (np.ndarray): vector indicating the direction on which the Hessian has to be computed
+
+        Returns: (np.ndarray): second derivative in the direction of x
+
+        """
+        assert isinstance(x, np.ndarray)
+
+        sess = tf.get_default_session()
+        feed_dict = self.create_feed_dict(input_val_dict)
+        feed_dict[self._x_ph] = x
+        return sess.run(self._hvp, feed_dict)
+
+    def build_eval(self, inputs):
+        """
+        Build the Hessian evaluation function. It let's you evaluate the hessian of the constraint objective
+        in any direction.
+        Args:
+            inputs (list): inputs needed to compute the gradient of the constraint objective
+
+        Returns:
+            (function): function that evaluates the Hessian of the constraint objective in the input direction
+        """
+        def evaluate_hessian(x):
+            return self.Hx(inputs, x) + self.reg_coeff * x
+
+        return evaluate_hessian
+
+
 class ConjugateGradientOptimizer(Optimizer):
     """
     Performs constrained optimization via line search. The search direction is computed using a conjugate gradient
@@ -121,7 +220,10 @@ class ConjugateGradientOptimizer(Optimizer):
         nan is detected
         accept_violation (bool) : whether to accept the descent step if it violates the line search condition after
         exhausting all backtracking budgets
-        hvp_approach (obj) : Hessian vector product approach
+        hvp_approach (obj or str) : Hessian vector product approach - either an object or one of
+        'finite_difference' and 'pearlmutter'
+        in_graph_cg (bool) : whether to run the whole conjugate gradient loop inside the graph (tf.while_loop),
+        which requires an hvp approach that provides hvp_sym (e.g. 'pearlmutter')
     """
 
     def __init__(
@@ -133,9 +235,16 @@ class ConjugateGradientOptimizer(Optimizer):
             max_backtracks=15,
             debug_nan=False,
             accept_violation=False,
-            hvp_approach=FiniteDifferenceHvp(),
+            hvp_approach=None,
+            in_graph_cg=False,
             ):
 
+        if hvp_approach is None or hvp_approach == 'finite_difference':
+            hvp_approach = FiniteDifferenceHvp()
+        elif hvp_approach == 'pearlmutter':
+            hvp_approach = PearlmutterHvp()
+        assert not in_graph_cg or hasattr(hvp_approach, 'hvp_sym'), "in-graph cg requires a symbolic hvp"
+
         self._cg_iters = cg_iters
         self._reg_coeff = reg_coeff
         self._subsample_factor = subsample_factor
@@ -148,6 +257,7 @@ class ConjugateGradientOptimizer(Optimizer):
         self._debug_nan = debug_nan
         self._accept_violation = accept_violation
         self._hvp_approach = hvp_approach
+        self._in_graph_cg = in_graph_cg
         self._loss = None
         self._gradient = None
         self._constraint_objective = None
@@ -189,6 +299,13 @@ class ConjugateGradientOptimizer(Optimizer):
 
         self._gradient = gradient
 
+        # build the graph of the conjugate gradient loop
+        if self._in_graph_cg:
+            def f_Ax(x):
+                return self._hvp_approach.hvp_sym(x) + self._reg_coeff * x
+            self._descent_direction = conjugate_gradients_sym(f_Ax, gradient, cg_iters=self._cg_iters)
+            self._descent_direction_hvp_dot = tf.reduce_sum(self._descent_direction * f_Ax(self._descent_direction))
+
     def loss(self, input_val_dict):
         """
         Computes the value of the loss for given inputs
@@ -258,15 +375,24 @@ class ConjugateGradientOptimizer(Optimizer):
         if verbose:
             logger.log("performing update")
             logger.log("computing gradient")
-        gradient = self.gradient(input_val_dict)
-        if verbose:
-            logger.log("gradient computed")
-            logger.log("computing descent direction")
-        Hx = self._hvp_approach.build_eval(input_val_dict)
-        descent_direction = conjugate_gradients(Hx, gradient, cg_iters=self._cg_iters)
+        if self._in_graph_cg:
+            if verbose:
+                logger.log("computing descent direction in-graph")
+            sess = tf.get_default_session()
+            feed_dict = self.create_feed_dict(input_val_dict)
+            descent_direction, descent_direction_hvp_dot = sess.run([self._descent_direction,
+                                                                     self._descent_direction_hvp_dot], feed_dict)
+        else:
+            gradient = self.gradient(input_val_dict)
+            if verbose:
+                logger.log("gradient computed")
+                logger.log("computing descent direction")
+            Hx = self._hvp_approach.build_eval(input_val_dict)
+            descent_direction = conjugate_gradients(Hx, gradient, cg_iters=self._cg_iters)
+            descent_direction_hvp_dot = descent_direction.dot(Hx(descent_direction))
 
         initial_step_size = np.sqrt(2.0 * self._max_constraint_val *
-                                    (1. / (descent_direction.dot(Hx(descent_direction)) + 1e-8)))
+                                    (1. / (descent_direction_hvp_dot + 1e-8)))
         if np.isnan(initial_step_size):
             logger.log("Initial step size is NaN! Rejecting the step!")
             return
@@ -358,3 +484,34 @@ def conjugate_gradients(f_Ax, b, cg_iters=10, verbose=False, residual_tol=1e-10)
     if verbose: print(fmtstr % (i + 1, rdotr, np.linalg.norm(x)))
 
     return x
+
+
+def conjugate_gradients_sym(f_Ax, b, cg_iters=10, residual_tol=1e-10):
+    """
+    Symbolic version of conjugate_gradients - the iterations are carried out in a tf.while_loop
+
+    Args:
+        f_Ax (function): maps a symbolic vector x to the symbolic matrix vector product Ax
+        b (tf.Tensor): right hand side of the linear system
+        cg_iters (int): maximum number of iterations
+        residual_tol (float): tolerance of the squared residual norm for early stopping
+
+    Returns:
+        (tf.Tensor): approximate solution of Ax = b
+    """
+    def cond(i, x, r, p, rdotr):
+        return tf.logical_and(i < cg_iters, tf.logical_or(tf.equal(i, 0), rdotr >= residual_tol))
+
+    def body(i, x, r, p, rdotr):
+        z = f_Ax(p)
+        v = rdotr / tf.reduce_sum(p * z)
+        x += v * p
+        r -= v * z
+        newrdotr = tf.reduce_sum(r * r)
+        mu = newrdotr / rdotr
+        p = r + mu * p
+        return i + 1, x, r, p, newrdotr
+
+    loop_vars = (tf.constant(0), tf.zeros_like(b), b, b, tf.reduce_sum(b * b))
+    _, x, _, _, _ = tf.while_loop(cond, body, loop_vars, back_prop=False)
+    return x
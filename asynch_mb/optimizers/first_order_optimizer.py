@@ -1 +1 @@
-from asynch_mb.logger import loggerfrom asynch_mb.optimizers.base import Optimizerfrom asynch_mb.utils import Serializableimport numpy as npimport tensorflow as tfclass FirstOrderOptimizer(Optimizer, Serializable):    """    Optimizer for first order methods (SGD, Adam)    Args:        tf_optimizer_cls (tf.train.optimizer): desired tensorflow optimzier for training        tf_optimizer_args (dict or None): arguments for the optimizer        learning_rate (float): learning rate        max_epochs: number of maximum epochs for training        tolerance (float): tolerance for early stopping. If the loss fucntion decreases less than the specified tolerance        after an epoch, then the training stops.        num_minibatches (int): number of mini-batches for performing the gradient step. The mini-batch size is        batch size//num_minibatches.        verbose (bool): Whether to log or not the optimization process    """    def __init__(            self,            tf_optimizer_cls=tf.train.AdamOptimizer,            tf_optimizer_args=None,            learning_rate=1e-3,            max_epochs=1,            tolerance=1e-6,            num_minibatches=1,            verbose=False    ):        Serializable.quick_init(self, locals())        self._target = None        if tf_optimizer_args is None:            tf_optimizer_args = dict()        tf_optimizer_args['learning_rate'] = learning_rate        self._tf_optimizer = tf_optimizer_cls(**tf_optimizer_args)        self._max_epochs = max_epochs        self._tolerance = tolerance        self._verbose = verbose        self._num_minibatches = num_minibatches        self._all_inputs = None        self._train_op = None        self._loss = None        self._input_ph_dict = None    def build_graph(self, loss, target, input_ph_dict, *args, **kwargs):        """        Sets the objective function and target weights for the optimize function        Args:            loss (tf_op) : minimization objective            target (Policy) : Policy whose values we are optimizing over            input_ph_dict (dict) : dict containing the placeholders of the computation graph corresponding to loss        """        assert isinstance(loss, tf.Tensor)        assert hasattr(target, 'get_params')        assert isinstance(input_ph_dict, dict)        self._target = target        self._input_ph_dict = input_ph_dict        self._loss = loss        self._train_op = self._tf_optimizer.minimize(loss, var_list=target.get_params())    def loss(self, input_val_dict):        """        Computes the value of the loss for given inputs        Args:            input_val_dict (dict): dict containing the values to be fed into the computation graph        Returns:            (float): value of the loss        """        sess = tf.get_default_session()        feed_dict = self.create_feed_dict(input_val_dict)        loss = sess.run(self._loss, feed_dict=feed_dict)        return loss    def optimize(self, input_val_dict):        """        Carries out the optimization step        Args:            input_val_dict (dict): dict containing the values to be fed into the computation graph        Returns:            (float) loss before optimization        """        sess = tf.get_default_session()        feed_dict = self.create_feed_dict(input_val_dict)        # Todo: reimplement minibatches        loss_before_opt = None        for epoch in range(self._max_epochs):            if self._verbose:                logger.log("Epoch %d" % epoch)            loss, _ = sess.run([self._loss, self._train_op], feed_dict)            if not loss_before_opt: loss_before_opt = loss        return loss_before_optclass RNNFirstOrderOptimizer(Optimizer):    """    Optimizer for first order methods (SGD, Adam)    Args:        tf_optimizer_cls (tf.train.optimizer): desired tensorflow optimzier for training        tf_optimizer_args (dict or None): arguments for the optimizer        learning_rate (float): learning rate        max_epochs: number of maximum epochs for training        tolerance (float): tolerance for early stopping. If the loss fucntion decreases less than the specified tolerance        after an epoch, then the training stops.        num_minibatches (int): number of mini-batches for performing the gradient step. The mini-batch size is        batch size//num_minibatches.        verbose (bool): Whether to log or not the optimization process    """    def __init__(            self,            tf_optimizer_cls=tf.train.AdamOptimizer,            tf_optimizer_args=None,            learning_rate=1e-3,            max_epochs=1,            tolerance=1e-6,            num_minibatches=1,            backprop_steps=32,            verbose=False    ):        self._target = None        if tf_optimizer_args is None:            tf_optimizer_args = dict()        tf_optimizer_args['learning_rate'] = learning_rate        self._tf_optimizer = tf_optimizer_cls(**tf_optimizer_args)        self._max_epochs = max_epochs        self._tolerance = tolerance        self._num_minibatches = num_minibatches  # Unused        self._verbose = verbose        self._all_inputs = None        self._train_op = None        self._loss = None        self._next_hidden_var = None        self._hidden_ph = None        self._input_ph_dict = None        self._backprop_steps = backprop_steps    def build_graph(self, loss, target, input_ph_dict, hidden_ph, next_hidden_var):        """        Sets the objective function and target weights for the optimize function        Args:            loss (tf_op) : minimization objective            target (Policy) : Policy whose values we are optimizing over            input_ph_dict (dict) : dict containing the placeholders of the computation graph corresponding to loss        """        assert isinstance(loss, tf.Tensor)        assert hasattr(target, 'get_params')        assert isinstance(input_ph_dict, dict)        self._target = target        self._input_ph_dict = input_ph_dict        self._loss = loss        self._hidden_ph = hidden_ph        self._next_hidden_var = next_hidden_var        params = list(target.get_params().values())        self._gradients_var = tf.gradients(loss, params)        self._gradients_ph = [tf.placeholder(shape=param.shape, dtype=tf.float32) for param in params]        applied_gradients = zip(self._gradients_ph, params)        self._train_op = self._tf_optimizer.apply_gradients(applied_gradients)    def loss(self, input_val_dict):        """        Computes the value of the loss for given inputs        Args:            input_val_dict (dict): dict containing the values to be fed into the computation graph        Returns:            (float): value of the loss        """        sess = tf.get_default_session()        feed_dict = self.create_feed_dict(input_val_dict)        batch_size, seq_len, *_ = list(input_val_dict.values())[0].shape        hidden_batch = self._target.get_zero_state(batch_size)        feed_dict[self._hidden_ph] = hidden_batch        loss = sess.run(self._loss, feed_dict=feed_dict)        return loss    def optimize(self, input_val_dict):        """        Carries out the optimization step        Args:            input_val_dict (dict): dict containing the values to be fed into the computation graph        Returns:            (float) loss before optimization        """        sess = tf.get_default_session()        batch_size, seq_len, *_ = list(input_val_dict.values())[0].shape        loss_before_opt = None        for epoch in range(self._max_epochs):            hidden_batch = self._target.get_zero_state(batch_size)            if self._verbose:                logger.log("Epoch %d" % epoch)            # run train op            loss = []            all_grads = []            for i in range(0, seq_len, self._backprop_steps):                n_i = i + self._backprop_steps                feed_dict = dict([(self._input_ph_dict[key], input_val_dict[key][:, i:n_i]) for key in                                  self._input_ph_dict.keys()])                feed_dict[self._hidden_ph] = hidden_batch                batch_loss, grads, hidden_batch = sess.run([self._loss, self._gradients_var, self._next_hidden_var],                                                            feed_dict=feed_dict)                loss.append(batch_loss)                all_grads.append(grads)            grads = [np.mean(grad, axis=0) for grad in zip(*all_grads)]            feed_dict = dict(zip(self._gradients_ph, grads))            _ = sess.run(self._train_op, feed_dict=feed_dict)            if not loss_before_opt: loss_before_opt = np.mean(loss)            # if self._verbose:            #     logger.log("Epoch: %d | Loss: %f" % (epoch, new_loss))            #            # if abs(last_loss - new_loss) < self._tolerance:            #     break            # last_loss = new_loss        return loss_before_opt
\ No newline at end of file
+from asynch_mb.logger import loggerfrom asynch_mb.optimizers.base import Optimizerfrom asynch_mb.utils import Serializablefrom collections import OrderedDictimport numpy as npimport tensorflow as tfclass FirstOrderOptimizer(Optimizer, Serializable):    """    Optimizer for first order methods (SGD, Adam)    Args:        tf_optimizer_cls (tf.train.optimizer): desired tensorflow optimzier for training        tf_optimizer_args (dict or None): arguments for the optimizer        learning_rate (float): learning rate        max_epochs: number of maximum epochs for training        tolerance (float): tolerance for early stopping. If the loss fucntion decreases less than the specified tolerance        after an epoch, then the training stops.        num_minibatches (int): number of mini-batches for performing the gradient step. The mini-batch size is        batch size//num_minibatches.        verbose (bool): Whether to log or not the optimization process    The inputs are copied once per call of optimize into variables (the dataset) and the minibatches of each epoch are    drawn from a random permutation inside the graph, so only the minibatch is pushed through the loss graph, which is    copied with its placeholders replaced by the minibatch tensors. Inputs with the same number of samples share the    same permutation. The returned loss before optimization is evaluated on the whole dataset.    """    def __init__(            self,            tf_optimizer_cls=tf.train.AdamOptimizer,            tf_optimizer_args=None,            learning_rate=1e-3,            max_epochs=1,            tolerance=1e-6,            num_minibatches=1,            verbose=False    ):        Serializable.quick_init(self, locals())        self._target = None        if tf_optimizer_args is None:            tf_optimizer_args = dict()        tf_optimizer_args['learning_rate'] = learning_rate        self._tf_optimizer = tf_optimizer_cls(**tf_optimizer_args)        self._max_epochs = max_epochs        self._tolerance = tolerance        self._verbose = verbose        self._num_minibatches = num_minibatches        self._all_inputs = None        self._train_op = None        self._loss = None        self._input_ph_dict = None        self._minibatch_loss = None        self._dataset_loss = None        self._load_dataset_op = None        self._shuffle_op = None        self._minibatch_idx_ph = None    def build_graph(self, loss, target, input_ph_dict, *args, **kwargs):        """        Sets the objective function and target weights for the optimize function        Args:            loss (tf_op) : minimization objective            target (Policy) : Policy whose values we are optimizing over            input_ph_dict (dict) : dict containing the placeholders of the computation graph corresponding to loss        """        assert isinstance(loss, tf.Tensor)        assert hasattr(target, 'get_params')        assert isinstance(input_ph_dict, dict)        self._target = target        self._input_ph_dict = input_ph_dict        self._loss = loss        with tf.variable_scope(None, default_name='minibatch_dataset'):            dataset_vars = OrderedDict()            for key, ph in input_ph_dict.items():                sample_shape = ph.shape[1:].as_list()                assert None not in sample_shape, "the inputs may only have a variable batch dimension"                dataset_vars[key] = tf.Variable(tf.zeros([0] + sample_shape, dtype=ph.dtype), trainable=False,                                                validate_shape=False, name=key.replace('/', '_'))            max_num_samples = tf.reduce_max(tf.stack([tf.shape(var)[0] for var in dataset_vars.values()]))            random_keys = tf.Variable(tf.zeros([0]), trainable=False, validate_shape=False, name='random_keys')            self._load_dataset_op = tf.group(*[tf.assign(dataset_vars[key], ph, validate_shape=False)                                               for key, ph in input_ph_dict.items()])            self._shuffle_op = tf.assign(random_keys, tf.random_uniform([max_num_samples]), validate_shape=False)            self._minibatch_idx_ph = tf.placeholder(dtype=tf.int32, shape=(), name='minibatch_idx')            minibatch, dataset = dict(), dict()            for key, ph in input_ph_dict.items():                num_samples = tf.shape(dataset_vars[key])[0]                # the permutation only depends on the number of samples, i.e. it is shared by inputs of equal length                permutation = tf.nn.top_k(random_keys[:num_samples], k=num_samples).indices                start = self._minibatch_idx_ph * num_samples // self._num_minibatches                end = (self._minibatch_idx_ph + 1) * num_samples // self._num_minibatches                minibatch[ph] = tf.gather(dataset_vars[key], permutation[start:end])                minibatch[ph].set_shape(ph.shape)                dataset[ph] = tf.identity(dataset_vars[key])                dataset[ph].set_shape(ph.shape)        self._minibatch_loss = tf.contrib.graph_editor.graph_replace(loss, minibatch)        self._dataset_loss = tf.contrib.graph_editor.graph_replace(loss, dataset)        self._train_op = self._tf_optimizer.minimize(self._minibatch_loss, var_list=target.get_params())    def loss(self, input_val_dict):        """        Computes the value of the loss for given inputs        Args:            input_val_dict (dict): dict containing the values to be fed into the computation graph        Returns:            (float): value of the loss        """        sess = tf.get_default_session()        feed_dict = self.create_feed_dict(input_val_dict)        loss = sess.run(self._loss, feed_dict=feed_dict)        return loss    def optimize(self, input_val_dict):        """        Carries out the optimization step        Args:            input_val_dict (dict): dict containing the values to be fed into the computation graph        Returns:            (float) loss before optimization        """        sess = tf.get_default_session()        sess.run(self._load_dataset_op, feed_dict=self.create_feed_dict(input_val_dict))        loss_before_opt = sess.run(self._dataset_loss)        last_loss = None        for epoch in range(self._max_epochs):            if self._verbose:                logger.log("Epoch %d" % epoch)            sess.run(self._shuffle_op)            loss = []            for minibatch_idx in range(self._num_minibatches):                batch_loss, _ = sess.run([self._minibatch_loss, self._train_op],                                         feed_dict={self._minibatch_idx_ph: minibatch_idx})                loss.append(batch_loss)            new_loss = np.mean(loss)            if self._verbose:                logger.log("Epoch: %d | Loss: %f" % (epoch, new_loss))            if last_loss is not None and abs(last_loss - new_loss) < self._tolerance:                break            last_loss = new_loss        return loss_before_optclass RNNFirstOrderOptimizer(Optimizer):    """    Optimizer for first order methods (SGD, Adam)    Args:        tf_optimizer_cls (tf.train.optimizer): desired tensorflow optimzier for training        tf_optimizer_args (dict or None): arguments for the optimizer        learning_rate (float): learning rate        max_epochs: number of maximum epochs for training        tolerance (float): tolerance for early stopping. If the loss fucntion decreases less than the specified tolerance        after an epoch, then the training stops.        num_minibatches (int): number of mini-batches for performing the gradient step. The mini-batch size is        batch size//num_minibatches.        verbose (bool): Whether to log or not the optimization process    """    def __init__(            self,            tf_optimizer_cls=tf.train.AdamOptimizer,            tf_optimizer_args=None,            learning_rate=1e-3,            max_epochs=1,            tolerance=1e-6,            num_minibatches=1,            backprop_steps=32,            verbose=False    ):        self._target = None        if tf_optimizer_args is None:            tf_optimizer_args = dict()        tf_optimizer_args['learning_rate'] = learning_rate        self._tf_optimizer = tf_optimizer_cls(**tf_optimizer_args)        self._max_epochs = max_epochs        self._tolerance = tolerance        self._num_minibatches = num_minibatches        self._verbose = verbose        self._all_inputs = None        self._train_op = None        self._loss = None        self._next_hidden_var = None        self._hidden_ph = None        self._input_ph_dict = None        self._backprop_steps = backprop_steps        self._accumulate_op = None        self._reset_accumulators_op = None    def build_graph(self, loss, target, input_ph_dict, hidden_ph, next_hidden_var):        """        Sets the objective function and target weights for the optimize function        Args:            loss (tf_op) : minimization objective            target (Policy) : Policy whose values we are optimizing over            input_ph_dict (dict) : dict containing the placeholders of the computation graph corresponding to loss        """        assert isinstance(loss, tf.Tensor)        assert hasattr(target, 'get_params')        assert isinstance(input_ph_dict, dict)        self._target = target        self._input_ph_dict = input_ph_dict        self._loss = loss        self._hidden_ph = hidden_ph        self._next_hidden_var = next_hidden_var        params = list(target.get_params().values())        gradients = tf.gradients(loss, params)        # the gradients of the truncated backprop chunks are summed up in variables, such that they never leave the        # graph, and their mean is applied at the end of the minibatch        with tf.variable_scope('gradient_accumulators'):            accumulators = [tf.Variable(tf.zeros(param.shape, dtype=tf.float32), trainable=False)                            for param in params]            num_accumulated = tf.Variable(0., dtype=tf.float32, trainable=False)        self._accumulate_op = tf.group(*[tf.assign_add(acc, grad) for acc, grad in zip(accumulators, gradients)],                                       tf.assign_add(num_accumulated, 1.))        self._reset_accumulators_op = tf.group(*[tf.assign(acc, tf.zeros_like(acc)) for acc in accumulators],                                               tf.assign(num_accumulated, 0.))        applied_gradients = zip([acc / tf.maximum(num_accumulated, 1.) for acc in accumulators], params)        self._train_op = self._tf_optimizer.apply_gradients(applied_gradients)    def loss(self, input_val_dict):        """        Computes the value of the loss for given inputs        Args:            input_val_dict (dict): dict containing the values to be fed into the computation graph        Returns:            (float): value of the loss        """        sess = tf.get_default_session()        feed_dict = self.create_feed_dict(input_val_dict)        batch_size, seq_len, *_ = list(input_val_dict.values())[0].shape        hidden_batch = self._target.get_zero_state(batch_size)        feed_dict[self._hidden_ph] = hidden_batch        loss = sess.run(self._loss, feed_dict=feed_dict)        return loss    def optimize(self, input_val_dict):        """        Carries out the optimization step        Args:            input_val_dict (dict): dict containing the values to be fed into the computation graph        Returns:            (float) loss before optimization        """        sess = tf.get_default_session()        batch_size, seq_len, *_ = list(input_val_dict.values())[0].shape        num_minibatches = min(self._num_minibatches, batch_size)        loss_before_opt = None        for epoch in range(self._max_epochs):            if self._verbose:                logger.log("Epoch %d" % epoch)            loss = []            for minibatch_idxs in np.array_split(np.random.permutation(batch_size), num_minibatches):                hidden_batch = self._target.get_zero_state(len(minibatch_idxs))                sess.run(self._reset_accumulators_op)                # accumulate the gradients of the chunks of the sequences and carry the hidden state between them                for i in range(0, seq_len, self._backprop_steps):                    n_i = i + self._backprop_steps                    feed_dict = dict([(self._input_ph_dict[key], input_val_dict[key][minibatch_idxs, i:n_i])                                      for key in self._input_ph_dict.keys()])                    feed_dict[self._hidden_ph] = hidden_batch                    batch_loss, _, hidden_batch = sess.run([self._loss, self._accumulate_op, self._next_hidden_var],                                                           feed_dict=feed_dict)                    loss.append(batch_loss)                sess.run(self._train_op)            if not loss_before_opt: loss_before_opt = np.mean(loss)        return loss_before_opt
\ No newline at end of file
@@ -13,7 +13,6 @@ class MAMLPPOOptimizer(FirstOrderOptimizer):
 
     """
     def __init__(self, *args, **kwargs):
-        # Todo: reimplement minibatches
         super(MAMLPPOOptimizer, self).__init__(*args, **kwargs)
         self._inner_kl = None
         self._outer_kl = None
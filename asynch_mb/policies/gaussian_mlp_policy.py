@@ -2,7 +2,7 @@ from asynch_mb.utils.networks.mlp import create_mlp, forward_mlp
 from asynch_mb.policies.distributions.diagonal_gaussian import DiagonalGaussian
 from asynch_mb.policies.base import Policy
 from asynch_mb.utils import Serializable
-from asynch_mb.utils.utils import remove_scope_from_name
+from asynch_mb.utils.utils import remove_scope_from_name, InfoBatch
 from asynch_mb.logger import logger
 
 import tensorflow as tf
@@ -118,7 +118,7 @@ class GaussianMLPPolicy(Policy):
         actions, means, log_stds = sess.run([self.action_var, self.mean_var, self.log_std_var],
                                              feed_dict={self.obs_var: observations})
 
-        agent_infos = [dict(mean=mean, log_std=log_stds[0]) for mean in means]
+        agent_infos = InfoBatch(mean=means, log_std=np.tile(log_stds, (len(means), 1)))
         return actions, agent_infos
 
     # def get_actions(self, observations):
@@ -214,6 +214,8 @@ class GaussianMLPPolicy(Policy):
                                             )
 
             log_std_var = log_std_network_params[0]
+            if mean_var.shape.ndims == 3:  # stacked params, broadcast the log_std of each set over its samples
+                log_std_var = tf.reshape(log_std_var, [-1, 1, self.action_dim])
 
         return dict(mean=mean_var, log_std=log_std_var)
 
@@ -79,6 +79,7 @@ class GaussianRNNPolicy(Policy):
                 self.log_std_var = tf.maximum(log_std_var, self.min_log_std, name='log_std')
 
             # symbolically define sampled action and distribution
+            self.action_var = self.mean_var + tf.random_normal(shape=tf.shape(self.mean_var)) * tf.exp(self.log_std_var)
             self._dist = DiagonalGaussian(self.action_dim)
 
             # save the policy's trainable variables in dicts
@@ -121,13 +122,12 @@ class GaussianRNNPolicy(Policy):
             raise AssertionError
 
         sess = tf.get_default_session()
-        means, logs_stds, self._hidden_state = sess.run([self.mean_var, self.log_std_var,  self.next_hidden_var],
-                                                     feed_dict={self.obs_var: observations,
-                                                                self.hidden_var: self._hidden_state})
+        actions, means, logs_stds, self._hidden_state = sess.run([self.action_var, self.mean_var, self.log_std_var,
+                                                                  self.next_hidden_var],
+                                                                 feed_dict={self.obs_var: observations,
+                                                                            self.hidden_var: self._hidden_state})
 
         assert means.ndim == 3 and means.shape[-1] == self.action_dim
-        rnd = np.random.normal(size=means.shape)
-        actions = means + rnd * np.exp(logs_stds)
 
         means = means[:, 0, :]
         logs_stds = logs_stds[0, :]
@@ -185,6 +185,32 @@ class GaussianRNNPolicy(Policy):
 
         return dict(mean=mean_var, log_std=log_std_var), hidden_var, next_hidden_var
 
+    def distribution_info_step_sym(self, obs_var, hidden_var):
+        """
+        Return the symbolic distribution information about the actions of a single time step, i.e. one step of the
+        recurrent cell starting from the given hidden state. Used to unroll the policy inside a tf.while_loop.
+
+        Args:
+            obs_var (tf.Tensor) : symbolic variable for observations - shape: (batch_size, obs_dim)
+            hidden_var (tf.Tensor or tuple) : hidden state of the cell, structured like cell.zero_state(batch_size)
+
+        Returns:
+            (tuple) : a dictionary of tf tensors for the policy output distribution and the next hidden state
+        """
+        with tf.variable_scope(self.name, reuse=True):
+            rnn_outs = create_rnn(name="mean_network",
+                                  output_dim=self.action_dim,
+                                  hidden_sizes=self.hidden_sizes,
+                                  hidden_nonlinearity=self.hidden_nonlinearity,
+                                  output_nonlinearity=self.output_nonlinearity,
+                                  input_var=tf.expand_dims(obs_var, axis=1),
+                                  state_var=hidden_var,
+                                  cell_type=self._cell_type,
+                                  )
+            _, _, mean_var, next_hidden_var, _ = rnn_outs
+
+        return dict(mean=mean_var[:, 0], log_std=self.log_std_var), next_hidden_var
+
     def distribution_info_keys(self, obs, state_infos):
         """
         Args:
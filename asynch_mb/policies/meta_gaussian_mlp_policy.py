@@ -3,6 +3,8 @@ from asynch_mb.policies.gaussian_mlp_policy import GaussianMLPPolicy
 import numpy as np
 import tensorflow as tf
 from asynch_mb.utils.networks.mlp import forward_mlp
+from asynch_mb.utils.utils import InfoBatch, remove_scope_from_name
+from collections import OrderedDict
 
 
 class MetaGaussianMLPPolicy(GaussianMLPPolicy, MetaPolicy):
@@ -17,6 +19,10 @@ class MetaGaussianMLPPolicy(GaussianMLPPolicy, MetaPolicy):
         self.post_update_action_var = None
         self.post_update_mean_var = None
         self.post_update_log_std_var = None
+
+        self.adapted_params_vars = None
+        self._adapted_params_assign_ops = None
+        self._adapted_params_assign_phs = None
         GaussianMLPPolicy.__init__(self, *args, **kwargs)
         # MetaPolicy.__init__(self, *args, **kwargs)
         # super does not call MetaPolicy.__init__()
@@ -35,6 +41,21 @@ class MetaGaussianMLPPolicy(GaussianMLPPolicy, MetaPolicy):
         self.pre_update_mean_var = tf.split(self.mean_var, self.meta_batch_size)
         self.pre_update_log_std_var = [self.log_std_var for _ in range(self.meta_batch_size)]
 
+        # Create variables that hold the adapted parameters of all tasks (stacked along the first axis). They are
+        # written once by update_task_parameters, such that the post-update sampling steps only feed observations
+        with tf.variable_scope(self.name + "_adapted_params"):
+            self.adapted_params_vars = OrderedDict()
+            self._adapted_params_assign_phs = OrderedDict()
+            self._adapted_params_assign_ops = []
+            for var_name, var in self.policy_params.items():
+                shape = (self.meta_batch_size,) + tuple(var.shape.as_list())
+                adapted_var = tf.get_variable(var_name, shape=shape, dtype=var.dtype.base_dtype,
+                                              initializer=tf.zeros_initializer(), trainable=False)
+                assign_ph = tf.placeholder(dtype=var.dtype.base_dtype, shape=shape, name="%s_assign_ph" % var_name)
+                self.adapted_params_vars[var_name] = adapted_var
+                self._adapted_params_assign_phs[var_name] = assign_ph
+                self._adapted_params_assign_ops.append(tf.assign(adapted_var, assign_ph))
+
         # Create lightweight policy graph that takes the policy parameters as placeholders
         with tf.variable_scope(self.name + "_ph_graph"):
             mean_network_phs_meta_batch, log_std_network_phs_meta_batch = [], []
@@ -51,8 +72,8 @@ class MetaGaussianMLPPolicy(GaussianMLPPolicy, MetaPolicy):
 
                     with tf.variable_scope("mean_network"):
                         # create mean network parameter placeholders
-                        mean_network_phs = self._create_placeholders_for_vars(
-                            scope=self.name + "/mean_network")  # -> returns ordered dict
+                        mean_network_phs = self._create_adapted_params_phs(
+                            scope=self.name + "/mean_network", task_idx=idx)  # -> returns ordered dict
                         mean_network_phs_meta_batch.append(mean_network_phs)
 
                         # forward pass through the mean mpl
@@ -66,7 +87,8 @@ class MetaGaussianMLPPolicy(GaussianMLPPolicy, MetaPolicy):
 
                     with tf.variable_scope("log_std_network"):
                         # create log_stf parameter placeholders
-                        log_std_network_phs = self._create_placeholders_for_vars(scope=self.name + "/log_std_network") # -> returns ordered dict
+                        log_std_network_phs = self._create_adapted_params_phs(scope=self.name + "/log_std_network",
+                                                                              task_idx=idx) # -> returns ordered dict
                         log_std_network_phs_meta_batch.append(log_std_network_phs)
 
                         log_std_var = list(log_std_network_phs.values())[0]  # weird stuff since log_std_network_phs is ordered dict
@@ -106,7 +128,7 @@ class MetaGaussianMLPPolicy(GaussianMLPPolicy, MetaPolicy):
             observations (list): List of numpy arrays of shape (meta_batch_size, batch_size, obs_dim)
 
         Returns:
-            (tuple) : A tuple containing a list of numpy arrays of action, and a list of list of dicts of agent infos
+            (tuple) : A tuple containing a list of numpy arrays of action, and a list of InfoBatches of agent infos
         """
         assert len(observations) == self.meta_batch_size
 
@@ -140,8 +162,8 @@ class MetaGaussianMLPPolicy(GaussianMLPPolicy, MetaPolicy):
                                                 feed_dict=feed_dict)
             log_stds = np.concatenate(
                 log_stds)  # Get rid of fake batch size dimension (would be better to do this in tf, if we can match batch sizes)
-            agent_infos = [[dict(mean=mean, log_std=log_stds[idx]) for mean in means[idx]] for idx in
-                           range(self.meta_batch_size)]
+            agent_infos = [InfoBatch(mean=means[idx], log_std=np.tile(log_stds[idx], (len(means[idx]), 1)))
+                           for idx in range(self.meta_batch_size)]
         else:
             assert type(observations) is np.ndarray and observations.ndim == 2
 
@@ -150,8 +172,8 @@ class MetaGaussianMLPPolicy(GaussianMLPPolicy, MetaPolicy):
                                                  self.pre_update_mean_var,
                                                  self.pre_update_log_std_var],
                                                  feed_dict=feed_dict)
-            actions = np.concatenate(actions)
-            agent_infos = [dict(mean=mean, log_std=log_stds[0]) for mean in means]
+            actions, means = np.concatenate(actions), np.concatenate(means)
+            agent_infos = InfoBatch(mean=means, log_std=np.tile(log_stds[0], (len(means), 1)))
 
         return actions, agent_infos
 
@@ -163,8 +185,7 @@ class MetaGaussianMLPPolicy(GaussianMLPPolicy, MetaPolicy):
         """
         assert self.policies_params_vals is not None
         obs_stack = np.concatenate(observations, axis=0)
-        feed_dict = {self.obs_var: obs_stack}
-        feed_dict.update(self.policies_params_feed_dict)
+        feed_dict = {self.obs_var: obs_stack}  # the adapted parameters are read from the adapted_params_vars
 
         sess = tf.get_default_session()
         actions, means, log_stds = sess.run([self.post_update_action_var,
@@ -172,6 +193,32 @@ class MetaGaussianMLPPolicy(GaussianMLPPolicy, MetaPolicy):
                                              self.post_update_log_std_var],
                                             feed_dict=feed_dict)
         log_stds = np.concatenate(log_stds) # Get rid of fake batch size dimension (would be better to do this in tf, if we can match batch sizes)
-        agent_infos = [[dict(mean=mean, log_std=log_stds[idx]) for mean in means[idx]] for idx in range(self.meta_batch_size)]
+        agent_infos = [InfoBatch(mean=means[idx], log_std=np.tile(log_stds[idx], (len(means[idx]), 1)))
+                       for idx in range(self.meta_batch_size)]
         return actions, agent_infos
 
+    def update_task_parameters(self, updated_policies_parameters):
+        """
+        Args:
+            updated_policies_parameters (list): List of size meta-batch size. Each contains a dict with the policies
+            parameters as numpy arrays
+        """
+        super(MetaGaussianMLPPolicy, self).update_task_parameters(updated_policies_parameters)
+        feed_dict = {assign_ph: np.stack([params[key] for params in updated_policies_parameters])
+                     for key, assign_ph in self._adapted_params_assign_phs.items()}
+        tf.get_default_session().run(self._adapted_params_assign_ops, feed_dict=feed_dict)
+
+    def _create_adapted_params_phs(self, scope, task_idx):
+        """
+        Creates placeholders for the parameters of the post-update policy of a task, which default to the adapted
+        parameters stored in the adapted_params_vars (the inner adaptation still feeds them explicitly)
+        """
+        var_list = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope=scope)
+        placeholders = []
+        for var in var_list:
+            var_name = remove_scope_from_name(var.name, scope.split('/')[0])
+            default = self.adapted_params_vars[var_name][task_idx]
+            placeholders.append((var_name, tf.placeholder_with_default(default, shape=var.shape,
+                                                                       name="%s_ph" % var_name)))
+        return OrderedDict(placeholders)
+
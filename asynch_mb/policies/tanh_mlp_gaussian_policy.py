@@ -2,7 +2,7 @@ from asynch_mb.utils.networks.mlp import create_mlp, forward_mlp
 from asynch_mb.policies.distributions.diagonal_gaussian import DiagonalGaussian
 from asynch_mb.policies.base import Policy
 from asynch_mb.utils import Serializable
-from asynch_mb.utils.utils import remove_scope_from_name
+from asynch_mb.utils.utils import remove_scope_from_name, InfoBatch
 from asynch_mb.logger import logger
 import tensorflow as tf
 import numpy as np
@@ -113,11 +113,10 @@ class TanhGaussianMLPPolicy(Policy):
         actions, means, log_stds = sess.run([self.action_var, self.mean_var, self.log_std_var],
                                              feed_dict={self.obs_var: observations})
         if self.squashed:
-            agent_infos = [dict(mean=mean, log_std=log_std, pre_tanh=action)
-                           for (action, log_std, mean) in zip(means, log_stds, actions)]
+            agent_infos = InfoBatch(mean=means, log_std=log_stds, pre_tanh=actions)
             actions = np.tanh(actions)
         else:
-            agent_infos = [dict(mean=mean, log_std=log_std) for mean, log_std in zip(means, log_stds)]
+            agent_infos = InfoBatch(mean=means, log_std=log_stds)
         return actions, agent_infos
 
     def log_diagnostics(self, paths, prefix=''):
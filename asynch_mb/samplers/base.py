@@ -3,7 +3,6 @@ from asynch_mb.logger import logger
 from asynch_mb.utils.serializable import Serializable
 import time
 import numpy as np
-import copy
 from pyprind import ProgBar
 
 
@@ -194,18 +193,17 @@ class SampleProcessor(object):
         assert type(paths) == list
 
         # 1) compute discounted rewards (returns)
-        for idx, path in enumerate(paths):
-            path["returns"] = utils.discount_cumsum(path["rewards"], self.discount)
+        paths = self._compute_returns(paths)
 
         # 2) fit baseline estimator using the path returns and predict the return baselines
-        self.baseline.fit(paths, target_key="returns")
-        all_path_baselines = [self.baseline.predict(path) for path in paths]
+        all_path_baselines = self.baseline.fit_predict(paths, target_key="returns")
 
         # 3) compute advantages and adjusted rewards
         paths = self._compute_advantages(paths, all_path_baselines)
 
-        # 4) stack path data
-        observations, actions, rewards, dones, returns, advantages, env_infos, agent_infos = self._concatenate_path_data(copy.deepcopy(paths))
+        # 4) stack path data - concatenating allocates new arrays, the paths (possibly views into the memory of the
+        #    sampler) are only read and need not be copied beforehand
+        observations, actions, rewards, dones, returns, advantages, env_infos, agent_infos = self._concatenate_path_data(paths)
 
         # 5) if desired normalize / shift advantages
         if self.normalize_adv:
@@ -245,17 +243,30 @@ class SampleProcessor(object):
 
         return np.mean(undiscounted_returns)
 
+    def _compute_returns(self, paths):
+        path_lengths = [len(path["rewards"]) for path in paths]
+        rewards = np.concatenate([path["rewards"] for path in paths])
+        returns = utils.discount_cumsum_paths(rewards, path_lengths, self.discount)
+
+        for path, path_returns in zip(paths, utils.split_paths(returns, path_lengths)):
+            path["returns"] = path_returns
+        return paths
+
     def _compute_advantages(self, paths, all_path_baselines):
         assert len(paths) == len(all_path_baselines)
 
-        for idx, path in enumerate(paths):
-            path_baselines = np.append(all_path_baselines[idx], 0)
-            deltas = path["rewards"] + \
-                     self.discount * path_baselines[1:] - \
-                     path_baselines[:-1]
-            path["advantages"] = utils.discount_cumsum(
-                deltas, self.discount * self.gae_lambda)
+        # GAE on the concatenated data of all paths, the baseline after the last step of a path is zero
+        path_lengths = [len(path["rewards"]) for path in paths]
+        rewards = np.concatenate([path["rewards"] for path in paths])
+        baselines = np.concatenate(all_path_baselines)
+        next_baselines = np.append(baselines[1:], 0)
+        next_baselines[np.cumsum(path_lengths) - 1] = 0
+
+        deltas = rewards + self.discount * next_baselines - baselines
+        advantages = utils.discount_cumsum_paths(deltas, path_lengths, self.discount * self.gae_lambda)
 
+        for path, path_advantages in zip(paths, utils.split_paths(advantages, path_lengths)):
+            path["advantages"] = path_advantages
         return paths
 
     def _concatenate_path_data(self, paths):
@@ -265,8 +276,8 @@ class SampleProcessor(object):
         dones = np.concatenate([path["dones"] for path in paths])
         returns = np.concatenate([path["returns"] for path in paths])
         advantages = np.concatenate([path["advantages"] for path in paths])
-        env_infos = utils.concat_tensor_dict_list([path["env_infos"] for path in paths])
-        agent_infos = utils.concat_tensor_dict_list([path["agent_infos"] for path in paths])
+        env_infos = utils.InfoBatch.concat([path["env_infos"] for path in paths])
+        agent_infos = utils.InfoBatch.concat([path["agent_infos"] for path in paths])
         return observations, actions, rewards, dones, returns, advantages, env_infos, agent_infos
 
     def _stack_path_data(self, paths):
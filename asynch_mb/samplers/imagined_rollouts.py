@@ -0,0 +1,238 @@
+from asynch_mb.utils import utils
+import numpy as np
+import tensorflow as tf
+
+
+class ImaginedRolloutEngine(object):
+    """
+    Samples whole batches of trajectories from the learned dynamics model in one session call. The interaction
+    of the policy, the dynamics model and the reward function is unrolled symbolically inside a tf.while_loop,
+    so that the graph size does not grow with the number of steps.
+
+    Environments are reset when the max_path_length is reached or when the (optional) tf_done function of the env
+    returns True. The new initial observations are drawn uniformly from a pool of initial observations, i.e. the
+    states of the buffer with time_steps == 0 or, if no buffer is given, states obtained from env.reset().
+
+    The state of the rollouts (observations, time steps and, for recurrent policies, the hidden state of the policy)
+    is kept in variables, so the num_steps steps can be split into several session calls of steps_per_call steps
+    each. The hidden state of an environment is reset to zero together with the environment.
+
+    Args:
+        env (gym.Env) : environment object, must implement tf_reward and optionally tf_done
+        policy (Policy) : policy object, if meta_batch_size is given a MetaPolicy
+        dynamics_model (MLPDynamicsEnsemble) : dynamics model used to predict the next observations
+        num_envs (int) : number of environments that are rolled out in parallel
+        num_steps (int) : number of steps of each environment per call of obtain_samples
+        max_path_length (int) : max number of steps per trajectory
+        meta_batch_size (int or None) : if not None, the environments are split into meta_batch_size tasks, each
+                                        task being executed with its own (adapted) policy and the next observations
+                                        being predicted with predict_batches_sym
+        steps_per_call (int or None) : number of steps unrolled per session call, defaults to num_steps
+    """
+
+    def __init__(self, env, policy, dynamics_model, num_envs, num_steps, max_path_length, meta_batch_size=None,
+                 steps_per_call=None):
+        self.env = env
+        self.policy = policy
+        self.dynamics_model = dynamics_model
+        self.num_envs = num_envs
+        self.num_steps = num_steps
+        self.max_path_length = max_path_length
+        self.meta_batch_size = meta_batch_size
+        self.steps_per_call = num_steps if steps_per_call is None else steps_per_call
+        self.recurrent = getattr(policy, 'recurrent', False)
+        assert num_steps % self.steps_per_call == 0
+        assert not (self.recurrent and meta_batch_size is not None), "recurrent meta policies are not supported"
+
+        self.unwrapped_env = env
+        while hasattr(self.unwrapped_env, '_wrapped_env'):
+            self.unwrapped_env = self.unwrapped_env._wrapped_env
+
+        assert hasattr(self.unwrapped_env, 'tf_reward'), "env must have a symbolic reward function"
+        self.has_done_fn = hasattr(self.unwrapped_env, 'tf_done')
+
+        if meta_batch_size is not None:
+            assert num_envs % meta_batch_size == 0
+            assert num_envs % getattr(dynamics_model, 'num_models', 1) == 0, \
+                "predict_batches_sym requires the number of envs to be divisible by the number of models"
+
+        self._init_obs_pool_ph = tf.placeholder(dtype=tf.float32, shape=(None, policy.obs_dim), name='init_obs_pool')
+        self._rollout_vars = dict()
+        self._state_vars = None
+        self._reset_state_op = None
+
+    def obtain_samples(self, buffer=None):
+        """
+        Rolls out num_envs environments for num_steps steps in the dynamics model
+
+        Args:
+            buffer (dict or None) : buffer with the keys 'observations' and 'time_steps' from which the initial
+                                    observations are drawn
+
+        Returns:
+            (list) : list of tuples (env_idx, path). The paths that are still running after num_steps are
+                     truncated, i.e. their last step is marked as done
+        """
+        if buffer is None:
+            init_obs_pool = np.stack([self.env.reset() for _ in range(self.num_envs)], axis=0)
+        else:
+            init_obs_pool = buffer['observations'][buffer['time_steps'] == 0]
+
+        sess = tf.get_default_session()
+        if self._state_vars is None:
+            self._build_state()
+            sess.run(tf.variables_initializer(tf.contrib.framework.nest.flatten(self._state_vars)))
+
+        pre_update = self.meta_batch_size is None or self.policy._pre_update_mode
+        if pre_update not in self._rollout_vars:
+            self._rollout_vars[pre_update] = self._build_graph(pre_update)
+
+        # in post-update mode the adapted parameters are read from the variables of the policy
+        feed_dict = {self._init_obs_pool_ph: init_obs_pool}
+
+        sess.run(self._reset_state_op, feed_dict=feed_dict)
+        chunks = [sess.run(self._rollout_vars[pre_update], feed_dict=feed_dict)
+                  for _ in range(self.num_steps // self.steps_per_call)]
+
+        # (num_steps, num_envs, ...) -> (num_envs, num_steps, ...)
+        rollouts = {key: np.swapaxes(np.concatenate([chunk[key] for chunk in chunks]), 0, 1) for key in chunks[0]}
+        rollouts['dones'][:, -1] = True
+        return _split_paths(rollouts)
+
+    def _sample_init_obs(self, num):
+        idxs = tf.random.uniform((num,), maxval=tf.shape(self._init_obs_pool_ph)[0], dtype=tf.int32)
+        return tf.gather(self._init_obs_pool_ph, idxs)
+
+    def _build_state(self):
+        """
+        Creates the variables that hold the state of the rollouts between two session calls and the op that
+        starts new rollouts
+        """
+        obs_dim = self.policy.obs_dim
+        with tf.variable_scope('imagined_rollouts_state'):
+            obs_var = tf.get_variable('obs', shape=(self.num_envs, obs_dim), dtype=tf.float32,
+                                      initializer=tf.zeros_initializer(), trainable=False)
+            ts_var = tf.get_variable('time_steps', shape=(self.num_envs,), dtype=tf.int32,
+                                     initializer=tf.zeros_initializer(), trainable=False)
+            if self.recurrent:
+                zero_state = self.policy.cell.zero_state(self.num_envs, tf.float32)
+                hidden_var = tf.contrib.framework.nest.map_structure(
+                    lambda zero: tf.Variable(tf.zeros(zero.shape, dtype=zero.dtype), trainable=False), zero_state)
+            else:
+                hidden_var = ()
+
+        self._state_vars = (obs_var, ts_var, hidden_var)
+        reset_ops = [tf.assign(obs_var, self._sample_init_obs(self.num_envs)), tf.assign(ts_var, tf.zeros_like(ts_var))]
+        reset_ops += [tf.assign(var, tf.zeros_like(var)) for var in tf.contrib.framework.nest.flatten(hidden_var)]
+        self._reset_state_op = tf.group(*reset_ops)
+
+    def _build_graph(self, pre_update):
+        """
+        Builds the while loop that rolls out the policy in the dynamics model for steps_per_call steps, starting from
+        and writing back to the state variables
+
+        Args:
+            pre_update (bool) : whether to use the pre-update policy or the adapted policies (policy.policies_params_phs,
+                                which default to the adapted parameters written by update_task_parameters)
+
+        Returns:
+            (dict) : dict of stacked tensors of shape (steps_per_call, num_envs, ...)
+        """
+        nest = tf.contrib.framework.nest
+        obs_dim, action_dim = self.policy.obs_dim, self.policy.action_dim
+        obs_var, ts_var, hidden_var = self._state_vars
+
+        def cond(t, *args):
+            return t < self.steps_per_call
+
+        def body(t, obs, ts, hidden_flat, obs_ta, act_ta, rew_ta, done_ta, mean_ta, log_std_ta):
+            hidden = nest.pack_sequence_as(hidden_var, hidden_flat)
+            act, dist_info, next_hidden = self._sample_actions_sym(obs, pre_update, hidden)
+            next_obs = self._predict_sym(obs, act)
+            reward = self.unwrapped_env.tf_reward(obs, act, next_obs)
+
+            ts = ts + 1
+            done = ts >= self.max_path_length
+            if self.has_done_fn:
+                done = tf.logical_or(done, self.unwrapped_env.tf_done(next_obs))
+
+            # reset the environments that are done, including the hidden state of the policy
+            next_obs = tf.where(done, self._sample_init_obs(self.num_envs), next_obs)
+            ts = tf.where(done, tf.zeros_like(ts), ts)
+            next_obs.set_shape(obs.get_shape())
+            next_hidden_flat = [tf.where(done, tf.zeros_like(h), h) for h in nest.flatten(next_hidden)]
+
+            return (t + 1, next_obs, ts, next_hidden_flat,
+                    obs_ta.write(t, obs), act_ta.write(t, act), rew_ta.write(t, reward),
+                    done_ta.write(t, done), mean_ta.write(t, dist_info['mean']),
+                    log_std_ta.write(t, dist_info['log_std']))
+
+        with tf.name_scope('imagined_rollouts'):
+            tensor_arrays = [tf.TensorArray(dtype, size=self.steps_per_call, element_shape=shape)
+                             for dtype, shape in [(tf.float32, (self.num_envs, obs_dim)),
+                                                  (tf.float32, (self.num_envs, action_dim)),
+                                                  (tf.float32, (self.num_envs,)),
+                                                  (tf.bool, (self.num_envs,)),
+                                                  (tf.float32, (self.num_envs, action_dim)),
+                                                  (tf.float32, (self.num_envs, action_dim))]]
+
+            hidden_flat = [h.read_value() for h in nest.flatten(hidden_var)]
+            loop_vars = tf.while_loop(cond, body,
+                                      loop_vars=[tf.constant(0), obs_var.read_value(), ts_var.read_value(), hidden_flat]
+                                                + tensor_arrays,
+                                      back_prop=False)
+
+            # write back the state for the next session call
+            last_obs, last_ts, last_hidden_flat = loop_vars[1:4]
+            assign_ops = [tf.assign(obs_var, last_obs), tf.assign(ts_var, last_ts)]
+            assign_ops += [tf.assign(var, h) for var, h in zip(nest.flatten(hidden_var), last_hidden_flat)]
+            with tf.control_dependencies(assign_ops):
+                obs, act, rew, done, mean, log_std = [ta.stack() for ta in loop_vars[4:]]
+
+        return dict(observations=obs, actions=act, rewards=rew, dones=done, means=mean, log_stds=log_std)
+
+    def _sample_actions_sym(self, obs, pre_update, hidden):
+        next_hidden = hidden
+        if self.recurrent:
+            dist_info, next_hidden = self.policy.distribution_info_step_sym(obs, hidden)
+            dist_info['log_std'] = tf.zeros_like(dist_info['mean']) + dist_info['log_std']
+        elif self.meta_batch_size is None:
+            dist_info = self.policy.distribution_info_sym(obs)
+            # broadcast the state independent log_std to the batch
+            dist_info['log_std'] = tf.zeros_like(dist_info['mean']) + dist_info['log_std']
+        else:
+            obs_per_task = tf.split(obs, self.meta_batch_size, axis=0)
+            dist_infos = []
+            for idx in range(self.meta_batch_size):
+                params = None if pre_update else self.policy.policies_params_phs[idx]
+                dist_infos.append(self.policy.distribution_info_sym(obs_per_task[idx], params=params))
+            dist_info = dict(mean=tf.concat([info['mean'] for info in dist_infos], axis=0),
+                             log_std=tf.concat([tf.zeros_like(info['mean']) + info['log_std']
+                                                for info in dist_infos], axis=0))
+        act, dist_info = self.policy.distribution.sample_sym(dist_info)
+        return act, dist_info, next_hidden
+
+    def _predict_sym(self, obs, act):
+        if self.meta_batch_size is None:
+            return self.dynamics_model.predict_sym(obs, act)
+        else:
+            return self.dynamics_model.predict_batches_sym(obs, act)
+
+
+def _split_paths(rollouts):
+    paths = []
+    num_envs = rollouts['dones'].shape[0]
+    for idx in range(num_envs):
+        ends = np.flatnonzero(rollouts['dones'][idx]) + 1
+        starts = np.concatenate([[0], ends[:-1]])
+        for start, end in zip(starts, ends):
+            paths.append((idx, dict(
+                observations=rollouts['observations'][idx, start:end],
+                actions=rollouts['actions'][idx, start:end],
+                rewards=rollouts['rewards'][idx, start:end],
+                dones=rollouts['dones'][idx, start:end],
+                env_infos=utils.InfoBatch(batch_size=end - start),
+                agent_infos=utils.InfoBatch(mean=rollouts['means'][idx, start:end],
+                                            log_std=rollouts['log_stds'][idx, start:end]),
+            )))
+    return paths
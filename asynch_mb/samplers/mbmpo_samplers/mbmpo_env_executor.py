@@ -1,4 +1,5 @@
 import numpy as np
+from asynch_mb.utils import utils
 
 
 class MBMPOIterativeEnvExecutor(object):
@@ -57,7 +58,7 @@ class MBMPOIterativeEnvExecutor(object):
         else:
             dones = np.asarray([False for _ in range(self.num_envs)])
 
-        env_infos = [{} for _ in range(self.num_envs)]
+        env_infos = utils.InfoBatch(batch_size=self.num_envs)
 
         # reset env when done or max_path_length reached
         dones = np.asarray(dones)
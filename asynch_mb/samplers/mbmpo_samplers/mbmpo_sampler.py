@@ -1,5 +1,7 @@
 from asynch_mb.samplers.base import BaseSampler
 from asynch_mb.samplers.mbmpo_samplers.mbmpo_env_executor import MBMPOIterativeEnvExecutor
+from asynch_mb.samplers.path_buffer import PathBuffer
+from asynch_mb.samplers.imagined_rollouts import ImaginedRolloutEngine
 from asynch_mb.logger import logger
 from asynch_mb.utils import utils
 from collections import OrderedDict
@@ -7,7 +9,6 @@ from collections import OrderedDict
 from pyprind import ProgBar
 import numpy as np
 import time
-import itertools
 
 
 class MBMPOSampler(BaseSampler):
@@ -21,6 +22,8 @@ class MBMPOSampler(BaseSampler):
         meta_batch_size (int) : number of meta tasks
         max_path_length (int) : max number of steps per trajectory
         envs_per_task (int) : number of meta_envs to run vectorized for each task (influences the memory usage)
+        in_graph_rollouts (bool) : whether to sample the imagined trajectories with a tf.while_loop in one
+                                   session call (requires env.tf_reward) instead of stepping the model env-wise
     """
 
     def __init__(
@@ -34,6 +37,7 @@ class MBMPOSampler(BaseSampler):
             envs_per_task=None,
             parallel=False,
             deterministic=True,
+            in_graph_rollouts=False,
             ):
         super(MBMPOSampler, self).__init__(env, policy, rollouts_per_meta_task, max_path_length)
         assert not parallel
@@ -48,6 +52,14 @@ class MBMPOSampler(BaseSampler):
         self.vec_env = MBMPOIterativeEnvExecutor(env, dynamics_model, self.meta_batch_size, self.envs_per_task,
                                                  max_path_length, deterministic=deterministic)
 
+        self.in_graph_rollouts = in_graph_rollouts
+        if in_graph_rollouts:
+            num_envs = self.vec_env.num_envs
+            self.rollout_engine = ImaginedRolloutEngine(env, policy, dynamics_model, num_envs,
+                                                        num_steps=int(np.ceil(self.total_samples / num_envs)),
+                                                        max_path_length=max_path_length,
+                                                        meta_batch_size=meta_batch_size)
+
     def obtain_samples(self, log=False, log_prefix='', buffer=None):
         """
         Collect batch_size trajectories from each task
@@ -65,8 +77,12 @@ class MBMPOSampler(BaseSampler):
         for i in range(self.meta_batch_size):
             paths[i] = []
 
+        if self.in_graph_rollouts:
+            return self._obtain_samples_in_graph(paths, log=log, log_prefix=log_prefix, buffer=buffer)
+
         n_samples = 0
-        running_paths = [_get_empty_running_paths_dict() for _ in range(self.vec_env.num_envs)]
+        num_envs = self.vec_env.num_envs
+        path_buffer = PathBuffer(num_envs, int(np.ceil(self.total_samples / num_envs)) + self.max_path_length)
 
         pbar = ProgBar(self.total_samples)
         policy_time, env_time = 0, 0
@@ -94,32 +110,11 @@ class MBMPOSampler(BaseSampler):
             #  stack agent_infos and if no infos were provided (--> None) create empty dicts
             agent_infos, env_infos = self._handle_info_dicts(agent_infos, env_infos)
 
+            # append new samples to the path buffer and collect the finished paths
             new_samples = 0
-            for idx, observation, action, reward, env_info, agent_info, done in zip(itertools.count(), obses, actions,
-                                                                                    rewards, env_infos, agent_infos,
-                                                                                    dones):
-                # append new samples to running paths
-                if isinstance(reward, np.ndarray):
-                    reward = reward[0]
-                running_paths[idx]["observations"].append(observation)
-                running_paths[idx]["actions"].append(action)
-                running_paths[idx]["rewards"].append(reward)
-                running_paths[idx]["dones"].append(done)
-                running_paths[idx]["env_infos"].append(env_info)
-                running_paths[idx]["agent_infos"].append(agent_info)
-
-                # if running path is done, add it to paths and empty the running path
-                if done:
-                    paths[idx // self.envs_per_task].append(dict(
-                        observations=np.asarray(running_paths[idx]["observations"]),
-                        actions=np.asarray(running_paths[idx]["actions"]),
-                        rewards=np.asarray(running_paths[idx]["rewards"]),
-                        dones=np.asarray(running_paths[idx]["dones"]),
-                        env_infos=utils.stack_tensor_dict_list(running_paths[idx]["env_infos"]),
-                        agent_infos=utils.stack_tensor_dict_list(running_paths[idx]["agent_infos"]),
-                    ))
-                    new_samples += len(running_paths[idx]["rewards"])
-                    running_paths[idx] = _get_empty_running_paths_dict()
+            for idx, path in path_buffer.append(obses, actions, rewards, dones, env_infos, agent_infos):
+                paths[idx // self.envs_per_task].append(path)
+                new_samples += len(path["rewards"])
 
             pbar.update(new_samples)
             n_samples += new_samples
@@ -133,19 +128,27 @@ class MBMPOSampler(BaseSampler):
 
         return paths
 
+    def _obtain_samples_in_graph(self, paths, log=False, log_prefix='', buffer=None):
+        t = time.time()
+        for idx, path in self.rollout_engine.obtain_samples(buffer):
+            paths[idx // self.envs_per_task].append(path)
+        rollout_time = time.time() - t
+
+        self.total_timesteps_sampled += self.total_samples
+        if log:
+            logger.logkv(log_prefix + "RolloutExecTime", rollout_time)
+
+        return paths
+
     def _handle_info_dicts(self, agent_infos, env_infos):
         if not env_infos:
-            env_infos = [dict() for _ in range(self.vec_env.num_envs)]
+            env_infos = dict()
         if not agent_infos:
-            agent_infos = [dict() for _ in range(self.vec_env.num_envs)]
+            agent_infos = dict()
         else:
             assert len(agent_infos) == self.meta_batch_size
-            assert len(agent_infos[0]) == self.envs_per_task
-            agent_infos = sum(agent_infos, [])  # stack agent_infos
+            assert agent_infos[0].batch_size == self.envs_per_task
+            agent_infos = utils.InfoBatch.concat(agent_infos)  # stack agent_infos
+            assert agent_infos.batch_size == self.meta_batch_size * self.envs_per_task
 
-        assert len(agent_infos) == self.meta_batch_size * self.envs_per_task == len(env_infos)
         return agent_infos, env_infos
-
-
-def _get_empty_running_paths_dict():
-    return dict(observations=[], actions=[], rewards=[], dones=[], env_infos=[], agent_infos=[])
@@ -96,8 +96,7 @@ class DiceSampleProcessor(SampleProcessor):
         paths = self._compute_discounted_rewards(paths)
 
         # 2) fit baseline estimator using the path returns and predict the return baselines
-        self.baseline.fit(paths, target_key='discounted_rewards')
-        all_path_baselines = [self.baseline.predict(path) for path in paths]
+        all_path_baselines = self.baseline.fit_predict(paths, target_key='discounted_rewards')
 
         # 3) compute adjusted rewards (r - b)
         paths = self._compute_adjusted_rewards(paths, all_path_baselines)
@@ -204,29 +203,18 @@ class DiceSampleProcessor(SampleProcessor):
         assert self.return_baseline is not None
 
         # a) compute returns
-        for idx, path in enumerate(paths):
-            path["returns"] = utils.discount_cumsum(path["rewards"], self.discount)
+        paths = self._compute_returns(paths)
 
         # b) fit return baseline estimator using the path returns and predict the return baselines
-        self.return_baseline.fit(paths, target_key='returns')
-        all_path_baselines = [self.return_baseline.predict(path) for path in paths]
+        all_path_baselines = self.return_baseline.fit_predict(paths, target_key='returns')
 
         # c) generalized advantage estimation
-        for idx, path in enumerate(paths):
-            path_baselines = np.append(all_path_baselines[idx], 0)
-            deltas = path["rewards"] + \
-                     self.discount * path_baselines[1:] - \
-                     path_baselines[:-1]
-            path["advantages"] = utils.discount_cumsum(
-                deltas, self.discount * self.gae_lambda)
+        paths = self._compute_advantages(paths, all_path_baselines)
 
         # d) pad paths and stack them
-        advantages = []
-        for path in paths:
-            path_length = path["observations"].shape[0]
-            advantages.append(self._pad(path["advantages"], path_length))
-
-        advantages = np.stack(advantages, axis=0)
+        path_lengths = [path["observations"].shape[0] for path in paths]
+        advantages = utils.pad_paths(np.concatenate([path["advantages"] for path in paths]), path_lengths,
+                                     self.max_path_length)
 
         # e) desired normalize / shift advantages
         if self.normalize_adv:
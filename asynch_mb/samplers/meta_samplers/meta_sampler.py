@@ -1,5 +1,6 @@
 from asynch_mb.samplers.base import BaseSampler
 from asynch_mb.samplers.meta_samplers.meta_vectorized_env_executor import MetaParallelEnvExecutor, MetaIterativeEnvExecutor
+from asynch_mb.samplers.path_buffer import PathBuffer
 from asynch_mb.logger import logger
 from asynch_mb.utils import utils
 from collections import OrderedDict
@@ -7,7 +8,6 @@ from collections import OrderedDict
 from pyprind import ProgBar
 import numpy as np
 import time
-import itertools
 
 
 class MetaSampler(BaseSampler):
@@ -81,7 +81,8 @@ class MetaSampler(BaseSampler):
             paths[i] = []
 
         n_samples = 0
-        running_paths = [_get_empty_running_paths_dict() for _ in range(self.vec_env.num_envs)]
+        num_envs = self.vec_env.num_envs
+        path_buffer = PathBuffer(num_envs, int(np.ceil(self.total_samples / num_envs)) + self.max_path_length)
 
         pbar = ProgBar(self.total_samples)
         policy_time, env_time = 0, 0
@@ -99,8 +100,8 @@ class MetaSampler(BaseSampler):
             obs_per_task = np.split(np.asarray(obses), self.meta_batch_size)
             if random:
                 actions = np.stack([[self.env.action_space.sample()] for _ in range(len(obses))], axis=0)
-                agent_infos = [[{'mean': np.zeros_like(self.env.action_space.sample()),
-                                 'log_std': np.zeros_like(self.env.action_space.sample())}] * self.envs_per_task] * self.meta_batch_size
+                agent_infos = utils.InfoBatch(mean=np.zeros_like(np.concatenate(actions)),
+                                              log_std=np.zeros_like(np.concatenate(actions)))
             else:
                 actions, agent_infos = policy.get_actions(obs_per_task)
             policy_time += time.time() - t
@@ -114,32 +115,11 @@ class MetaSampler(BaseSampler):
             #  stack agent_infos and if no infos were provided (--> None) create empty dicts
             agent_infos, env_infos = self._handle_info_dicts(agent_infos, env_infos)
 
+            # append new samples to the path buffer and collect the finished paths
             new_samples = 0
-            for idx, observation, action, reward, env_info, agent_info, done in zip(itertools.count(), obses, actions,
-                                                                                    rewards, env_infos, agent_infos,
-                                                                                    dones):
-                # append new samples to running paths
-                if isinstance(reward, np.ndarray):
-                    reward = reward[0]
-                running_paths[idx]["observations"].append(observation)
-                running_paths[idx]["actions"].append(action)
-                running_paths[idx]["rewards"].append(reward)
-                running_paths[idx]["dones"].append(done)
-                running_paths[idx]["env_infos"].append(env_info)
-                running_paths[idx]["agent_infos"].append(agent_info)
-
-                # if running path is done, add it to paths and empty the running path
-                if done:
-                    paths[idx // self.envs_per_task].append(dict(
-                        observations=np.asarray(running_paths[idx]["observations"]),
-                        actions=np.asarray(running_paths[idx]["actions"]),
-                        rewards=np.asarray(running_paths[idx]["rewards"]),
-                        dones=np.asarray(running_paths[idx]["dones"]),
-                        env_infos=utils.stack_tensor_dict_list(running_paths[idx]["env_infos"]),
-                        agent_infos=utils.stack_tensor_dict_list(running_paths[idx]["agent_infos"]),
-                    ))
-                    new_samples += len(running_paths[idx]["rewards"])
-                    running_paths[idx] = _get_empty_running_paths_dict()
+            for idx, path in path_buffer.append(obses, actions, rewards, dones, env_infos, agent_infos):
+                paths[idx // self.envs_per_task].append(path)
+                new_samples += len(path["rewards"])
 
             pbar.update(new_samples)
             n_samples += new_samples
@@ -155,17 +135,13 @@ class MetaSampler(BaseSampler):
 
     def _handle_info_dicts(self, agent_infos, env_infos):
         if not env_infos:
-            env_infos = [dict() for _ in range(self.vec_env.num_envs)]
+            env_infos = dict()
         if not agent_infos:
-            agent_infos = [dict() for _ in range(self.vec_env.num_envs)]
-        else:
+            agent_infos = dict()
+        elif isinstance(agent_infos, list):
             assert len(agent_infos) == self.meta_batch_size
-            assert len(agent_infos[0]) == self.envs_per_task
-            agent_infos = sum(agent_infos, [])  # stack agent_infos
+            assert agent_infos[0].batch_size == self.envs_per_task
+            agent_infos = utils.InfoBatch.concat(agent_infos)  # stack agent_infos
 
-        assert len(agent_infos) == self.meta_batch_size * self.envs_per_task == len(env_infos)
+        assert not agent_infos or agent_infos.batch_size == self.meta_batch_size * self.envs_per_task
         return agent_infos, env_infos
-
-
-def _get_empty_running_paths_dict():
-    return dict(observations=[], actions=[], rewards=[], dones=[], env_infos=[], agent_infos=[])
@@ -1,5 +1,7 @@
 from asynch_mb.samplers.base import BaseSampler
 from asynch_mb.samplers.metrpo_samplers.metrpo_env_executor import METRPOIterativeEnvExecutor
+from asynch_mb.samplers.path_buffer import PathBuffer
+from asynch_mb.samplers.imagined_rollouts import ImaginedRolloutEngine
 from asynch_mb.logger import logger
 from asynch_mb.utils import utils
 from collections import OrderedDict
@@ -7,7 +9,6 @@ from collections import OrderedDict
 from pyprind import ProgBar
 import numpy as np
 import time
-import itertools
 
 
 class METRPOSampler(BaseSampler):
@@ -21,6 +22,11 @@ class METRPOSampler(BaseSampler):
         meta_batch_size (int) : number of meta tasks
         max_path_length (int) : max number of steps per trajectory
         envs_per_task (int) : number of meta_envs to run vectorized for each task (influences the memory usage)
+        in_graph_rollouts (bool) : whether to sample the imagined trajectories with a tf.while_loop in one
+                                   session call (requires env.tf_reward) instead of stepping the model env-wise
+        rollout_steps_per_call (int or None) : number of steps unrolled per session call of the in-graph rollouts,
+                                               e.g. to bound the memory of recurrent policies, defaults to
+                                               max_path_length
     """
 
     def __init__(
@@ -32,6 +38,8 @@ class METRPOSampler(BaseSampler):
             max_path_length,
             parallel=False,
             deterministic=True,
+            in_graph_rollouts=False,
+            rollout_steps_per_call=None,
             ):
         super(METRPOSampler, self).__init__(env, policy, num_rollouts, max_path_length)
         assert not parallel
@@ -47,6 +55,12 @@ class METRPOSampler(BaseSampler):
         self.vec_env = METRPOIterativeEnvExecutor(env, dynamics_model, num_rollouts, max_path_length,
                                                   deterministic=deterministic)
 
+        self.in_graph_rollouts = in_graph_rollouts
+        if in_graph_rollouts:
+            self.rollout_engine = ImaginedRolloutEngine(env, policy, dynamics_model, num_rollouts,
+                                                        num_steps=max_path_length, max_path_length=max_path_length,
+                                                        steps_per_call=rollout_steps_per_call)
+
     def obtain_samples(self, log=False, log_prefix='', buffer=None):
         """
         Collect batch_size trajectories from each task
@@ -60,11 +74,15 @@ class METRPOSampler(BaseSampler):
             (dict) : A dict of paths of size [meta_batch_size] x (batch_size) x [5] x (max_path_length)
         """
 
+        if self.in_graph_rollouts:
+            return self._obtain_samples_in_graph(log=log, log_prefix=log_prefix, buffer=buffer)
+
         # initial setup / preparation
         paths = []
 
         n_samples = 0
-        running_paths = [_get_empty_running_paths_dict() for _ in range(self.vec_env.num_envs)]
+        num_envs = self.vec_env.num_envs
+        path_buffer = PathBuffer(num_envs, int(np.ceil(self.total_samples / num_envs)) + self.max_path_length)
 
         # pbar = ProgBar(self.total_samples)
         policy_time, env_time = 0, 0
@@ -90,33 +108,11 @@ class METRPOSampler(BaseSampler):
             #  stack agent_infos and if no infos were provided (--> None) create empty dicts
             agent_infos, env_infos = self._handle_info_dicts(agent_infos, env_infos)
 
+            # append new samples to the path buffer and collect the finished paths
             new_samples = 0
-            for idx, observation, action, reward, env_info, agent_info, done in zip(itertools.count(), obses,
-                                                                                    actions,
-                                                                                    rewards, env_infos, agent_infos,
-                                                                                    dones):
-                # append new samples to running paths
-                if isinstance(reward, np.ndarray):
-                    reward = reward[0]
-                running_paths[idx]["observations"].append(observation)
-                running_paths[idx]["actions"].append(action)
-                running_paths[idx]["rewards"].append(reward)
-                running_paths[idx]["dones"].append(done)
-                running_paths[idx]["env_infos"].append(env_info)
-                running_paths[idx]["agent_infos"].append(agent_info)
-
-                # if running path is done, add it to paths and empty the running path
-                if done:
-                    paths.append(dict(
-                        observations=np.asarray(running_paths[idx]["observations"]),
-                        actions=np.asarray(running_paths[idx]["actions"]),
-                        rewards=np.asarray(running_paths[idx]["rewards"]),
-                        dones=np.asarray(running_paths[idx]["dones"]),
-                        env_infos=utils.stack_tensor_dict_list(running_paths[idx]["env_infos"]),
-                        agent_infos=utils.stack_tensor_dict_list(running_paths[idx]["agent_infos"]),
-                    ))
-                    new_samples += len(running_paths[idx]["rewards"])
-                    running_paths[idx] = _get_empty_running_paths_dict()
+            for idx, path in path_buffer.append(obses, actions, rewards, dones, env_infos, agent_infos):
+                paths.append(path)
+                new_samples += len(path["rewards"])
 
             # pbar.update(self.vec_env.num_envs)
             n_samples += new_samples
@@ -131,13 +127,21 @@ class METRPOSampler(BaseSampler):
 
         return paths
 
+    def _obtain_samples_in_graph(self, log=False, log_prefix='', buffer=None):
+        t = time.time()
+        paths = [path for _, path in self.rollout_engine.obtain_samples(buffer)]
+        rollout_time = time.time() - t
+
+        self.total_timesteps_sampled += self.total_samples
+        logger.logkv('ModelSampler-n_timesteps', self.total_timesteps_sampled)
+        if log:
+            logger.logkv(log_prefix + "RolloutExecTime", rollout_time)
+
+        return paths
+
     def _handle_info_dicts(self, agent_infos, env_infos):
         if not env_infos:
-            env_infos = [dict() for _ in range(self.vec_env.num_envs)]
+            env_infos = dict()
         if not agent_infos:
-            agent_infos = [dict() for _ in range(self.vec_env.num_envs)]
+            agent_infos = dict()
         return agent_infos, env_infos
-
-
-def _get_empty_running_paths_dict():
-    return dict(observations=[], actions=[], rewards=[], dones=[], env_infos=[], agent_infos=[])
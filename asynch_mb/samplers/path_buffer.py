@@ -0,0 +1,104 @@
+from asynch_mb.utils import utils
+import numpy as np
+
+
+class PathBuffer(object):
+    """
+    Preallocated storage for the trajectories of vectorized rollouts. Each step of all environments is written
+    into arrays of shape (num_envs, capacity, dim) with one slice assignment per key, and finished paths are
+    returned as views into these arrays (no per-step python lists and no re-stacking)
+
+    Notes:
+        A new buffer has to be created for every call of obtain_samples, since the emitted paths are views
+        into its memory.
+
+    Args:
+        num_envs (int): number of environments that are stepped together
+        capacity (int): max number of steps per environment that can be stored in the buffer
+    """
+
+    def __init__(self, num_envs, capacity):
+        self.num_envs = num_envs
+        self.capacity = capacity
+
+        self._env_idxs = np.arange(num_envs)
+        self._ptr = np.zeros(num_envs, dtype=int)  # next free step of each environment
+        self._path_start = np.zeros(num_envs, dtype=int)  # first step of the running path of each environment
+        self._arrays = None
+
+    def append(self, observations, actions, rewards, dones, env_infos=None, agent_infos=None):
+        """
+        Writes one step of all environments into the buffer
+
+        Args:
+            observations (np.ndarray): observations - shape: (num_envs, obs_dim)
+            actions (np.ndarray): actions - shape: (num_envs, action_dim)
+            rewards (np.ndarray): rewards - shape: (num_envs,) or (num_envs, 1)
+            dones (np.ndarray): done flags - shape: (num_envs,)
+            env_infos (list or dict or None): list of dicts (one per environment) or dict of stacked arrays
+            agent_infos (list or dict or None): list of dicts (one per environment) or dict of stacked arrays
+
+        Returns:
+            (list) : list of tuples (env_idx, path) with the paths that have been finished in this step
+        """
+        dones = np.asarray(dones, dtype=bool)
+        step_data = dict(
+            observations=np.asarray(observations),
+            actions=np.asarray(actions),
+            rewards=np.asarray(rewards).reshape(self.num_envs, -1)[:, 0],
+            dones=dones,
+            env_infos=_to_columnar(env_infos),
+            agent_infos=_to_columnar(agent_infos),
+        )
+
+        if self._arrays is None:
+            self._arrays = _allocate(step_data, self.num_envs, self.capacity)
+        assert np.all(self._ptr < self.capacity), "path buffer is full"
+
+        _write(self._arrays, step_data, self._env_idxs, self._ptr)
+
+        finished_paths = []
+        for idx in np.flatnonzero(dones):
+            path = _slice(self._arrays, idx, self._path_start[idx], self._ptr[idx] + 1)
+            finished_paths.append((idx, path))
+
+        self._ptr += 1
+        self._path_start[dones] = self._ptr[dones]
+        return finished_paths
+
+
+def _to_columnar(infos):
+    if isinstance(infos, dict):
+        return infos
+    if not infos:
+        return utils.InfoBatch()
+    return utils.InfoBatch(utils.stack_tensor_dict_list(infos))
+
+
+def _allocate(step_data, num_envs, capacity):
+    arrays = dict()
+    for key, value in step_data.items():
+        if isinstance(value, dict):
+            arrays[key] = _allocate(value, num_envs, capacity)
+        else:
+            value = np.asarray(value)
+            arrays[key] = np.empty((num_envs, capacity) + value.shape[1:], dtype=value.dtype)
+    return arrays
+
+
+def _write(arrays, step_data, env_idxs, ptr):
+    for key, value in step_data.items():
+        if isinstance(value, dict):
+            _write(arrays[key], value, env_idxs, ptr)
+        else:
+            arrays[key][env_idxs, ptr] = value
+
+
+def _slice(arrays, idx, start, end):
+    path = dict()
+    for key, value in arrays.items():
+        if isinstance(value, dict):
+            path[key] = utils.InfoBatch(_slice(value, idx, start, end), batch_size=end - start)
+        else:
+            path[key] = value[idx, start:end]
+    return path
@@ -1,13 +1,14 @@
 from asynch_mb.samplers.base import BaseSampler
 from asynch_mb.utils.serializable import Serializable
-from asynch_mb.samplers.vectorized_env_executor import ParallelEnvExecutor, IterativeEnvExecutor
+from asynch_mb.samplers.vectorized_env_executor import ParallelEnvExecutor, IterativeEnvExecutor, \
+    SharedMemoryEnvExecutor
+from asynch_mb.samplers.path_buffer import PathBuffer
 from asynch_mb.logger import logger
 from asynch_mb.utils import utils
 
 from pyprind import ProgBar
 import numpy as np
 import time
-import itertools
 
 
 class Sampler(BaseSampler):
@@ -21,6 +22,11 @@ class Sampler(BaseSampler):
         meta_batch_size (int) : number of meta tasks
         max_path_length (int) : max number of steps per trajectory
         envs_per_task (int) : number of meta_envs to run vectorized for each task (influences the memory usage)
+        shared_memory (bool) : if n_parallel > 1, whether the worker processes exchange the actions and observations
+                               through shared memory instead of pipes. Falls back to pipes if the env infos of the
+                               environment are not all numeric
+        pipelined (bool) : whether to split the environments into two halves (each with n_parallel / 2 worker
+                           processes) and to compute the actions of one half while the other half is stepped
     """
 
     def __init__(
@@ -31,6 +37,8 @@ class Sampler(BaseSampler):
             max_path_length,
             n_parallel=1,
             vae=None,
+            shared_memory=False,
+            pipelined=False,
 
     ):
         Serializable.quick_init(self, locals())
@@ -40,13 +48,29 @@ class Sampler(BaseSampler):
         self.n_parallel = n_parallel
         self.total_timesteps_sampled = 0
         self.vae = vae
+        self.pipelined = pipelined
 
         # setup vectorized environment
 
-        if self.n_parallel > 1:
-            self.vec_env = ParallelEnvExecutor(env, n_parallel, num_rollouts, self.max_path_length)
+        if self.pipelined:
+            assert n_parallel >= 2 and n_parallel % 2 == 0, 'pipelined sampling requires an even n_parallel'
+            assert num_rollouts % n_parallel == 0
+            assert not getattr(policy, 'recurrent', False), 'the hidden state of the policy spans all environments'
+            self.vec_envs = [self._make_vec_env(env, n_parallel // 2, num_rollouts // 2, shared_memory)
+                             for _ in range(2)]
         else:
-            self.vec_env = IterativeEnvExecutor(env, num_rollouts, self.max_path_length)
+            self.vec_env = self._make_vec_env(env, n_parallel, num_rollouts, shared_memory)
+
+    def _make_vec_env(self, env, n_parallel, num_rollouts, shared_memory):
+        if n_parallel > 1 and shared_memory:
+            _, numeric_infos = SharedMemoryEnvExecutor.probe_specs(env)
+            if numeric_infos:
+                return SharedMemoryEnvExecutor(env, n_parallel, num_rollouts, self.max_path_length)
+            logger.log('The env infos are not all numeric, falling back to the ParallelEnvExecutor')
+        if n_parallel > 1:
+            return ParallelEnvExecutor(env, n_parallel, num_rollouts, self.max_path_length)
+        else:
+            return IterativeEnvExecutor(env, num_rollouts, self.max_path_length)
 
     def update_tasks(self):
         pass
@@ -64,12 +88,17 @@ class Sampler(BaseSampler):
         Returns:
             (dict) : A dict of paths of size [meta_batch_size] x (batch_size) x [5] x (max_path_length)
         """
+        if self.pipelined:
+            assert not sinusoid and self.vae is None, 'sinusoid actions and vae are not supported in pipelined mode'
+            return self._obtain_samples_pipelined(log=log, log_prefix=log_prefix, random=random,
+                                                  deterministic=deterministic, verbose=verbose)
 
         # initial setup / preparation
         paths = []
 
         n_samples = 0
-        running_paths = [_get_empty_running_paths_dict() for _ in range(self.vec_env.num_envs)]
+        num_envs = self.vec_env.num_envs
+        path_buffer = PathBuffer(num_envs, int(np.ceil(self.total_samples / num_envs)) + self.max_path_length)
 
         if verbose: pbar = ProgBar(self.total_samples)
         policy_time, env_time = 0, 0
@@ -92,7 +121,7 @@ class Sampler(BaseSampler):
                 agent_infos = {}
             elif deterministic:
                 actions, agent_infos = policy.get_actions(obses)
-                actions = [a_i['mean'] for a_i in agent_infos]
+                actions = agent_infos['mean']
             elif sinusoid:
                 action_space = self.env.action_space.shape[0]
                 num_envs = self.vec_env.num_envs
@@ -111,32 +140,11 @@ class Sampler(BaseSampler):
             #  stack agent_infos and if no infos were provided (--> None) create empty dicts
             agent_infos, env_infos = self._handle_info_dicts(agent_infos, env_infos)
 
+            # append new samples to the path buffer and collect the finished paths
             new_samples = 0
-            for idx, observation, action, reward, env_info, agent_info, done in zip(itertools.count(), obses, actions,
-                                                                                    rewards, env_infos, agent_infos,
-                                                                                    dones):
-                # append new samples to running paths
-                if isinstance(reward, np.ndarray):
-                    reward = reward[0]
-                running_paths[idx]["observations"].append(observation)
-                running_paths[idx]["actions"].append(action)
-                running_paths[idx]["rewards"].append(reward)
-                running_paths[idx]["dones"].append(done)
-                running_paths[idx]["env_infos"].append(env_info)
-                running_paths[idx]["agent_infos"].append(agent_info)
-
-                # if running path is done, add it to paths and empty the running path
-                if done:
-                    paths.append(dict(
-                        observations=np.asarray(running_paths[idx]["observations"]),
-                        actions=np.asarray(running_paths[idx]["actions"]),
-                        rewards=np.asarray(running_paths[idx]["rewards"]),
-                        dones=np.asarray(running_paths[idx]["dones"]),
-                        env_infos=utils.stack_tensor_dict_list(running_paths[idx]["env_infos"]),
-                        agent_infos=utils.stack_tensor_dict_list(running_paths[idx]["agent_infos"]),
-                    ))
-                    new_samples += len(running_paths[idx]["rewards"])
-                    running_paths[idx] = _get_empty_running_paths_dict()
+            for idx, path in path_buffer.append(obses, actions, rewards, dones, env_infos, agent_infos):
+                paths.append(path)
+                new_samples += len(path["rewards"])
 
             if verbose: pbar.update(self.vec_env.num_envs)
             n_samples += new_samples
@@ -151,11 +159,90 @@ class Sampler(BaseSampler):
 
         return paths
 
+    def _obtain_samples_pipelined(self, log=False, log_prefix='', random=False, deterministic=False, verbose=False):
+        """
+        Same as obtain_samples, but the actions of one half of the environments are computed while the other half
+        is stepped by its worker processes
+        """
+
+        # initial setup / preparation
+        paths = []
+
+        n_samples = 0
+        num_envs = sum([vec_env.num_envs for vec_env in self.vec_envs])
+        # the halves are at most one step apart, hence the additional step of capacity
+        capacity = int(np.ceil(self.total_samples / num_envs)) + self.max_path_length + 1
+        path_buffers = [PathBuffer(vec_env.num_envs, capacity) for vec_env in self.vec_envs]
+
+        if verbose: pbar = ProgBar(self.total_samples)
+        policy_time, env_time = 0, 0
+
+        self.policy.reset(dones=[True] * num_envs)
+
+        # initial reset of the envs and first step of the first half
+        obses = [np.asarray(vec_env.reset()) for vec_env in self.vec_envs]
+        actions, agent_infos = [None, None], [None, None]
+        actions[0], agent_infos[0] = self._get_actions(obses[0], random, deterministic)
+        self.vec_envs[0].step_async(actions[0])
+
+        half = 1
+        while n_samples < self.total_samples:
+            other_half = 1 - half
+
+            # execute policy for this half while the other half is stepped
+            t = time.time()
+            actions[half], agent_infos[half] = self._get_actions(obses[half], random, deterministic)
+            policy_time += time.time() - t
+            self.vec_envs[half].step_async(actions[half])
+
+            # collect the results of the other half
+            t = time.time()
+            next_obses, rewards, dones, env_infos = self.vec_envs[other_half].step_wait()
+            env_time += time.time() - t
+
+            #  stack agent_infos and if no infos were provided (--> None) create empty dicts
+            agent_infos_other, env_infos = self._handle_info_dicts(agent_infos[other_half], env_infos)
+
+            # append new samples to the path buffer and collect the finished paths
+            new_samples = 0
+            for idx, path in path_buffers[other_half].append(obses[other_half], actions[other_half], rewards, dones,
+                                                             env_infos, agent_infos_other):
+                paths.append(path)
+                new_samples += len(path["rewards"])
+
+            if verbose: pbar.update(self.vec_envs[other_half].num_envs)
+            n_samples += new_samples
+            obses[other_half] = np.asarray(next_obses)
+            half = other_half
+
+        # discard the step of the half that is still in flight, the envs are reset before the next sampling
+        self.vec_envs[1 - half].step_wait()
+        if verbose: pbar.stop()
+
+        self.total_timesteps_sampled += self.total_samples
+        if log:
+            logger.logkv(log_prefix + "TimeStepsCtr", self.total_timesteps_sampled)
+            logger.logkv(log_prefix + "PolicyExecTime", policy_time)
+            logger.logkv(log_prefix + "EnvExecTime", env_time)
+
+        return paths
+
+    def _get_actions(self, obses, random, deterministic):
+        if random:
+            actions = np.stack([self.env.action_space.sample() for _ in range(len(obses))], axis=0)
+            agent_infos = {}
+        elif deterministic:
+            actions, agent_infos = self.policy.get_actions(obses)
+            actions = agent_infos['mean']
+        else:
+            actions, agent_infos = self.policy.get_actions(obses)
+        return actions, agent_infos
+
     def _handle_info_dicts(self, agent_infos, env_infos):
         if not env_infos:
-            env_infos = [dict() for _ in range(self.vec_env.num_envs)]
+            env_infos = dict()
         if not agent_infos:
-            agent_infos = [dict() for _ in range(self.vec_env.num_envs)]
+            agent_infos = dict()
         return agent_infos, env_infos
 
     def __getstate__(self):
@@ -168,7 +255,3 @@ class Sampler(BaseSampler):
     def __setstate__(self, state):
         Serializable.__setstate__(self, state['init_args'])
         self.policy = state['policy']
-
-
-def _get_empty_running_paths_dict():
-    return dict(observations=[], actions=[], rewards=[], dones=[], env_infos=[], agent_infos=[])
@@ -1,8 +1,15 @@
+from asynch_mb.utils import utils
 import numpy as np
 import pickle as pickle
-from multiprocessing import Process, Pipe
+from multiprocessing import Process, Pipe, Barrier, RawArray, RawValue
+from threading import BrokenBarrierError
+import traceback
+import ctypes
 import copy
 
+# commands of the shared memory workers, written into the shared command value before ringing the doorbell
+_STEP, _RESET, _RESET_FROM_OBS, _SET_TASK, _CLOSE = range(5)
+
 
 class IterativeEnvExecutor(object):
     """
@@ -132,6 +139,16 @@ class ParallelEnvExecutor(object):
             (tuple): a length 4 tuple of lists, containing obs (np.array), rewards (float), dones (bool), env_infos (dict)
                       each list is of length meta_batch_size x envs_per_task (assumes that every task has same number of meta_envs)
         """
+        self.step_async(actions)
+        return self.step_wait()
+
+    def step_async(self, actions):
+        """
+        Sends the actions to the workers without waiting for the results
+
+        Args:
+            actions (list): lists of actions, of length meta_batch_size x envs_per_task
+        """
         assert len(actions) == self.num_envs
 
         # split list of actions in list of list of actions per meta tasks
@@ -142,6 +159,13 @@ class ParallelEnvExecutor(object):
         for remote, action_list in zip(self.remotes, actions_per_meta_task):
             remote.send(('step', action_list))
 
+    def step_wait(self):
+        """
+        Waits for the results of the step started by step_async
+
+        Returns
+            (tuple): a length 4 tuple of lists, containing obs (np.array), rewards (float), dones (bool), env_infos (dict)
+        """
         results = [remote.recv() for remote in self.remotes]
 
         obs, rewards, dones, env_infos = map(lambda x: sum(x, []), zip(*results))
@@ -152,13 +176,21 @@ class ParallelEnvExecutor(object):
         """
         Resets the environments of each worker
 
+        Args:
+            buffer (dict or None): if given, the environments are reset to observations drawn uniformly from
+                                   buffer['observations'] (requires env.reset_from_obs)
+
         Returns:
             (list): list of (np.ndarray) with the new initial observations.
         """
-        if buffer is not None:
-            raise NotImplementedError
-        for remote in self.remotes:
-            remote.send(('reset', None))
+        if buffer is None:
+            for remote in self.remotes:
+                remote.send(('reset', None))
+        else:
+            idxs = np.random.randint(0, len(buffer['observations']), size=self.num_envs)
+            init_obs = list(buffer['observations'][idxs])
+            for i, remote in enumerate(self.remotes):
+                remote.send(('reset_from_obs', init_obs[i * self.envs_per_proc:(i + 1) * self.envs_per_proc]))
         return sum([remote.recv() for remote in self.remotes], [])
 
     def set_tasks(self, tasks=None):
@@ -184,6 +216,189 @@ class ParallelEnvExecutor(object):
         return self._num_envs
 
 
+class SharedMemoryEnvExecutor(object):
+    """
+    Wraps multiple environments of the same kind and provides functionality to reset / step the environments
+    in a vectorized manner. The environments are distributed among n_parallel processes, which read their actions
+    from and write their observations, rewards, dones and env infos into preallocated shared memory arrays of shape
+    (num_envs, ...). Instead of exchanging pickled messages, every command is written into a shared command value
+    and signaled through a barrier (doorbell), which is passed a second time once all workers have finished.
+
+    The layout of the arrays is determined by stepping a copy of the environment once (see probe_specs). Only the
+    env infos with numeric values are transferred, as floats, and env infos that are missing in a later step are
+    filled with NaN. Use ParallelEnvExecutor for environments with non-numeric env infos.
+
+    Args:
+        env (gym.Env): environment object
+        n_parallel (int): number of worker processes
+        num_rollouts (int): number of environments
+        max_path_length (int): maximum length of sampled environment paths - if the max_path_length is reached,
+                             the respective environment is reset
+    """
+
+    def __init__(self, env, n_parallel, num_rollouts, max_path_length):
+        assert num_rollouts % n_parallel == 0
+        self.envs_per_proc = int(num_rollouts/n_parallel)
+        self._num_envs = n_parallel * self.envs_per_proc
+        self.n_parallel = n_parallel
+
+        specs, _ = self.probe_specs(env)
+        self._raw_arrays = _allocate_raw_arrays(specs, self._num_envs)
+        self._arrays = _raw_arrays_to_numpy(self._raw_arrays, specs, self._num_envs)
+
+        self._cmd = RawValue(ctypes.c_int, _STEP)
+        self._barrier = Barrier(n_parallel + 1)
+        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(n_parallel)])
+        seeds = np.random.choice(range(10**6), size=n_parallel, replace=False)
+
+        self.ps = [
+            Process(target=shared_memory_worker,
+                    args=(work_remote, remote, self._cmd, self._barrier, self._raw_arrays, specs, self._num_envs,
+                          slice(i * self.envs_per_proc, (i + 1) * self.envs_per_proc), pickle.dumps(env),
+                          max_path_length, seed))
+            for i, (work_remote, remote, seed) in enumerate(zip(self.work_remotes, self.remotes, seeds))]
+
+        for p in self.ps:
+            p.daemon = True  # if the main process crashes, we should not cause things to hang
+            p.start()
+        for remote in self.work_remotes:
+            remote.close()
+
+    @staticmethod
+    def probe_specs(env):
+        """
+        Steps a copy of the environment once to determine the shapes and dtypes of the shared arrays
+
+        Args:
+            env (gym.Env): environment object
+
+        Returns:
+            (tuple): the specs of the shared arrays and whether all env infos of the probe step are numeric
+        """
+        probe_env = copy.deepcopy(env)
+        obs = np.asarray(probe_env.reset())
+        action = np.asarray(probe_env.action_space.sample())
+        _, _, _, env_info = probe_env.step(action)
+        numeric_infos = dict([(key, np.asarray(value)) for key, value in env_info.items()
+                              if np.issubdtype(np.asarray(value).dtype, np.number)])
+        specs = dict(
+            actions=(action.shape, action.dtype),
+            observations=(obs.shape, obs.dtype),
+            rewards=((), np.float64),
+            dones=((), np.bool_),
+            env_infos=dict([(key, (value.shape, np.promote_types(value.dtype, np.float32)))
+                            for key, value in numeric_infos.items()]),
+        )
+        return specs, len(numeric_infos) == len(env_info)
+
+    def step(self, actions):
+        """
+        Executes actions on each env
+
+        Args:
+            actions (np.ndarray or list): actions of all environments
+
+        Returns
+            (tuple): a length 4 tuple containing obs (np.ndarray), rewards (np.ndarray), dones (np.ndarray) and
+                     env_infos (InfoBatch), each with the environments as first dimension
+        """
+        self.step_async(actions)
+        return self.step_wait()
+
+    def step_async(self, actions):
+        """
+        Writes the actions and rings the doorbell of the workers without waiting for the results
+
+        Args:
+            actions (np.ndarray or list): actions of all environments
+        """
+        assert len(actions) == self.num_envs
+        self._arrays['actions'][:] = actions
+        self._ring_start(_STEP)
+
+    def step_wait(self):
+        """
+        Waits for the results of the step started by step_async
+
+        Returns
+            (tuple): a length 4 tuple containing obs (np.ndarray), rewards (np.ndarray), dones (np.ndarray) and
+                     env_infos (InfoBatch), each with the environments as first dimension
+        """
+        self._wait_done()
+
+        env_infos = utils.InfoBatch([(key, value.copy()) for key, value in self._arrays['env_infos'].items()],
+                                    batch_size=self.num_envs)
+        return (self._arrays['observations'].copy(), self._arrays['rewards'].copy(), self._arrays['dones'].copy(),
+                env_infos)
+
+    def reset(self, buffer=None):
+        """
+        Resets the environments of each worker
+
+        Args:
+            buffer (dict or None): if given, the environments are reset to observations drawn uniformly from
+                                   buffer['observations'] (requires env.reset_from_obs)
+
+        Returns:
+            (np.ndarray): new initial observations
+        """
+        if buffer is None:
+            self._ring(_RESET)
+        else:
+            idxs = np.random.randint(0, len(buffer['observations']), size=self.num_envs)
+            self._arrays['observations'][:] = buffer['observations'][idxs]
+            self._ring(_RESET_FROM_OBS)
+        return self._arrays['observations'].copy()
+
+    def set_tasks(self, tasks=None):
+        """
+        Sets a list of tasks to each worker
+
+        Args:
+            tasks (list): list of the tasks for each worker
+        """
+        for remote, task in zip(self.remotes, tasks):
+            remote.send(task)
+        self._ring(_SET_TASK)
+
+    def close(self):
+        """
+        Stops the workers
+        """
+        self._cmd.value = _CLOSE
+        self._barrier.wait()
+        for p in self.ps:
+            p.join()
+
+    def _ring(self, cmd):
+        self._ring_start(cmd)
+        self._wait_done()
+
+    def _ring_start(self, cmd):
+        self._cmd.value = cmd
+        self._barrier_wait()
+
+    def _wait_done(self):
+        self._barrier_wait()
+
+    def _barrier_wait(self):
+        try:
+            self._barrier.wait()
+        except BrokenBarrierError:
+            errors = [remote.recv() for remote in self.remotes if remote.poll()]
+            raise RuntimeError('env worker failed:\n' + '\n'.join(errors))
+
+    @property
+    def num_envs(self):
+        """
+        Number of environments
+
+        Returns:
+            (int): number of environments
+        """
+        return self._num_envs
+
+
 def worker(remote, parent_remote, env_pickle, n_envs, max_path_length, seed):
     """
     Instantiation of a parallel worker for collecting samples. It loops continually checking the task that the remote
@@ -226,6 +441,12 @@ def worker(remote, parent_remote, env_pickle, n_envs, max_path_length, seed):
             ts[:] = 0
             remote.send(obs)
 
+        # reset the environments of the worker to the given observations
+        elif cmd == 'reset_from_obs':
+            obs = [env.reset_from_obs(init_obs) for init_obs, env in zip(data, envs)]
+            ts[:] = 0
+            remote.send(obs)
+
         # set the specified task for each of the environments of the worker
         elif cmd == 'set_task':
             for env in envs:
@@ -239,3 +460,109 @@ def worker(remote, parent_remote, env_pickle, n_envs, max_path_length, seed):
 
         else:
             raise NotImplementedError
+
+
+def shared_memory_worker(remote, parent_remote, cmd, barrier, raw_arrays, specs, num_envs, env_slice, env_pickle,
+                         max_path_length, seed):
+    """
+    Instantiation of a shared memory worker for collecting samples. It waits at the barrier for the next command,
+    executes it on the environments env_slice of the shared arrays and waits at the barrier again to signal that
+    the results have been written.
+
+    Args:
+        remote (multiprocessing.Connection): used to receive tasks and to report errors
+        parent_remote (multiprocessing.Connection):
+        cmd (multiprocessing.RawValue): shared command value
+        barrier (multiprocessing.Barrier): doorbell shared with the executor and the other workers
+        raw_arrays (dict): shared memory arrays
+        specs (dict): shape (without the env dimension) and dtype of the shared arrays
+        num_envs (int): total number of environments
+        env_slice (slice): environments of the worker
+        env_pickle (pkl): pickled environment
+        max_path_length (int): maximum path length of the task
+        seed (int): random seed for the worker
+    """
+    parent_remote.close()
+
+    arrays = _raw_arrays_to_numpy(raw_arrays, specs, num_envs)
+    actions, observations = arrays['actions'][env_slice], arrays['observations'][env_slice]
+    rewards, dones = arrays['rewards'][env_slice], arrays['dones'][env_slice]
+    env_infos = dict([(key, value[env_slice]) for key, value in arrays['env_infos'].items()])
+
+    n_envs = env_slice.stop - env_slice.start
+    envs = [pickle.loads(env_pickle) for _ in range(n_envs)]
+    np.random.seed(seed)
+
+    ts = np.zeros(n_envs, dtype='int')
+
+    while True:
+        barrier.wait()
+
+        if cmd.value == _CLOSE:
+            remote.close()
+            break
+
+        try:
+            # do a step in each of the environment of the worker
+            if cmd.value == _STEP:
+                for i, env in enumerate(envs):
+                    obs, reward, done, info = env.step(actions[i])
+                    rewards[i] = np.asarray(reward).reshape(-1)[0]
+                    for key, value in env_infos.items():
+                        value[i] = info.get(key, np.nan)
+                    ts[i] += 1
+                    if done or (ts[i] >= max_path_length):
+                        done = True
+                        obs = env.reset()
+                        ts[i] = 0
+                    observations[i], dones[i] = obs, done
+
+            # reset all the environments of the worker
+            elif cmd.value == _RESET:
+                for i, env in enumerate(envs):
+                    observations[i] = env.reset()
+                ts[:] = 0
+
+            # reset the environments of the worker to the observations written by the executor
+            elif cmd.value == _RESET_FROM_OBS:
+                for i, env in enumerate(envs):
+                    observations[i] = env.reset_from_obs(observations[i].copy())
+                ts[:] = 0
+
+            # set the task received through the remote for each of the environments of the worker
+            elif cmd.value == _SET_TASK:
+                task = remote.recv()
+                for env in envs:
+                    env.set_task(task)
+
+            else:
+                raise NotImplementedError
+
+        except Exception:
+            remote.send(traceback.format_exc())
+            barrier.abort()
+            break
+
+        barrier.wait()
+
+
+def _allocate_raw_arrays(specs, num_envs):
+    raw_arrays = dict()
+    for key, spec in specs.items():
+        if isinstance(spec, dict):
+            raw_arrays[key] = _allocate_raw_arrays(spec, num_envs)
+        else:
+            shape, dtype = spec
+            raw_arrays[key] = RawArray(ctypes.c_byte, int(np.prod((num_envs,) + shape)) * np.dtype(dtype).itemsize)
+    return raw_arrays
+
+
+def _raw_arrays_to_numpy(raw_arrays, specs, num_envs):
+    arrays = dict()
+    for key, spec in specs.items():
+        if isinstance(spec, dict):
+            arrays[key] = _raw_arrays_to_numpy(raw_arrays[key], spec, num_envs)
+        else:
+            shape, dtype = spec
+            arrays[key] = np.frombuffer(raw_arrays[key], dtype=dtype).reshape((num_envs,) + shape)
+    return arrays
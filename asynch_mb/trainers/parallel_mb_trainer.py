@@ -20,6 +20,9 @@ class ParallelTrainer(object):
         start_itr (int) : Number of iterations policy has already trained for, if reloading
         num_inner_grad_steps (int) : Number of inner steps per maml iteration
         sess (tf.Session) : current tf session (if we loaded policy, for example)
+        shared_memory (bool) : whether the workers exchange samples and parameters through shared memory
+                               channels instead of pickling them into the queues
+        log_every (int) : number of loop iterations between two dumps of the diagnostics of each worker
     """
     def __init__(
             self,
@@ -36,14 +39,17 @@ class ParallelTrainer(object):
             config,
             simulation_sleep,
             start_itr=0,
+            shared_memory=False,
+            log_every=1,
             ):
 
         self.initial_random_samples = initial_random_samples
+        self.shared_memory = shared_memory
         self.initial_sinusoid_samples = initial_sinusoid_samples
 
         worker_instances = [
-            WorkerData(simulation_sleep=simulation_sleep),
-            WorkerModel(),
+            WorkerData(simulation_sleep=simulation_sleep, shared_memory=shared_memory, log_every=log_every),
+            WorkerModel(shared_memory=shared_memory, log_every=log_every),
         ]
 
         names = ["Data", "Model"]
@@ -127,6 +133,9 @@ class ParallelTrainer(object):
         for remote in self.remotes:
             assert remote.recv() == 'loop done'
         logger.log('\n------------all workers exit loops -------------')
+        if self.shared_memory:
+            for remote in self.remotes:
+                remote.send('close channels')
         for remote in self.remotes:
             assert remote.recv() == 'worker closed'
 
@@ -21,6 +21,11 @@ class ParallelTrainer(object):
         start_itr (int) : Number of iterations policy has already trained for, if reloading
         num_inner_grad_steps (int) : Number of inner steps per maml iteration
         sess (tf.Session) : current tf session (if we loaded policy, for example)
+        shared_memory (bool) : whether the workers exchange samples and parameters through shared memory
+                               channels instead of pickling them into the queues
+        delta_params (bool) : whether the model worker only pushes the params of the models trained since its
+                              last push (ignored with shared_memory)
+        log_every (int) : number of loop iterations between two dumps of the diagnostics of each worker
     """
     def __init__(
             self,
@@ -39,13 +44,19 @@ class ParallelTrainer(object):
             start_itr=0,
             sampler_str='bptt',
             video=False,
+            shared_memory=False,
+            delta_params=False,
+            log_every=1,
     ):
         self.initial_random_samples = initial_random_samples
+        self.shared_memory = shared_memory
 
         worker_instances = [
-            WorkerData(simulation_sleep=simulation_sleep, video=video),
-            WorkerModel(),
-            WorkerPolicy(algo_str=algo_str, sampler_str=sampler_str),
+            WorkerData(simulation_sleep=simulation_sleep, video=video, shared_memory=shared_memory,
+                       log_every=log_every),
+            WorkerModel(shared_memory=shared_memory, delta_params=delta_params, log_every=log_every),
+            WorkerPolicy(algo_str=algo_str, sampler_str=sampler_str, shared_memory=shared_memory,
+                         log_every=log_every),
         ]
         names = ["Data", "Model", "Policy"]
         # one queue for each worker, tasks assigned by scheduler and previous worker
@@ -131,6 +142,9 @@ class ParallelTrainer(object):
         for remote in self.remotes:
             assert remote.recv() == 'loop done'
         logger.log('\n------------all workers exit loops -------------')
+        if self.shared_memory:
+            for remote in self.remotes:
+                remote.send('close channels')
         for remote in self.remotes:
             assert remote.recv() == 'worker closed'
 
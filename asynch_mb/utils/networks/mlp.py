@@ -78,7 +78,9 @@ def forward_mlp(output_dim,
         hidden_nonlinearity (tf): non-linearity for the activations in the hidden layers
         output_nonlinearity (tf or None): output non-linearity. None results in no non-linearity being applied
         input_var (tf.placeholder or tf.Variable): Input of the network as a symbolic variable
-        mlp_params (OrderedDict): OrderedDict of the params of the neural network. 
+        mlp_params (OrderedDict): OrderedDict of the params of the neural network. The params may be stacked along
+                                  a leading axis, e.g. one set of params per task, in which case input_var must have
+                                  the same leading axis, i.e. shape (num_sets, batch_size, input_dim)
 
     Returns:
         input_var (tf.placeholder or tf.Variable): Input of the network as a symbolic variable
@@ -97,10 +99,12 @@ def forward_mlp(output_dim,
         assert str(idx) in name or (idx == len(hidden_sizes) and "output" in name)
 
         if "kernel" in name:
-            assert param.shape == (x.shape[-1], sizes[idx])
+            assert param.shape[-2:] == (x.shape[-1], sizes[idx])
             x = tf.matmul(x, param)
         elif "bias" in name:
-            assert param.shape == (sizes[idx],)
+            assert param.shape[-1:] == (sizes[idx],)
+            if param.shape.ndims == 2:  # stacked params, broadcast over the batch
+                param = tf.expand_dims(param, axis=-2)
             x = tf.add(x, param)
             bias_added = True
         else:
@@ -79,14 +79,75 @@ def shift_advantages_to_positive(advantages):
     return (advantages - np.min(advantages)) + 1e-8
 
 
-def discount_cumsum(x, discount):
+def discount_cumsum(x, discount, axis=0):
     """
     See https://docs.scipy.org/doc/scipy/reference/tutorial/signal.html#difference-equation-filtering
 
     Returns:
         (float) : y[t] - discount*y[t+1] = x[t] or rev(y)[t] - discount*rev(y)[t-1] = rev(x)[t]
     """
-    return scipy.signal.lfilter([1], [1, float(-discount)], x[::-1], axis=0)[::-1]
+    return np.flip(scipy.signal.lfilter([1], [1, float(-discount)], np.flip(x, axis), axis=axis), axis)
+
+
+def path_indices(path_lengths):
+    """
+    Args:
+        path_lengths (np.ndarray or list) : lengths of the paths whose data is concatenated
+
+    Returns:
+        (tuple) : path index and time step of every element of the concatenated path data
+    """
+    path_lengths = np.asarray(path_lengths, dtype=np.int64)
+    path_idxs = np.repeat(np.arange(len(path_lengths)), path_lengths)
+    starts = np.cumsum(path_lengths) - path_lengths
+    time_steps = np.arange(len(path_idxs)) - starts[path_idxs]
+    return path_idxs, time_steps
+
+
+def pad_paths(x, path_lengths, max_path_length=None):
+    """
+    Args:
+        x (np.ndarray) : concatenated data of the paths, shape (sum(path_lengths), ...)
+        path_lengths (np.ndarray or list) : lengths of the paths
+        max_path_length (int or None) : length of the padded paths, defaults to the longest path
+
+    Returns:
+        (np.ndarray) : zero padded array of shape (num_paths, max_path_length, ...)
+    """
+    path_idxs, time_steps = path_indices(path_lengths)
+    if max_path_length is None:
+        max_path_length = int(np.max(path_lengths))
+    padded = np.zeros((len(path_lengths), max_path_length) + x.shape[1:], dtype=x.dtype)
+    padded[path_idxs, time_steps] = x
+    return padded
+
+
+def split_paths(x, path_lengths):
+    """
+    Returns:
+        (list) : views of the concatenated path data x, one per path
+    """
+    return np.split(x, np.cumsum(path_lengths)[:-1])
+
+
+def discount_cumsum_paths(x, path_lengths, discount):
+    """
+    Computes the discounted cumsums of all paths with a single lfilter call. The concatenated path data is scattered
+    into a zero padded (num_paths, max_path_length) array and filtered along the time axis - the padding lies after
+    the end of each path and thus does not contribute to the sums.
+
+    Args:
+        x (np.ndarray) : concatenated data of the paths, shape (sum(path_lengths),)
+        path_lengths (np.ndarray or list) : lengths of the paths
+        discount (float) : discount factor
+
+    Returns:
+        (np.ndarray) : concatenation of discount_cumsum(x_path, discount) of all paths
+    """
+    path_idxs, time_steps = path_indices(path_lengths)
+    padded = np.zeros((len(path_lengths), int(np.max(path_lengths))) + x.shape[1:], dtype=np.float64)
+    padded[path_idxs, time_steps] = x
+    return discount_cumsum(padded, discount, axis=1)[path_idxs, time_steps]
 
 
 def explained_variance_1d(ypred, y):
@@ -129,6 +190,67 @@ def concat_tensor_dict_list(tensor_dict_list, end=None):
     return ret
 
 
+class InfoBatch(dict):
+    """
+    Columnar representation of the agent / env infos of a batch of samples: a dict that maps each info key to an
+    array whose first dimension is the batch dimension, instead of a list with one info dict per sample.
+
+    Indexing with a key returns the array of that key, indexing with an int returns the info dict of a single sample
+    and indexing with a slice or an index array returns an InfoBatch with the selected samples.
+
+    Args:
+        batch_size (int or None) : number of samples, only required if the batch has no keys
+    """
+
+    def __init__(self, *args, batch_size=None, **kwargs):
+        super(InfoBatch, self).__init__(*args, **kwargs)
+        if batch_size is None:
+            arrays = [value for value in self.values() if not isinstance(value, dict)]
+            batch_size = len(arrays[0]) if arrays else 0
+        self.batch_size = batch_size
+
+    def __getitem__(self, item):
+        if isinstance(item, str):
+            return dict.__getitem__(self, item)
+        elif isinstance(item, (int, np.integer)):
+            return {key: value[item] for key, value in self.items()}
+        else:
+            return InfoBatch([(key, value[item]) for key, value in self.items()],
+                             batch_size=len(np.arange(self.batch_size)[item]))
+
+    def split(self, num_splits):
+        """
+        Returns:
+            (list) : list of num_splits InfoBatches of equal size
+        """
+        assert self.batch_size % num_splits == 0
+        splits = [InfoBatch(batch_size=self.batch_size // num_splits) for _ in range(num_splits)]
+        for key, value in self.items():
+            for split, split_value in zip(splits, np.split(value, num_splits)):
+                dict.__setitem__(split, key, split_value)
+        return splits
+
+    @staticmethod
+    def concat(info_batches):
+        """
+        Args:
+            info_batches (list) : list of InfoBatches or dicts of arrays with the same keys
+
+        Returns:
+            (InfoBatch) : the concatenation of the batches along the batch dimension
+        """
+        info_batches = [info_batch if isinstance(info_batch, InfoBatch) else InfoBatch(info_batch)
+                        for info_batch in info_batches]
+        concatenated = InfoBatch(batch_size=sum(info_batch.batch_size for info_batch in info_batches))
+        for key, example in info_batches[0].items():
+            values = [dict.__getitem__(info_batch, key) for info_batch in info_batches]
+            if isinstance(example, dict):
+                concatenated[key] = InfoBatch.concat(values)
+            else:
+                concatenated[key] = np.concatenate(values)
+        return concatenated
+
+
 def _stack_tensor_dict_list(tensor_dict_list):
     """
     Args:
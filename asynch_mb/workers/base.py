@@ -1,22 +1,56 @@
-import time
+import time, pickle
+from collections import namedtuple
+from contextlib import contextmanager
 from asynch_mb.logger import logger
 from multiprocessing import current_process
 from queue import Empty
 
+QueueMessage = namedtuple('QueueMessage', ['time_put', 'data'])
+
 
 class Worker(object):
     """
     Abstract class for worker instantiations. 
+
+    Args:
+        snapshot_async (bool) : whether to write the snapshots in a background thread
+        snapshot_codec (str) : compression of the asynchronously written snapshots - 'none', 'lz4' or 'zlib'
+        shared_memory (bool) : whether to exchange samples and parameters through shared memory channels instead
+                               of pickling them into the queues
+        log_every (int) : number of loop iterations between two dumps of the diagnostics
+        poll_timeout (float) : max seconds a worker blocks on its queue before re-checking the stop condition
+
+    The loop never spins: a worker that has nothing to do sleeps in a blocking get on its queue and is woken by the
+    next message. The fractions of the wall clock time spent in step / push / synch (busy), blocked on the queue
+    (blocked) and in the bookkeeping of the loop (idle) are logged as {name}-BusyFrac, -BlockedFrac and -IdleFrac.
+    The pushed data is stamped with the time it is put into the queue, and the mean time the received data waited in
+    the queue is logged as {name}-QueueLatency.
     """
     def __init__(
             self,
             verbose=True,
             snapshot_mode='last',
             snapshot_gap=1,
+            snapshot_async=False,
+            snapshot_codec='lz4',
+            shared_memory=False,
+            log_every=1,
+            poll_timeout=1.,
     ):
         self.verbose = verbose
         self.snapshot_mode = snapshot_mode
         self.snapshot_gap = snapshot_gap
+        self.snapshot_async = snapshot_async
+        self.snapshot_codec = snapshot_codec
+        self.shared_memory = shared_memory
+        self._channel = None
+        self._channel_reader = None
+        self.log_every = log_every
+        self.poll_timeout = poll_timeout
+        self._query_pending = False
+        self._utilization = dict(busy=0., blocked=0.)
+        self._time_window_start = None
+        self._queue_latencies = []
 
     def construct_from_feed_dict(self, *args, **kwargs):
         raise NotImplementedError
@@ -44,7 +78,8 @@ class Worker(object):
 
         self.name = current_process().name
         logger.configure(dir=exp_dir + '/' + self.name, format_strs=['csv', 'stdout', 'log'],
-                         snapshot_mode=self.snapshot_mode, snapshot_gap=self.snapshot_gap)
+                         snapshot_mode=self.snapshot_mode, snapshot_gap=self.snapshot_gap,
+                         snapshot_async=self.snapshot_async, snapshot_codec=self.snapshot_codec)
 
         self.n_itr = n_itr
         self.queue_prev = queue_prev
@@ -84,22 +119,27 @@ class Worker(object):
 
             assert remote.recv() == 'start loop'
             total_push, total_synch, total_step = 0, 0, 0
+            num_loops = 0
+            self._reset_utilization()
             while not self.stop_cond.is_set():
                 if self.verbose:
                     logger.log("\n------------------------- {} starting new loop ------------------".format(self.name))
-                if need_query: # poll
+                if need_query and not self._query_pending:
+                    # a single outstanding query suffices, it is answered by the next push of the previous worker
                     time_poll = time.time()
                     queue_prev.put('push')
+                    self._query_pending = True
                     time_poll = time.time() - time_poll
                     logger.logkv('{}-TimePoll'.format(self.name), time_poll)
                 do_push, do_synch, do_step = self.process_queue()
                 # step
                 if do_step:
                     self.itr_counter += 1
-                    self.step()
-                    if auto_push:
-                        do_push += 1
-                        self.push()
+                    with self._account('busy'):
+                        self.step()
+                        if auto_push:
+                            do_push += 1
+                            self.push()
                     # Assuming doing autopush for all
                     assert do_push == 1
                     assert do_step == 1
@@ -107,26 +147,37 @@ class Worker(object):
                 total_push += do_push
                 total_synch += do_synch
                 total_step += do_step
-                logger.logkv(self.name+'-TimeSoFar', time.time() - time_start)
-                logger.logkv(self.name+'-TotalPush', total_push)
-                logger.logkv(self.name+'-TotalSynch', total_synch)
-                logger.logkv(self.name+'-TotalStep', total_step)
-                if total_synch > 0:
-                    logger.logkv(self.name+'-StepPerSynch', total_step/total_synch)
-                logger.dumpkvs()
-                logger.log("\n========================== {} {}, total {} ===================".format(
-                    self.name,
-                    (do_push, do_synch, do_step),
-                    (total_push, total_synch, total_step),
-                ))
+                num_loops += 1
                 self.set_stop_cond()
 
+                if num_loops % self.log_every == 0 or self.stop_cond.is_set():
+                    logger.logkv(self.name+'-TimeSoFar', time.time() - time_start)
+                    logger.logkv(self.name+'-TotalPush', total_push)
+                    logger.logkv(self.name+'-TotalSynch', total_synch)
+                    logger.logkv(self.name+'-TotalStep', total_step)
+                    if total_synch > 0:
+                        logger.logkv(self.name+'-StepPerSynch', total_step/total_synch)
+                    self._log_utilization()
+                    self._log_queue_latency()
+                    logger.dumpkvs()
+                    logger.log("\n========================== {} {}, total {} ===================".format(
+                        self.name,
+                        (do_push, do_synch, do_step),
+                        (total_push, total_synch, total_step),
+                    ))
+
             remote.send('loop done')
 
+            if self.shared_memory:
+                # the slabs can only be released once no worker reads from them anymore
+                assert remote.recv() == 'close channels'
+                self._close_channels()
+
         logger.log("\n================== {} closed ===================".format(
             self.name
         ))
 
+        logger.wait_for_snapshots()
         remote.send('worker closed')
 
     def prepare_start(self):
@@ -134,25 +185,22 @@ class Worker(object):
 
     def process_queue(self):
         do_push, do_synch = 0, 0
-        data = None
+        data_arr = []
 
-        while True:
-            try:
-                if self.verbose:
-                    logger.log('{} try'.format(self.name))
-                new_data = self.queue.get_nowait()
-                if new_data == 'push': # only happens when next worker has need_query = True
-                    if do_push == 0:  # only push once
-                        do_push += 1
+        for new_data in self._drain_queue():
+            if new_data == 'push': # only happens when next worker has need_query = True
+                if do_push == 0:  # only push once
+                    do_push += 1
+                    with self._account('busy'):
                         self.push()
-                else:
-                    do_synch = 1
-                    data = new_data
-            except Empty:
-                break
+            else:
+                do_synch = 1
+                data_arr.append(new_data)
 
         if do_synch:
-            self._synch(data)
+            self._query_pending = False
+            with self._account('busy'):
+                self._synch(self._reduce_synch_data(data_arr))
 
         do_step = 1 # - do_synch
 
@@ -161,9 +209,89 @@ class Worker(object):
 
         return do_push, do_synch, do_step
 
+    def _drain_queue(self, block=False):
+        """
+        Takes all the messages out of the queue in one batch. If block, first sleeps until a message arrives or the
+        stop condition is set, the time spent waiting is accounted as blocked
+
+        Returns:
+            (list) : received messages, empty if the worker has been stopped while waiting
+        """
+        messages = []
+        if block:
+            with self._account('blocked'):
+                while not self.stop_cond.is_set():
+                    try:
+                        messages.append(self._unwrap(self.queue.get(timeout=self.poll_timeout)))
+                        break
+                    except Empty:
+                        pass
+        while True:
+            try:
+                messages.append(self._unwrap(self.queue.get_nowait()))
+            except Empty:
+                return messages
+
+    def _put_next(self, data):
+        """
+        Puts data into queue_next, stamped with the current time
+        """
+        self.queue_next.put(QueueMessage(time.time(), data))
+
+    def _unwrap(self, message):
+        """
+        Strips the time stamp of a message received from the queue and records how long it waited in the queue
+        """
+        if isinstance(message, QueueMessage):
+            self._queue_latencies.append(time.time() - message.time_put)
+            return message.data
+        return message
+
+    @contextmanager
+    def _account(self, state):
+        """
+        Adds the time spent in the block to the utilization counter of state ('busy' or 'blocked')
+        """
+        time_start = time.time()
+        try:
+            yield
+        finally:
+            self._utilization[state] += time.time() - time_start
+
+    def _reset_utilization(self):
+        self._utilization = dict(busy=0., blocked=0.)
+        self._time_window_start = time.time()
+
+    def _log_utilization(self):
+        """
+        Logs the utilization fractions since the last dump of the diagnostics
+        """
+        time_window = max(time.time() - self._time_window_start, 1e-12)
+        busy_frac = self._utilization['busy'] / time_window
+        blocked_frac = self._utilization['blocked'] / time_window
+        logger.logkv(self.name+'-BusyFrac', busy_frac)
+        logger.logkv(self.name+'-BlockedFrac', blocked_frac)
+        logger.logkv(self.name+'-IdleFrac', max(1. - busy_frac - blocked_frac, 0.))
+        self._reset_utilization()
+
+    def _log_queue_latency(self):
+        """
+        Logs the mean queue latency of the data received since the last dump of the diagnostics
+        """
+        if self._queue_latencies:
+            logger.logkv(self.name+'-QueueLatency', sum(self._queue_latencies) / len(self._queue_latencies))
+            self._queue_latencies = []
+
     def step(self, *args, **kwargs):
         raise NotImplementedError
 
+    def _reduce_synch_data(self, data_arr):
+        """
+        Reduces the data received since the last synchronization to the data passed to _synch. By default only
+        the latest data is used
+        """
+        return data_arr[-1]
+
     def _synch(self, *args, **kwargs):
         raise NotImplementedError
 
@@ -173,3 +301,33 @@ class Worker(object):
     def set_stop_cond(self):
         pass
 
+    def _dumps(self, obj, samples=False):
+        """
+        Serializes obj to be put into queue_next. With shared memory, obj is written into the channel of this
+        worker and only the handle of the channel is returned
+        """
+        if not self.shared_memory:
+            return pickle.dumps(obj)
+        from asynch_mb.workers.shared_channels import SharedParamsChannel, SharedSamplesChannel
+        if self._channel is None:
+            self._channel = SharedSamplesChannel() if samples else SharedParamsChannel()
+        return self._channel.write(obj)
+
+    def _loads(self, data):
+        """
+        Inverse of _dumps. Accepts both pickles and shared memory handles
+        """
+        data = self._unwrap(data)
+        if isinstance(data, bytes):
+            return pickle.loads(data)
+        from asynch_mb.workers.shared_channels import SharedChannelReader
+        if self._channel_reader is None:
+            self._channel_reader = SharedChannelReader()
+        return self._channel_reader.read(data)
+
+    def _close_channels(self):
+        if self._channel is not None:
+            self._channel.close()
+        if self._channel_reader is not None:
+            self._channel_reader.close()
+
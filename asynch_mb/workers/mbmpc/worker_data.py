@@ -4,8 +4,8 @@ from asynch_mb.workers.base import Worker
 
 
 class WorkerData(Worker):
-    def __init__(self, simulation_sleep):
-        super().__init__()
+    def __init__(self, simulation_sleep, shared_memory=False, log_every=1):
+        super().__init__(shared_memory=shared_memory, log_every=log_every)
         self.simulation_sleep = simulation_sleep
         self.env = None
         self.env_sampler = None
@@ -80,7 +80,7 @@ class WorkerData(Worker):
 
     def _synch(self, dynamics_model_state_pickle):
         time_synch = time.time()
-        dynamics_model_state = pickle.loads(dynamics_model_state_pickle)
+        dynamics_model_state = self._loads(dynamics_model_state_pickle)
         assert isinstance(dynamics_model_state, dict)
         self.env_sampler.policy.dynamics_model.set_shared_params(dynamics_model_state)
         time_synch = time.time() - time_synch
@@ -89,7 +89,7 @@ class WorkerData(Worker):
 
     def push(self):
         time_push = time.time()
-        self.queue_next.put(pickle.dumps(self.samples_data_arr))
+        self._put_next(self._dumps(self.samples_data_arr, samples=True))
         self.samples_data_arr = []
         time_push = time.time() - time_push
 
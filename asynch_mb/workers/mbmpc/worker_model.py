@@ -6,8 +6,8 @@ import numpy as np
 
 
 class WorkerModel(Worker):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, shared_memory=False, log_every=1):
+        super().__init__(shared_memory=shared_memory, log_every=log_every)
         self.sum_model_itr = 0
         self.with_new_data = None
         self.remaining_model_idx = None
@@ -25,7 +25,7 @@ class WorkerModel(Worker):
         self.dynamics_model = pickle.loads(dynamics_model_pickle)
 
     def prepare_start(self):
-        samples_data_arr = pickle.loads(self.queue.get())
+        samples_data_arr = self._loads(self.queue.get())
         self._synch(samples_data_arr, check_init=True)
         self.step()
         self.queue_next.put(pickle.dumps(self.dynamics_model))
@@ -33,33 +33,32 @@ class WorkerModel(Worker):
     def process_queue(self):
         do_push = 0
         samples_data_arr = []
-        while True:
-            try:
-                if not self.remaining_model_idx:
-                    logger.log('Model at iteration {} is block waiting for data'.format(self.itr_counter))
-                    # FIXME: check stop_cond
-                    time_wait = time.time()
-                    samples_data_arr_pickle = self.queue.get()
-                    time_wait = time.time() - time_wait
-                    logger.logkv('Model-TimeBlockWait', time_wait)
-                    self.remaining_model_idx = list(range(self.dynamics_model.num_models))
-                else:
-                    if self.verbose:
-                        logger.log('Model try get_nowait.........')
-                    samples_data_arr_pickle = self.queue.get_nowait()
-                if samples_data_arr_pickle == 'push':
-                    # Only push once before executing another step
-                    if do_push == 0:
-                        do_push = 1
+        block = not self.remaining_model_idx
+        if block:
+            logger.log('Model at iteration {} is block waiting for data'.format(self.itr_counter))
+        time_wait = time.time()
+        messages = self._drain_queue(block=block)
+        if block:
+            logger.logkv('Model-TimeBlockWait', time.time() - time_wait)
+            if not messages:  # stopped while waiting
+                return 0, 0, 0
+            self.remaining_model_idx = list(range(self.dynamics_model.num_models))
+
+        for samples_data_arr_pickle in messages:
+            if samples_data_arr_pickle == 'push':
+                # Only push once before executing another step
+                if do_push == 0:
+                    do_push = 1
+                    with self._account('busy'):
                         self.push()
-                else:
-                    samples_data_arr.extend(pickle.loads(samples_data_arr_pickle))
-            except Empty:
-                break
+            else:
+                samples_data_arr.extend(self._loads(samples_data_arr_pickle))
 
         do_synch = len(samples_data_arr)
         if do_synch:
-            self._synch(samples_data_arr)
+            self._query_pending = False
+            with self._account('busy'):
+                self._synch(samples_data_arr)
 
         do_step = 1
 
@@ -115,7 +114,7 @@ class WorkerModel(Worker):
 
     def push(self):
         time_push = time.time()
-        state_pickle = pickle.dumps(self.dynamics_model.get_shared_param_values())
+        state_pickle = self._dumps(self.dynamics_model.get_shared_param_values())
         assert state_pickle is not None
         while self.queue_next.qsize() > 5:
             try:
@@ -123,7 +122,7 @@ class WorkerModel(Worker):
                 _ = self.queue_next.get_nowait()
             except Empty:
                 break
-        self.queue_next.put(state_pickle)
+        self._put_next(state_pickle)
         time_push = time.time() - time_push
 
         logger.logkv('Model-TimePush', time_push)
@@ -2,16 +2,18 @@ import time, pickle
 from queue import Empty
 from asynch_mb.logger import logger
 from asynch_mb.workers.base import Worker
+from asynch_mb.workers.param_sync import DeltaParamsReader
 
 
 class WorkerPolicy(Worker):
-    def __init__(self, num_inner_grad_steps, sampler_str='mbmpo'):
-        super().__init__()
+    def __init__(self, num_inner_grad_steps, sampler_str='mbmpo', shared_memory=False, log_every=1):
+        super().__init__(shared_memory=shared_memory, log_every=log_every)
         self.num_inner_grad_steps = num_inner_grad_steps
         self.policy = None
         self.baseline = None
         self.model_sampler = None
         self.model_sample_processor = None
+        self.params_reader = None
         self.algo = None
         self.sampler_str = sampler_str
 
@@ -34,6 +36,7 @@ class WorkerPolicy(Worker):
         baseline = pickle.loads(baseline_pickle)
         dynamics_model = pickle.loads(dynamics_model_pickle)
 
+        self.params_reader = DeltaParamsReader(dynamics_model.num_networks)
         self.policy = policy
         self.baseline = baseline
         if self.sampler_str == 'mbmpo':
@@ -98,12 +101,16 @@ class WorkerPolicy(Worker):
 
         logger.logkv('Policy-TimeStep', time_step)
 
-    def _synch(self, dynamics_model_state_pickle):
+    def _reduce_synch_data(self, data_arr):
+        return self.params_reader.merge(data_arr, self._loads)
+
+    def _synch(self, dynamics_model_state):
         time_synch = time.time()
         if self.verbose:
             logger.log('Policy is synchronizing...')
-        dynamics_model_state = pickle.loads(dynamics_model_state_pickle)
         assert isinstance(dynamics_model_state, dict)
+        # only assign the networks that changed since the last synchronization
+        dynamics_model_state = self.params_reader.filter(dynamics_model_state)
         self.model_sampler.dynamics_model.set_shared_params(dynamics_model_state)
         if hasattr(self.model_sampler, 'vec_env'):
             self.model_sampler.vec_env.dynamics_model.set_shared_params(dynamics_model_state)
@@ -113,7 +120,7 @@ class WorkerPolicy(Worker):
 
     def push(self):
         time_push = time.time()
-        policy_state_pickle = pickle.dumps(self.policy.get_shared_param_values())
+        policy_state_pickle = self._dumps(self.policy.get_shared_param_values())
         assert policy_state_pickle is not None
         while self.queue_next.qsize() > 5:
             try:
@@ -122,7 +129,7 @@ class WorkerPolicy(Worker):
             except Empty:
                 # very rare chance to reach here
                 break
-        self.queue_next.put(policy_state_pickle)
+        self._put_next(policy_state_pickle)
         time_push = time.time() - time_push
 
         logger.logkv('Policy-TimePush', time_push)
@@ -4,11 +4,12 @@ from asynch_mb.workers.base import Worker
 
 
 class WorkerData(Worker):
-    def __init__(self, simulation_sleep, video=False):
+    def __init__(self, simulation_sleep, video=False, shared_memory=False, log_every=1):
         if video:
-            super().__init__(snapshot_mode='gap', snapshot_gap=int(30/1250/simulation_sleep))  # FIXME
+            super().__init__(snapshot_mode='gap', snapshot_gap=int(30/1250/simulation_sleep),  # FIXME
+                             snapshot_async=True, shared_memory=shared_memory, log_every=log_every)
         else:
-            super().__init__()
+            super().__init__(shared_memory=shared_memory, log_every=log_every)
         self.simulation_sleep = simulation_sleep
         self.env = None
         self.env_sampler = None
@@ -81,7 +82,7 @@ class WorkerData(Worker):
 
     def _synch(self, policy_state_pickle):
         time_synch = time.time()
-        policy_state = pickle.loads(policy_state_pickle)
+        policy_state = self._loads(policy_state_pickle)
         assert isinstance(policy_state, dict)
         self.env_sampler.policy.set_shared_params(policy_state)
         time_synch = time.time() - time_synch
@@ -90,7 +91,7 @@ class WorkerData(Worker):
 
     def push(self):
         time_push = time.time()
-        self.queue_next.put(pickle.dumps(self.samples_data_arr))
+        self._put_next(self._dumps(self.samples_data_arr, samples=True))
         self.samples_data_arr = []
         time_push = time.time() - time_push
 
@@ -1,13 +1,21 @@
 import time, pickle
 from asynch_mb.logger import logger
 from asynch_mb.workers.base import Worker
+from asynch_mb.workers.param_sync import DeltaParamsWriter
 from queue import Empty
 import numpy as np
 
 
 class WorkerModel(Worker):
-    def __init__(self):
-        super().__init__()
+    """
+    Args:
+        delta_params (bool) : whether to only push the params of the models that have been trained since the last
+                              push (not supported with shared memory, whose slab only holds the latest params)
+    """
+    def __init__(self, shared_memory=False, delta_params=False, log_every=1):
+        super().__init__(shared_memory=shared_memory, log_every=log_every)
+        self.delta_params = delta_params and not shared_memory
+        self.params_writer = None
         self.with_new_data = None
         self.remaining_model_idx = None
         self.valid_loss_rolling_average = None
@@ -22,43 +30,45 @@ class WorkerModel(Worker):
             feed_dict
     ):
         self.dynamics_model = pickle.loads(dynamics_model_pickle)
+        self.params_writer = DeltaParamsWriter(self.dynamics_model.num_models, self.dynamics_model.num_networks,
+                                               delta=self.delta_params)
 
     def prepare_start(self):
-        samples_data_arr = pickle.loads(self.queue.get())
+        samples_data_arr = self._loads(self.queue.get())
         self._synch(samples_data_arr, check_init=True)
         self.step()
         self.queue_next.put(pickle.dumps(self.dynamics_model))
+        self.params_writer.mark_synchronized()
 
     def process_queue(self):
         do_push = 0
         samples_data_arr = []
-        while True:
-            try:
-                if not self.remaining_model_idx:
-                    logger.log('Model at iteration {} is block waiting for data'.format(self.itr_counter))
-                    # FIXME: check stop_cond
-                    time_wait = time.time()
-                    samples_data_arr_pickle = self.queue.get()
-                    time_wait = time.time() - time_wait
-                    logger.logkv('Model-TimeBlockWait', time_wait)
-                    self.remaining_model_idx = list(range(self.dynamics_model.num_models))
-                else:
-                    if self.verbose:
-                        logger.log('Model try get_nowait.........')
-                    samples_data_arr_pickle = self.queue.get_nowait()
-                if samples_data_arr_pickle == 'push':
-                    # Only push once before executing another step
-                    if do_push == 0:
-                        do_push = 1
+        block = not self.remaining_model_idx
+        if block:
+            logger.log('Model at iteration {} is block waiting for data'.format(self.itr_counter))
+        time_wait = time.time()
+        messages = self._drain_queue(block=block)
+        if block:
+            logger.logkv('Model-TimeBlockWait', time.time() - time_wait)
+            if not messages:  # stopped while waiting
+                return 0, 0, 0
+            self.remaining_model_idx = list(range(self.dynamics_model.num_models))
+
+        for samples_data_arr_pickle in messages:
+            if samples_data_arr_pickle == 'push':
+                # Only push once before executing another step
+                if do_push == 0:
+                    do_push = 1
+                    with self._account('busy'):
                         self.push()
-                else:
-                    samples_data_arr.extend(pickle.loads(samples_data_arr_pickle))
-            except Empty:
-                break
+            else:
+                samples_data_arr.extend(self._loads(samples_data_arr_pickle))
 
         do_synch = len(samples_data_arr)
         if do_synch:
-            self._synch(samples_data_arr)
+            self._query_pending = False
+            with self._account('busy'):
+                self._synch(samples_data_arr)
 
         do_step = 1
 
@@ -74,6 +84,7 @@ class WorkerModel(Worker):
 
         if self.verbose:
             logger.log('Model at iteration {} is training for one epoch...'.format(self.itr_counter))
+        self.params_writer.mark_updated(self.remaining_model_idx)
         self.remaining_model_idx, self.valid_loss_rolling_average = self.dynamics_model.fit_one_epoch(
             remaining_model_idx=self.remaining_model_idx,
             valid_loss_rolling_average_prev=self.valid_loss_rolling_average,
@@ -111,15 +122,19 @@ class WorkerModel(Worker):
 
     def push(self):
         time_push = time.time()
-        state_pickle = pickle.dumps(self.dynamics_model.get_shared_param_values())
-        assert state_pickle is not None
+        num_dropped = 0
         while self.queue_next.qsize() > 5:
             try:
                 logger.log('Model is off loading data from queue_next...')
                 _ = self.queue_next.get_nowait()
+                num_dropped += 1
             except Empty:
                 break
-        self.queue_next.put(state_pickle)
+        # the policy worker misses the params of the dropped snapshots, hence send all params
+        state = self.params_writer.snapshot(self.dynamics_model, full=num_dropped > 0)
+        state_pickle = self._dumps(state)
+        assert state_pickle is not None
+        self._put_next(state_pickle)
         time_push = time.time() - time_push
 
         logger.logkv('Model-TimePush', time_push)
@@ -0,0 +1,121 @@
+"""
+Versioned (delta) snapshots of the shared params of a dynamics model ensemble, sent from the model worker to the
+policy worker. Every network carries the version of the snapshot in which it was last updated, such that the
+receiver only assigns the networks that changed since the snapshot it applied last.
+"""
+
+
+class DeltaParamsWriter(object):
+    """
+    Sender side. With delta=True a snapshot only contains the params of the networks that have been updated since
+    the previous snapshot (the entries of the other networks are None). Every keyframe_interval-th snapshot and
+    every snapshot requested with full=True (e.g. after queued snapshots have been dropped) contains all networks.
+
+    Args:
+        num_models (int) : number of models of the ensemble
+        num_networks (int) : number of networks holding the params of the models - either one per model or one
+                             network for the whole (fused) ensemble
+        delta (bool) : whether to send delta snapshots
+        keyframe_interval (int) : max number of snapshots between two full snapshots
+    """
+
+    def __init__(self, num_models, num_networks, delta=False, keyframe_interval=10):
+        assert num_networks in (1, num_models)
+        self.num_models = num_models
+        self.num_networks = num_networks
+        self.delta = delta
+        self.keyframe_interval = keyframe_interval
+
+        self.version = 0
+        self.network_versions = [0] * num_networks
+        self._updated = set()
+        self._snapshots_since_keyframe = 0
+
+    def mark_synchronized(self):
+        """
+        To be called if the receiver got the current params by other means (e.g. the pickled dynamics model)
+        """
+        self._updated = set()
+        self._snapshots_since_keyframe = 0
+
+    def mark_updated(self, model_idxs):
+        """
+        Args:
+            model_idxs (list) : indices of the models whose params have been changed (e.g. by a training epoch)
+        """
+        if self.num_networks == self.num_models:
+            self._updated.update(model_idxs)
+        elif len(model_idxs):
+            self._updated.add(0)
+
+    def snapshot(self, dynamics_model, full=False):
+        """
+        Returns:
+            (dict) : shared params of the dynamics model, tagged with the versions
+        """
+        self.version += 1
+        for idx in self._updated:
+            self.network_versions[idx] = self.version
+
+        full = full or not self.delta or self._snapshots_since_keyframe + 1 >= self.keyframe_interval
+        self._snapshots_since_keyframe = 0 if full else self._snapshots_since_keyframe + 1
+        network_idxs = None if full else sorted(self._updated)
+        self._updated = set()
+
+        state = dynamics_model.get_shared_param_values(network_idxs=network_idxs)
+        state.update(version=self.version, full=full, network_versions=list(self.network_versions))
+        return state
+
+
+class DeltaParamsReader(object):
+    """
+    Receiver side. Keeps track of the versions of the networks that have been assigned.
+
+    Args:
+        num_networks (int) : number of networks holding the params of the models
+    """
+
+    def __init__(self, num_networks):
+        self.network_versions = [0] * num_networks
+
+    def merge(self, data_arr, loads):
+        """
+        Reduces the snapshots received since the last synchronization to one snapshot: the deltas are laid over
+        the last full snapshot. Snapshots that precede the last full snapshot are not even deserialized.
+
+        Args:
+            data_arr (list) : serialized snapshots in the order they were sent
+            loads (callable) : deserializes a snapshot
+
+        Returns:
+            (dict) : merged snapshot
+        """
+        states = []
+        for data in reversed(data_arr):
+            states.insert(0, loads(data))
+            if states[0]['full']:
+                break
+
+        merged = states[0]
+        for state in states[1:]:
+            networks_params = [old if new is None else new
+                               for old, new in zip(merged['networks_params'], state['networks_params'])]
+            merged = dict(state, networks_params=networks_params)
+        return merged
+
+    def filter(self, state):
+        """
+        Removes the params of the networks that are already up to date and records the versions of the others,
+        which the caller is expected to assign
+
+        Returns:
+            (dict) : snapshot that only contains the params of the outdated networks
+        """
+        networks_params = []
+        for idx, (params, version) in enumerate(zip(state['networks_params'], state['network_versions'])):
+            if params is not None and int(version) > self.network_versions[idx]:
+                networks_params.append(params)
+                self.network_versions[idx] = int(version)
+            else:
+                networks_params.append(None)
+        return dict(state, networks_params=networks_params)
@@ -0,0 +1,271 @@
+"""
+Shared-memory channels for exchanging parameters and samples between the workers of the parallel trainers.
+The payload is written into a preallocated shared memory slab and only a small handle (slab name, layout and
+version) is sent over the multiprocessing queue, so that neither side has to (un)pickle large arrays.
+The slabs are memory mapped files in /dev/shm (or the temp directory if there is none) that the readers open by
+name, since multiprocessing.shared_memory is only available from python 3.8 on.
+"""
+from collections import namedtuple
+import mmap
+import numpy as np
+import os
+import tempfile
+import uuid
+
+_HEADER_BYTES = 16  # two uint64: seqlock version / write counter, end of the rows being written (samples only)
+_ALIGNMENT = 64
+_SLAB_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+ArraySpec = namedtuple('ArraySpec', ['offset', 'shape', 'dtype'])
+SharedParamsHandle = namedtuple('SharedParamsHandle', ['name', 'spec', 'size', 'version'])
+SharedSamplesHandle = namedtuple('SharedSamplesHandle', ['name', 'spec', 'size', 'capacity', 'write_count'])
+
+
+class SharedParamsChannel(object):
+    """
+    Writer side of a parameter channel. The (nested) dict / list of numpy arrays returned by
+    get_shared_param_values is copied into a shared memory slab protected by a seqlock: the version counter
+    is odd while the slab is written, so readers can detect (and retry) torn reads. A new slab is only allocated
+    if the layout of the parameters changes.
+    """
+
+    def __init__(self):
+        self._shm = None
+        self._spec = None
+        self._version = 0
+        self._retired = []
+
+    def write(self, params):
+        """
+        Args:
+            params (dict or list) : nested structure of numpy arrays
+
+        Returns:
+            (SharedParamsHandle) : handle that has to be sent to the reader
+        """
+        spec, size = _build_spec(params, 0)
+        if self._shm is None or spec != self._spec:
+            if self._shm is not None:
+                self._retired.append(self._shm)  # readers may still hold handles to the old slab
+            self._shm = _create_slab(size)
+            self._spec = spec
+
+        header = _header(self._shm)
+        header[0] += 1  # odd: write in progress
+        _write(self._shm, spec, params)
+        header[0] += 1
+        self._version = int(header[0])
+        return SharedParamsHandle(self._shm.name, spec, size, self._version)
+
+    def close(self):
+        for shm in self._retired + ([self._shm] if self._shm is not None else []):
+            shm.close()
+            shm.unlink()
+        self._shm, self._retired = None, []
+
+
+class SharedSamplesChannel(object):
+    """
+    Writer side of a sample channel. The rows of the given keys of the samples_data dicts are appended to a ring
+    buffer in shared memory and the total number of written rows acts as version counter. The end of the rows that
+    are being written is announced before they are written, such that the reader can tell which of its rows may have
+    been overwritten. The reader keeps track of the rows it has already consumed, and if the writer has lapped the
+    reader, the overwritten rows are dropped.
+
+    Args:
+        keys (tuple) : keys of the samples_data dicts that are transferred
+        capacity (int) : number of rows of the ring buffer
+    """
+
+    def __init__(self, keys=('observations', 'actions', 'next_observations'), capacity=int(1e5)):
+        self.keys = keys
+        self.capacity = capacity
+        self._shm = None
+        self._spec = None
+        self._size = None
+        self._write_count = 0
+
+    def write(self, samples_data_arr):
+        """
+        Args:
+            samples_data_arr (list) : list of samples_data dicts
+
+        Returns:
+            (SharedSamplesHandle) : handle that has to be sent to the reader
+        """
+        rows = {key: np.concatenate([samples_data[key] for samples_data in samples_data_arr]) for key in self.keys}
+        num_rows = len(rows[self.keys[0]])
+        assert num_rows <= self.capacity, "pushed more samples than the capacity of the ring buffer"
+
+        if self._shm is None:
+            ring = {key: np.empty((self.capacity,) + value.shape[1:], dtype=value.dtype) for key, value in rows.items()}
+            self._spec, size = _build_spec(ring, 0)
+            self._size = size
+            self._shm = _create_slab(size)
+
+        header = _header(self._shm)
+        header[1] = self._write_count + num_rows  # announce the rows that are about to be overwritten
+        idxs = np.arange(self._write_count, self._write_count + num_rows) % self.capacity
+        for key, spec in self._spec.items():
+            _view(self._shm, spec)[idxs] = rows[key]
+
+        self._write_count += num_rows
+        header[0] = self._write_count  # publish the new rows
+        return SharedSamplesHandle(self._shm.name, self._spec, self._size, self.capacity, self._write_count)
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+        self._shm = None
+
+
+class SharedChannelReader(object):
+    """
+    Reader side of the shared memory channels. Attaches lazily to the slabs referenced by the received handles.
+    """
+
+    def __init__(self):
+        self._slabs = dict()
+        self._read_counts = dict()
+        self.num_dropped = 0
+
+    def read(self, handle):
+        """
+        Args:
+            handle (SharedParamsHandle or SharedSamplesHandle) : handle sent by the writer
+
+        Returns:
+            (dict or list) : copy of the parameters or list with one samples_data dict with the new rows
+        """
+        shm = self._attach(handle.name)
+        if isinstance(handle, SharedParamsHandle):
+            return self._read_params(shm, handle)
+        elif isinstance(handle, SharedSamplesHandle):
+            return self._read_samples(shm, handle)
+        else:
+            raise NotImplementedError
+
+    def close(self):
+        for shm in self._slabs.values():
+            shm.close()
+        self._slabs = dict()
+
+    def _read_params(self, shm, handle):
+        header = _header(shm)
+        while True:
+            version = int(header[0])
+            if version % 2:
+                continue
+            params = _read(shm, handle.spec)
+            if int(header[0]) == version:
+                return params
+
+    def _read_samples(self, shm, handle):
+        start = self._read_counts.get(handle.name, 0)
+        end = handle.write_count
+        start = max(start, end - handle.capacity)
+        idxs = np.arange(start, end) % handle.capacity
+        rows = {key: _view(shm, spec)[idxs] for key, spec in handle.spec.items()}
+
+        # rows that the writer overwrote (or is overwriting) while copying are stale
+        overwritten = min(max(int(_header(shm)[1]) - handle.capacity - start, 0), end - start)
+        if overwritten:
+            rows = {key: value[overwritten:] for key, value in rows.items()}
+        self.num_dropped += max(start - self._read_counts.get(handle.name, 0), 0) + overwritten
+        self._read_counts[handle.name] = end
+        return [rows]
+
+    def _attach(self, name):
+        if name not in self._slabs:
+            # the writer owns (and unlinks) the slab
+            self._slabs[name] = _Slab(name)
+        return self._slabs[name]
+
+
+class _Slab(object):
+    """
+    Memory mapped file that is shared between the processes by its name
+
+    Args:
+        name (str) : file name of the slab in _SLAB_DIR
+        size (int or None) : size in bytes of a new slab, None attaches to an existing one
+    """
+
+    def __init__(self, name, size=None):
+        self.name = name
+        self._path = os.path.join(_SLAB_DIR, name)
+        if size is None:
+            fd = os.open(self._path, os.O_RDWR)
+            size = os.fstat(fd).st_size
+        else:
+            fd = os.open(self._path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+            os.ftruncate(fd, size)
+        try:
+            self.buf = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        self.buf.close()
+
+    def unlink(self):
+        os.unlink(self._path)
+
+
+def _create_slab(size):
+    shm = _Slab('asynch_mb_' + uuid.uuid4().hex[:16], size=_HEADER_BYTES + max(size, 1))
+    _header(shm)[:] = 0
+    return shm
+
+
+def _header(shm):
+    return np.ndarray((2,), dtype=np.uint64, buffer=shm.buf, offset=0)
+
+
+def _view(shm, spec):
+    return np.ndarray(spec.shape, dtype=np.dtype(spec.dtype), buffer=shm.buf, offset=_HEADER_BYTES + spec.offset)
+
+
+def _build_spec(struct, offset):
+    """ replaces the arrays of a nested structure with their location in the slab """
+    if isinstance(struct, (np.ndarray, np.generic, float, int)) and not isinstance(struct, bool):
+        value = np.asarray(struct)
+        spec = ArraySpec(offset, value.shape, value.dtype.str)
+        return spec, offset + int(np.ceil(value.nbytes / _ALIGNMENT)) * _ALIGNMENT
+    elif isinstance(struct, dict):
+        items = []
+        for key, value in struct.items():
+            value, offset = _build_spec(value, offset)
+            items.append((key, value))
+        return type(struct)(items), offset
+    elif isinstance(struct, (list, tuple)):
+        items = []
+        for value in struct:
+            value, offset = _build_spec(value, offset)
+            items.append(value)
+        return type(struct)(items), offset
+    else:
+        return struct, offset
+
+
+def _write(shm, spec, struct):
+    if isinstance(spec, ArraySpec):
+        _view(shm, spec)[...] = struct
+    elif isinstance(spec, dict):
+        for key, value in spec.items():
+            _write(shm, value, struct[key])
+    elif isinstance(spec, (list, tuple)) and not isinstance(spec, ArraySpec):
+        for value, sub_struct in zip(spec, struct):
+            _write(shm, value, sub_struct)
+
+
+def _read(shm, spec):
+    if isinstance(spec, ArraySpec):
+        return np.array(_view(shm, spec))
+    elif isinstance(spec, dict):
+        return type(spec)((key, _read(shm, value)) for key, value in spec.items())
+    elif isinstance(spec, (list, tuple)):
+        return type(spec)(_read(shm, value) for value in spec)
+    else:
+        return spec
@@ -1,6 +1,7 @@
 import time, pickle
 from asynch_mb.logger import logger
 from asynch_mb.workers_multi_machines.base import Worker
+from asynch_mb.workers_multi_machines.utils import pull_params
 import ray
 
 
@@ -11,6 +12,7 @@ class WorkerData(Worker):
         self.policy_ps = policy_ps
         self.data_buffers = data_buffers
         self.time_sleep = time_sleep
+        self.policy_version = None
         self.env = None
         self.env_sampler = None
         self.dynamics_sample_processor = None
@@ -45,10 +47,10 @@ class WorkerData(Worker):
         return 1
 
     def step_wrapper(self):
-        self.pull()
+        do_synch = self.pull()
         samples_data = self.step()
         self.push(samples_data)
-        return 1, 1
+        return do_synch, 1
 
     def step(self, random=False):
         time_step = time.time()
@@ -85,18 +87,19 @@ class WorkerData(Worker):
 
     def pull(self):
         time_synch = time.time()
-        policy_params = ray.get(self.policy_ps.pull.remote())
-        assert isinstance(policy_params, dict)
-        self.env_sampler.policy.set_shared_params(policy_params)
+        self.policy_version, policy_params = pull_params(self.policy_ps, self.policy_version)
+        if policy_params is not None:
+            assert isinstance(policy_params, dict)
+            self.env_sampler.policy.set_shared_params(policy_params)
         logger.logkv('Data-TimePull', time.time() - time_synch)
+        return int(policy_params is not None)
 
     def push(self, samples_data):
         time_push = time.time()
-        # broadcast samples to all data buffers
+        # broadcast samples to all data buffers, which only store the reference to the object store
         samples_data_id = ray.put(samples_data)
         for data_buffer in self.data_buffers:
-            # ray.get(data_buffer.push.remote(samples_data))
-            data_buffer.push.remote(samples_data_id)
+            data_buffer.push.remote([samples_data_id])
         logger.logkv('Data-TimePush', time.time() - time_push)
 
     def set_stop_cond(self):
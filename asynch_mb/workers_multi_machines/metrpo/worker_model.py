@@ -1,6 +1,7 @@
 import time
 from asynch_mb.logger import logger
 from asynch_mb.workers_multi_machines.base import Worker
+from asynch_mb.workers_multi_machines.utils import pull_samples
 import numpy as np
 import pickle
 import ray
@@ -62,12 +63,13 @@ class WorkerModel(Worker):
 
     def pull(self, check_init=False):
         time_synch = time.time()
-        samples_data_arr = ray.get(self.data_buffer.pull.remote())
+        # zero-copy views into the object store, copied once into the buffer of the dynamics model
+        samples_data_arr = pull_samples(self.data_buffer)
         if check_init or not self.remaining_model_idx:
             # block wait until some data comes
             time_wait = time.time()
             while not samples_data_arr:
-                samples_data_arr = ray.get(self.data_buffer.pull.remote())
+                samples_data_arr = pull_samples(self.data_buffer)
             logger.logkv('Model-TimeBlockWait', time.time() - time_wait)
         if samples_data_arr:
             obs = np.concatenate([samples_data['observations'] for samples_data in samples_data_arr])
@@ -92,6 +94,6 @@ class WorkerModel(Worker):
         time_push = time.time()
         params = self.dynamics_model.get_shared_param_values()
         assert params is not None
-        ray.get(self.model_ps.push.remote(params))  # FIXME: wait here until push succees?
+        ray.get(self.model_ps.push.remote([ray.put(params)]))  # FIXME: wait here until push succees?
         logger.logkv('Model-TimePush', time.time() - time_push)
 
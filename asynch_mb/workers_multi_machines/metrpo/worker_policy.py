@@ -1,6 +1,7 @@
 import time, pickle
 from asynch_mb.logger import logger
 from asynch_mb.workers_multi_machines.base import Worker
+from asynch_mb.workers_multi_machines.utils import pull_params
 import ray
 
 
@@ -10,6 +11,7 @@ class WorkerPolicy(Worker):
         super().__init__(name, exp_dir, n_itr, stop_cond)
         self.model_ps = model_ps
         self.policy_ps = policy_ps
+        self.model_version = None
         self.policy = None
         self.baseline = None
         self.model_sampler = None
@@ -94,27 +96,29 @@ class WorkerPolicy(Worker):
         logger.logkv('Policy-TimeStep', time.time() - time_step)
 
     def step_wrapper(self):
-        self.pull()
+        do_synch = self.pull()
         self.step()
         self.push()
-        return 1, 1
+        return do_synch, 1
 
     def pull(self):
         time_synch = time.time()
         if self.verbose:
             logger.log('Policy is synchronizing...')
-        model_params = ray.get(self.model_ps.pull.remote())
-        assert isinstance(model_params, dict)
-        self.model_sampler.dynamics_model.set_shared_params(model_params)
-        if hasattr(self.model_sampler, 'vec_env'):
-            self.model_sampler.vec_env.dynamics_model.set_shared_params(model_params)
+        self.model_version, model_params = pull_params(self.model_ps, self.model_version)
+        if model_params is not None:
+            assert isinstance(model_params, dict)
+            self.model_sampler.dynamics_model.set_shared_params(model_params)
+            if hasattr(self.model_sampler, 'vec_env'):
+                self.model_sampler.vec_env.dynamics_model.set_shared_params(model_params)
         logger.logkv('Policy-TimePull', time.time() - time_synch)
+        return int(model_params is not None)
 
     def push(self):
         time_push = time.time()
         params = self.policy.get_shared_param_values()
         assert params is not None
-        self.policy_ps.push.remote(params)
+        self.policy_ps.push.remote([ray.put(params)])
         logger.logkv('Policy-TimePush', time.time() - time_push)
 
     def log_diagnostics(self, paths, prefix):
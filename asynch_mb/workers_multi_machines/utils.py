@@ -1,43 +1,113 @@
+"""
+The buffers and parameter servers only hand out object references of the pushed data, which is stored once in the
+object store by the pusher (ray.put). The references are wrapped in lists, since ray would resolve (i.e. copy
+the data into the actor) object references that are passed as top level arguments or returned as top level
+values. Pullers ray.get the references, which returns read-only zero-copy views of the numpy arrays.
+
+The pinned ray version (0.7.5) neither reference counts nor pins put objects, so they may be evicted from the
+object store and cannot be reconstructed. The actors therefore ray.get the pushed data once and hold on to it,
+which keeps the numpy buffers in the object store alive, and serve a copy of the held data if a reference still
+turns out to be lost (ray.exceptions.UnreconstructableError).
+"""
 import ray
+from ray.exceptions import UnreconstructableError
 
 
 @ray.remote
 class DataBuffer(object):
     def __init__(self):
-        self.samples_data_arr = []
+        self.samples_data_refs = []
+        self.samples_data = []
+        self.pulled_samples_data = []
 
-    def push(self, samples_data):
-        self.samples_data_arr.append(samples_data)
+    def push(self, samples_data_refs):
+        """
+        :param samples_data_refs: list of object references of samples_data dicts
+        :return:
+        """
+        self.samples_data_refs.extend(samples_data_refs)
+        self.samples_data.extend(ray.get(samples_data_refs))
 
     def pull(self):
         """
-        Purge the buffer.
-        :return:
+        Purge the buffer. The pulled data stays pinned until the next pull.
+        :return: list of object references of samples_data dicts
         """
-        samples_data_arr = self.samples_data_arr
-        self.samples_data_arr = []
-        return samples_data_arr
+        samples_data_refs = self.samples_data_refs
+        self.pulled_samples_data = self.samples_data
+        self.samples_data_refs, self.samples_data = [], []
+        return samples_data_refs
+
+    def pull_values(self):
+        """
+        No effect on the buffer.
+        :return: the samples_data dicts of the last pull
+        """
+        return self.pulled_samples_data
 
 
 @ray.remote
 class ParamServer(object):
     def __init__(self):
+        self.params_ref = None
         self.params = None
+        self.version = 0
 
-    def push(self, params):
+    def push(self, params_refs):
         """
 
-        :param params: instance.get_shared_param_values() or pickled instance
-        :return:
+        :param params_refs: list with the object reference of instance.get_shared_param_values() or pickled instance
+        :return: version of the pushed params
         """
-        self.params = params
+        self.params_ref, = params_refs
+        self.params = ray.get(self.params_ref)
+        self.version += 1
+        return self.version
 
-    def pull(self):
+    def pull(self, version=None):
         """
         No effect on the server.
-        :return:
+        :param version: version of the params the puller already has
+        :return: current version and a list with the object reference of the params, which is empty if the params
+                 have not been pushed yet or have not changed since the given version
+        """
+        if self.params_ref is None or version == self.version:
+            return self.version, []
+        return self.version, [self.params_ref]
+
+    def pull_values(self):
+        """
+        No effect on the server.
+        :return: current version and the params
         """
-        return self.params
+        return self.version, self.params
+
+
+def pull_params(param_server, version=None):
+    """
+    :param param_server: ParamServer actor handle
+    :param version: version of the params the puller already has
+    :return: current version and the params, or None if there are no new params
+    """
+    version, params_refs = ray.get(param_server.pull.remote(version))
+    if not params_refs:
+        return version, None
+    try:
+        return version, ray.get(params_refs[0])
+    except UnreconstructableError:
+        return ray.get(param_server.pull_values.remote())
+
+
+def pull_samples(data_buffer):
+    """
+    :param data_buffer: DataBuffer actor handle
+    :return: list of the samples_data dicts pushed since the last pull
+    """
+    samples_data_refs = ray.get(data_buffer.pull.remote())
+    try:
+        return ray.get(samples_data_refs)
+    except UnreconstructableError:
+        return ray.get(data_buffer.pull_values.remote())
 
 
 @ray.remote
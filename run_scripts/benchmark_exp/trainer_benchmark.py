@@ -0,0 +1,290 @@
+"""
+Throughput benchmark of the sequential and the parallel (three-worker) trainers on the pure-Python environments.
+Every (trainer, env, seed) case is run in its own process through the run_experiment function of the corresponding
+run_sweep script, the steady-state metrics are extracted from the progress.csv files written by the trainer / the
+workers and the results of all cases are dumped as json.
+
+Usage:
+    python -m run_scripts.benchmark_exp.trainer_benchmark --output benchmark.json
+"""
+import os
+import csv
+import json
+import glob
+import time
+import resource
+import argparse
+import importlib
+import numpy as np
+from multiprocessing import Process, Pipe, active_children
+from tensorflow import tanh
+from asynch_mb.baselines.linear_baseline import LinearFeatureBaseline
+from asynch_mb.envs.mb_envs import PendulumEnv, CartPoleEnv, Continuous_MountainCarEnv, AcrobotEnv
+
+ENVS = {
+    'Pendulum': PendulumEnv,
+    'CartPole': CartPoleEnv,
+    'MountainCar': Continuous_MountainCarEnv,
+    'Acrobot': AcrobotEnv,
+}
+
+WORKER_NAMES = ['Data', 'Model', 'Policy']
+
+COMMON_PARAMS = {
+    'seed': 1,
+    'n_itr': 20,
+    'baseline': LinearFeatureBaseline,
+    'max_path_length': 200,
+    'discount': 0.99,
+    'gae_lambda': 1,
+    'normalize_adv': True,
+    'positive_adv': False,
+
+    # Dynamics Model
+    'num_models': 5,
+    'dynamics_hidden_sizes': (200, 200),
+    'dyanmics_hidden_nonlinearity': 'relu',
+    'dyanmics_output_nonlinearity': None,
+    'dynamics_max_epochs': 10,
+    'dynamics_learning_rate': 1e-3,
+    'dynamics_batch_size': 256,
+    'dynamics_buffer_size': 10000,
+    'rolling_average_persitency': 0.9,
+    'deterministic': False,
+
+    # Policy
+    'policy_hidden_sizes': (64, 64),
+    'policy_learn_std': True,
+    'policy_hidden_nonlinearity': tanh,
+    'policy_output_nonlinearity': None,
+
+    'scope': None,
+    'exp_tag': 'benchmark',
+}
+
+PARALLEL_PARAMS = {
+    'flags_need_query': [False, False, False],
+    'num_rollouts': 1,
+    'simulation_sleep_frac': 0,  # measure the raw throughput, do not emulate real time simulation
+    'log_real_performance': True,
+    'loss_str': 'MSE',
+    'initial_random_samples': True,
+}
+
+TRAINERS = {
+    'parallel-metrpo': ('run_scripts.parallel_exp.parallel_metrpo_run_sweep', True, dict(
+        PARALLEL_PARAMS,
+        algo='metrpo',
+        steps_per_iter=1,
+        n_parallel=1,
+        pipelined=False,
+        clip_eps=0.3,
+        num_ppo_steps=5,
+        step_size=0.001,
+        imagined_num_rollouts=50,
+    )),
+    'parallel-mbmpo': ('run_scripts.parallel_exp.parallel_mbmpo_run_sweep', True, dict(
+        PARALLEL_PARAMS,
+        algo='mbmpo',
+        sampler_str='bptt',
+        meta_steps_per_iter=1,
+        real_env_rollouts_per_meta_task=1,
+        parallel=False,
+        fraction_meta_batch_size=0.5,
+        meta_batch_size=10,
+        rollouts_per_meta_task=20,
+        num_inner_grad_steps=1,
+        inner_lr=0.001,
+        inner_type='log_likelihood',
+        step_size=0.01,
+        exploration=False,
+        sample_from_buffer=False,
+    )),
+    'sequential-metrpo': ('run_scripts.sequential_exp.me_trpo_run_sweep', False, dict(
+        algo='me-trpo',
+        log_real_performance=True,
+        steps_per_iter=(10, 10),
+        num_rollouts=5,
+        n_parallel=1,
+        step_size=0.01,
+        imagined_num_rollouts=50,
+        sample_from_buffer=True,
+    )),
+    'sequential-mbmpo': ('run_scripts.sequential_exp.mbmpo_run_sweep', False, dict(
+        algo='mb-mpo',
+        log_real_performance=False,
+        meta_steps_per_iter=(10, 10),
+        parallel=False,
+        fraction_meta_batch_size=0.5,
+        real_env_rollouts_per_meta_task=1,
+        meta_batch_size=10,
+        rollouts_per_meta_task=20,
+        num_inner_grad_steps=1,
+        inner_lr=0.001,
+        inner_type='log_likelihood',
+        step_size=0.01,
+        exploration=False,
+        sample_from_buffer=True,
+    )),
+}
+
+
+def run_case(sender, case_dir, module_name, params):
+    """ runs one benchmark case, must be executed in a fresh process """
+    os.makedirs(case_dir, exist_ok=True)
+    os.chdir(case_dir)
+    time_total = time.time()
+    importlib.import_module(module_name).run_experiment(**params)
+    time_total = time.time() - time_total
+
+    # reap the workers such that their peak memory is accounted in RUSAGE_CHILDREN
+    for p in active_children():
+        p.join()
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    sender.send(dict(time_total=time_total, peak_rss_mb=peak_rss / 1024))
+    sender.close()
+
+
+def read_progress(filename):
+    """
+    Returns:
+        (dict) : column name -> np.ndarray (missing entries are nan)
+    """
+    with open(filename, 'r') as f:
+        rows = list(csv.DictReader(f))
+    keys = set().union(*[row.keys() for row in rows]) if rows else set()
+    return {key: np.array([_to_float(row.get(key)) for row in rows]) for key in keys}
+
+
+def steady_state(values, warmup_frac):
+    values = values[int(len(values) * warmup_frac):]
+    return values[~np.isnan(values)]
+
+
+def rate(progress, count_key, time_key, warmup_frac):
+    """ increase of count_key per second during the steady state """
+    if count_key not in progress or time_key not in progress:
+        return None
+    start = int(len(progress[time_key]) * warmup_frac)
+    counts, times = progress[count_key][start:], progress[time_key][start:]
+    valid = ~(np.isnan(counts) | np.isnan(times))
+    counts, times = counts[valid], times[valid]
+    if len(times) < 2 or times[-1] <= times[0]:
+        return None
+    return float((counts[-1] - counts[0]) / (times[-1] - times[0]))
+
+
+def mean_of(progress, key, warmup_frac):
+    if key not in progress:
+        return None
+    values = steady_state(progress[key], warmup_frac)
+    return float(np.mean(values)) if len(values) else None
+
+
+def mean_of_suffix(progress, suffix, warmup_frac):
+    """ the trainers differ in the prefixes of the logged keys """
+    keys = sorted(key for key in progress if key.endswith(suffix))
+    return mean_of(progress, keys[0], warmup_frac) if keys else None
+
+
+def parallel_metrics(exp_dir, warmup_frac):
+    progress = {name: read_progress(os.path.join(exp_dir, name, 'progress.csv')) for name in WORKER_NAMES}
+    metrics = dict(workers=dict())
+    for name in WORKER_NAMES:
+        metrics['workers'][name] = dict(
+            steps_per_sec=rate(progress[name], name + '-TotalStep', name + '-TimeSoFar', warmup_frac),
+            # time the data pushed by the previous worker waits in the queue until it is taken out by this worker
+            queue_latency=mean_of(progress[name], name + '-QueueLatency', warmup_frac),
+            # number of own iterations between two synchronizations with the previous worker
+            sync_lag=mean_of(progress[name], name + '-StepPerSynch', warmup_frac),
+            # fractions of the wall clock time spent in step / push / synch, blocked on the queue and in the loop
+            busy_frac=mean_of(progress[name], name + '-BusyFrac', warmup_frac),
+            blocked_frac=mean_of(progress[name], name + '-BlockedFrac', warmup_frac),
+            idle_frac=mean_of(progress[name], name + '-IdleFrac', warmup_frac),
+        )
+    metrics['env_steps_per_sec'] = rate(progress['Data'], 'Data-EnvSampler-TimeStepsCtr', 'Data-TimeSoFar',
+                                        warmup_frac)
+    time_epoch = mean_of(progress['Model'], 'Model-TimeStep', warmup_frac)
+    metrics['model_epochs_per_sec'] = 1 / time_epoch if time_epoch else None
+    metrics['cg_time_per_update'] = mean_of_suffix(progress['Policy'], 'TimeOptimize', warmup_frac)
+    return metrics
+
+
+def sequential_metrics(exp_dir, warmup_frac):
+    progress = read_progress(os.path.join(exp_dir, 'progress.csv'))
+    time_itr = mean_of(progress, 'ItrTime', warmup_frac)
+    metrics = dict(workers=dict(Trainer=dict(
+        steps_per_sec=1 / time_itr if time_itr else None,
+        queue_latency=0.,
+        sync_lag=0.,
+    )))
+    metrics['env_steps_per_sec'] = rate(progress, 'n_timesteps', 'Time', warmup_frac)
+    epochs = mean_of_suffix(progress, 'AvgEpochs', warmup_frac)
+    time_fit = mean_of_suffix(progress, 'ModelFit', warmup_frac)
+    metrics['model_epochs_per_sec'] = epochs / time_fit if epochs and time_fit else None
+    # the sequential trainers take several policy steps per iteration, each logged with its own prefix
+    time_optimize = [mean_of(progress, key, warmup_frac) for key in progress if key.endswith('TimeOptimize')]
+    time_optimize = [value for value in time_optimize if value is not None]
+    metrics['cg_time_per_update'] = float(np.mean(time_optimize)) if time_optimize else None
+    return metrics
+
+
+def find_exp_dir(case_dir):
+    # the parallel trainers also dump the params into the directories of the workers
+    filenames = glob.glob(os.path.join(case_dir, 'data', '**', 'params.json'), recursive=True)
+    if not filenames:
+        raise FileNotFoundError('no experiment found in {}'.format(case_dir))
+    return os.path.dirname(min(filenames, key=len))
+
+
+def benchmark(trainers, envs, seeds, n_itr, output_dir, warmup_frac):
+    results = []
+    for trainer_name in trainers:
+        module_name, is_parallel, trainer_params = TRAINERS[trainer_name]
+        for env_name in envs:
+            for seed in seeds:
+                params = dict(COMMON_PARAMS, **trainer_params)
+                params.update(seed=seed, n_itr=n_itr, env=env_name if is_parallel else ENVS[env_name])
+                case_dir = os.path.abspath(os.path.join(output_dir, trainer_name, env_name, 'seed_%d' % seed))
+
+                receiver, sender = Pipe()
+                p = Process(target=run_case, name=trainer_name, args=(sender, case_dir, module_name, params))
+                p.start()
+                result = receiver.recv()
+                p.join()
+
+                exp_dir = find_exp_dir(case_dir)
+                if is_parallel:
+                    result.update(parallel_metrics(exp_dir, warmup_frac))
+                else:
+                    result.update(sequential_metrics(exp_dir, warmup_frac))
+                result.update(trainer=trainer_name, env=env_name, seed=seed, n_itr=n_itr)
+                results.append(result)
+                print(json.dumps(result, sort_keys=True))
+    return results
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trainers', nargs='+', default=list(TRAINERS.keys()), choices=list(TRAINERS.keys()))
+    parser.add_argument('--envs', nargs='+', default=list(ENVS.keys()), choices=list(ENVS.keys()))
+    parser.add_argument('--seeds', nargs='+', type=int, default=[1, 2])
+    parser.add_argument('--n_itr', type=int, default=20,
+                        help='number of iterations of each trainer / worker')
+    parser.add_argument('--warmup_frac', type=float, default=0.2,
+                        help='fraction of the logged iterations that are discarded as warm up')
+    parser.add_argument('--output_dir', type=str, default=os.path.join(os.getcwd(), 'data', 'benchmark'))
+    parser.add_argument('--output', type=str, default='benchmark.json', help='json file with the results')
+    args = parser.parse_args()
+
+    results = benchmark(args.trainers, args.envs, args.seeds, args.n_itr, args.output_dir, args.warmup_frac)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
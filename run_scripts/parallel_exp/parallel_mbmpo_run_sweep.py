@@ -7,7 +7,8 @@ from multiprocessing import Process, Pipe
 from run_scripts.run_sweep import run_sweep_serial
 from asynch_mb.utils.utils import set_seed, ClassEncoder
 from asynch_mb.baselines.linear_baseline import LinearFeatureBaseline
-from asynch_mb.envs.mb_envs import AntEnv, Walker2dEnv, HalfCheetahEnv, HopperEnv
+from asynch_mb.envs.mb_envs import AntEnv, Walker2dEnv, HalfCheetahEnv, HopperEnv, \
+    PendulumEnv, CartPoleEnv, Continuous_MountainCarEnv, AcrobotEnv
 from asynch_mb.trainers.parallel_mbmpo_trainer import ParallelTrainer
 from asynch_mb.policies.meta_gaussian_mlp_policy import MetaGaussianMLPPolicy
 from asynch_mb.dynamics.mlp_dynamics_ensemble import MLPDynamicsEnsemble
@@ -51,6 +52,9 @@ def run_base(exp_dir, **kwargs):
     config = ConfigProto()
     config.gpu_options.allow_growth = True
     config.gpu_options.per_process_gpu_memory_fraction = kwargs.get('gpu_frac', 0.95)
+    # set by run_sweep_parallel to the number of cores of the run, 0 lets tf use all cores
+    config.intra_op_parallelism_threads = kwargs.get('intra_op_threads', 0)
+    config.inter_op_parallelism_threads = kwargs.get('inter_op_threads', 0)
 
     # Instantiate classes
     set_seed(kwargs['seed'])
@@ -69,6 +73,18 @@ def run_base(exp_dir, **kwargs):
     elif kwargs['env'] == 'Walker2d':
         env = Walker2dEnv()
         simulation_sleep = 0.008 * kwargs['num_rollouts'] * kwargs['max_path_length'] * kwargs['simulation_sleep_frac']
+    elif kwargs['env'] == 'Pendulum':
+        env = PendulumEnv()
+        simulation_sleep = 0.05 * kwargs['num_rollouts'] * kwargs['max_path_length'] * kwargs['simulation_sleep_frac']
+    elif kwargs['env'] == 'CartPole':
+        env = CartPoleEnv()
+        simulation_sleep = 0.02 * kwargs['num_rollouts'] * kwargs['max_path_length'] * kwargs['simulation_sleep_frac']
+    elif kwargs['env'] == 'MountainCar':
+        env = Continuous_MountainCarEnv()
+        simulation_sleep = 0.02 * kwargs['num_rollouts'] * kwargs['max_path_length'] * kwargs['simulation_sleep_frac']
+    elif kwargs['env'] == 'Acrobot':
+        env = AcrobotEnv()
+        simulation_sleep = 0.2 * kwargs['num_rollouts'] * kwargs['max_path_length'] * kwargs['simulation_sleep_frac']
     else:
         raise NotImplementedError
 
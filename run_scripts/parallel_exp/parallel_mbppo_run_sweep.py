@@ -52,6 +52,9 @@ def run_base(exp_dir, **kwargs):
     config = ConfigProto()
     config.gpu_options.allow_growth = True
     config.gpu_options.per_process_gpu_memory_fraction = kwargs.get('gpu_frac', 0.95)
+    # set by run_sweep_parallel to the number of cores of the run, 0 lets tf use all cores
+    config.intra_op_parallelism_threads = kwargs.get('intra_op_threads', 0)
+    config.inter_op_parallelism_threads = kwargs.get('inter_op_threads', 0)
 
     # Instantiate classes
     set_seed(kwargs['seed'])
@@ -1,13 +1,15 @@
 import os
 import json
+import argparse
 import pickle
 import numpy as np
 from tensorflow import tanh, ConfigProto
 from multiprocessing import Process, Pipe
-from run_scripts.run_sweep import run_sweep_serial
+from run_scripts.run_sweep import run_sweep_serial, run_sweep_parallel
 from asynch_mb.utils.utils import set_seed, ClassEncoder
 from asynch_mb.baselines.linear_baseline import LinearFeatureBaseline
-from asynch_mb.envs.mb_envs import HalfCheetahEnv, Walker2dEnv, AntEnv, HopperEnv
+from asynch_mb.envs.mb_envs import HalfCheetahEnv, Walker2dEnv, AntEnv, HopperEnv, \
+    PendulumEnv, CartPoleEnv, Continuous_MountainCarEnv, AcrobotEnv
 from asynch_mb.envs.normalized_env import normalize
 from asynch_mb.trainers.parallel_metrpo_trainer import ParallelTrainer
 from asynch_mb.policies.gaussian_mlp_policy import GaussianMLPPolicy
@@ -52,6 +54,9 @@ def run_base(exp_dir, **kwargs):
     config = ConfigProto()
     config.gpu_options.allow_growth = True
     config.gpu_options.per_process_gpu_memory_fraction = kwargs.get('gpu_frac', 0.95)
+    # set by run_sweep_parallel to the number of cores of the run, 0 lets tf use all cores
+    config.intra_op_parallelism_threads = kwargs.get('intra_op_threads', 0)
+    config.inter_op_parallelism_threads = kwargs.get('inter_op_threads', 0)
 
     # Instantiate classes
     set_seed(kwargs['seed'])
@@ -70,6 +75,18 @@ def run_base(exp_dir, **kwargs):
     elif kwargs['env'] == 'Walker2d':
         env = normalize(Walker2dEnv())
         simulation_sleep = 0.008 * kwargs['num_rollouts'] * kwargs['max_path_length'] * kwargs['simulation_sleep_frac']
+    elif kwargs['env'] == 'Pendulum':
+        env = normalize(PendulumEnv())
+        simulation_sleep = 0.05 * kwargs['num_rollouts'] * kwargs['max_path_length'] * kwargs['simulation_sleep_frac']
+    elif kwargs['env'] == 'CartPole':
+        env = normalize(CartPoleEnv())
+        simulation_sleep = 0.02 * kwargs['num_rollouts'] * kwargs['max_path_length'] * kwargs['simulation_sleep_frac']
+    elif kwargs['env'] == 'MountainCar':
+        env = normalize(Continuous_MountainCarEnv())
+        simulation_sleep = 0.02 * kwargs['num_rollouts'] * kwargs['max_path_length'] * kwargs['simulation_sleep_frac']
+    elif kwargs['env'] == 'Acrobot':
+        env = normalize(AcrobotEnv())
+        simulation_sleep = 0.2 * kwargs['num_rollouts'] * kwargs['max_path_length'] * kwargs['simulation_sleep_frac']
     else:
         raise NotImplementedError
 
@@ -119,6 +136,7 @@ def run_base(exp_dir, **kwargs):
             'num_rollouts': kwargs['num_rollouts'],
             'max_path_length': kwargs['max_path_length'],
             'n_parallel': kwargs['n_parallel'],
+            'pipelined': kwargs['pipelined'],
         },
         'dynamics_sample_processor': {
             'discount': kwargs['discount'],
@@ -165,6 +183,13 @@ def run_base(exp_dir, **kwargs):
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_parallel', type=int, default=1,
+                        help='number of concurrent runs, 1 runs the sweep serially in this process')
+    parser.add_argument('--cores_per_run', type=int, default=None, help='number of cores pinned to each run')
+    parser.add_argument('--ledger', type=str, default=None,
+                        help='json-lines file recording the finished runs, used to resume the sweep')
+    args = parser.parse_args()
 
     sweep_params = {
 
@@ -196,6 +221,7 @@ if __name__ == '__main__':
 
         # Real Env Sampling
         'n_parallel': [1],
+        'pipelined': [False],  # requires an even n_parallel
 
         # Dynamics Model
         'num_models': [5],
@@ -226,5 +252,9 @@ if __name__ == '__main__':
 
     }
 
-    run_sweep_serial(run_experiment, sweep_params)
+    if args.num_parallel > 1:
+        run_sweep_parallel(run_experiment, sweep_params, num_parallel=args.num_parallel,
+                           cores_per_run=args.cores_per_run, ledger_file=args.ledger)
+    else:
+        run_sweep_serial(run_experiment, sweep_params)
 
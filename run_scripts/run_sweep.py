@@ -1,4 +1,9 @@
+import os
+import json
+import time
 import itertools
+import multiprocessing
+from multiprocessing.connection import wait
 from datetime import datetime
 
 
@@ -24,3 +29,110 @@ def run_sweep_serial(run_method, params, repeat=1):
     sweeper = Sweeper(params, repeat, include_name=True)
     for config in sweeper:
         run_method(**config)
+
+
+def run_sweep_parallel(run_method, params, repeat=1, num_parallel=None, cores_per_run=None, ledger_file=None):
+    """
+    Runs the configurations of the sweep concurrently on the CPU. Each run is executed in its own process, which is
+    pinned to its own set of cores (inherited by the processes it starts), and receives the number of cores as
+    intra_op_threads / inter_op_threads kwargs to limit the thread pools of its tf sessions.
+
+    Finished runs are appended to a json-lines ledger, so a restarted sweep skips the configurations that already
+    completed successfully. Failed runs are recorded as well and retried on restart.
+
+    Args:
+        run_method (callable) : method that runs a single experiment given the config as kwargs
+        params (dict) : dict of lists with the values of each hyperparameter
+        repeat (int) : number of runs of each configuration
+        num_parallel (int or None) : number of concurrent runs, defaults to the number of cores // cores_per_run
+        cores_per_run (int or None) : number of cores per run, defaults to the number of cores // num_parallel
+        ledger_file (str or None) : path of the ledger, defaults to sweep_ledger.jsonl in the working directory
+
+    Returns:
+        (dict) : wall clock accounting of the sweep
+    """
+    cores = sorted(os.sched_getaffinity(0))
+    if num_parallel is None:
+        num_parallel = max(len(cores) // (cores_per_run or 1), 1)
+    if cores_per_run is None:
+        cores_per_run = max(len(cores) // num_parallel, 1)
+    assert num_parallel * cores_per_run <= len(cores), "not enough cores for %d runs with %d cores each" % (
+        num_parallel, cores_per_run)
+    slots = [cores[i * cores_per_run:(i + 1) * cores_per_run] for i in range(num_parallel)]
+
+    ledger_file = ledger_file or os.path.join(os.getcwd(), 'sweep_ledger.jsonl')
+    finished = set(entry['key'] for entry in _read_ledger(ledger_file) if entry['status'] == 'done')
+
+    pending, num_skipped = [], 0
+    for key, config in _keyed_configs(Sweeper(params, repeat, include_name=True)):
+        if key in finished:
+            print('skipping finished run {}'.format(key))
+            num_skipped += 1
+        else:
+            pending.append((key, config))
+
+    time_start = time.time()
+    free_slots, running = list(range(num_parallel)), dict()
+    num_done, num_failed, time_runs = 0, 0, 0.
+    while pending or running:
+        while pending and free_slots:
+            key, config = pending.pop(0)
+            slot = free_slots.pop(0)
+            config.update(intra_op_threads=len(slots[slot]), inter_op_threads=len(slots[slot]))
+            p = multiprocessing.Process(target=_run_pinned, args=(run_method, config, slots[slot]))
+            p.start()
+            running[p.sentinel] = (p, key, config, slot, time.time())
+
+        # sleep until at least one run terminates
+        for sentinel in wait(list(running.keys())):
+            p, key, config, slot, time_run = running.pop(sentinel)
+            p.join()
+            time_run = time.time() - time_run
+            status = 'done' if p.exitcode == 0 else 'failed'
+            num_done, num_failed = num_done + (status == 'done'), num_failed + (status == 'failed')
+            time_runs += time_run
+            free_slots.append(slot)
+            _append_ledger(ledger_file, dict(key=key, exp_name=config.get('exp_name'), status=status,
+                                             exitcode=p.exitcode, wall_time=time_run, cores=slots[slot]))
+            print('run {} {} after {:.1f}s'.format(key, status, time_run))
+
+    time_sweep = time.time() - time_start
+    summary = dict(num_done=num_done, num_failed=num_failed, num_skipped=num_skipped, wall_time=time_sweep,
+                   run_time=time_runs, speedup=time_runs / time_sweep if time_sweep > 0 else 0.)
+    print('sweep finished: {}'.format(json.dumps(summary, sort_keys=True)))
+    return summary
+
+
+def _run_pinned(run_method, config, cores):
+    os.sched_setaffinity(0, cores)
+    os.environ['OMP_NUM_THREADS'] = str(len(cores))
+    run_method(**config)
+
+
+def _keyed_configs(sweeper):
+    """
+    Identifies each configuration by its hyperparameters (without the timestamped exp_name) and its repetition
+    """
+    counts = dict()
+    for config in sweeper:
+        params_str = json.dumps({key: value for key, value in config.items() if key != 'exp_name'},
+                                sort_keys=True, default=_qualified_name)
+        counts[params_str] = counts.get(params_str, -1) + 1
+        yield '%s#%d' % (params_str, counts[params_str]), config
+
+
+def _qualified_name(obj):
+    """ json encoding of the classes and functions in the configurations """
+    return '%s.%s' % (getattr(obj, '__module__', ''), getattr(obj, '__name__', repr(obj)))
+
+
+def _read_ledger(ledger_file):
+    if not os.path.exists(ledger_file):
+        return []
+    with open(ledger_file, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _append_ledger(ledger_file, entry):
+    with open(ledger_file, 'a') as f:
+        f.write(json.dumps(entry, sort_keys=True) + '\n')
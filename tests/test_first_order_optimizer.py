@@ -0,0 +1,35 @@
+from asynch_mb.algos.ppo import PPO
+from asynch_mb.policies.gaussian_mlp_policy import GaussianMLPPolicy
+
+import numpy as np
+import tensorflow as tf
+import unittest
+
+
+class TestFirstOrderOptimizer(unittest.TestCase):
+
+    def test_ppo_optimize_minibatches(self):
+        obs_dim, action_dim, batch_size = 3, 2, 20
+        with tf.Graph().as_default(), tf.Session() as sess:
+            policy = GaussianMLPPolicy(obs_dim=obs_dim, action_dim=action_dim, name='policy', hidden_sizes=(8,))
+            algo = PPO(policy=policy, max_epochs=2, num_minibatches=4)
+            sess.run(tf.global_variables_initializer())
+
+            input_dict = {
+                'train_observations': np.random.normal(size=(batch_size, obs_dim)),
+                'train_actions': np.random.normal(size=(batch_size, action_dim)),
+                'train_advantages': np.random.normal(size=(batch_size,)),
+                'train_agent_infos/mean': np.zeros((batch_size, action_dim)),
+                'train_agent_infos/log_std': np.zeros((batch_size, action_dim)),
+            }
+            params_before = sess.run(policy.get_params())
+            expected_loss_before = algo.optimizer.loss(input_dict)
+            loss_before = algo.optimizer.optimize(input_val_dict=input_dict)
+            params_after = sess.run(policy.get_params())
+
+            self.assertAlmostEqual(loss_before, expected_loss_before, places=5)
+            self.assertTrue(any(not np.allclose(params_before[key], params_after[key]) for key in params_before))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+from asynch_mb.meta_algos.trpo_maml import TRPOMAML
+from asynch_mb.policies.meta_gaussian_mlp_policy import MetaGaussianMLPPolicy
+
+from collections import OrderedDict
+import numpy as np
+import tensorflow as tf
+import unittest
+
+
+class TestMAMLInnerAdaptation(unittest.TestCase):
+
+    def test_batched_adaptation_matches_per_task_graph(self):
+        obs_dim, action_dim, meta_batch_size, inner_lr = 3, 2, 2, 0.1
+        num_samples = [5, 3]
+        with tf.Graph().as_default(), tf.Session() as sess:
+            policy = MetaGaussianMLPPolicy(meta_batch_size=meta_batch_size, obs_dim=obs_dim, action_dim=action_dim,
+                                           name='meta_policy', hidden_sizes=(8,))
+            algo = TRPOMAML(policy=policy, inner_lr=inner_lr, meta_batch_size=meta_batch_size,
+                            inner_type='log_likelihood')
+            sess.run(tf.global_variables_initializer())
+
+            # give every task its own params, in particular its own std
+            policy.switch_to_pre_update()
+            params_vals = []
+            for task_params in policy.policies_params_vals:
+                params_vals.append(OrderedDict((key, value + np.random.normal(scale=0.1, size=value.shape))
+                                               for key, value in task_params.items()))
+            policy.policies_params_vals = params_vals
+
+            samples = [dict(observations=np.random.normal(size=(n, obs_dim)).astype(np.float32),
+                            actions=np.random.normal(size=(n, action_dim)).astype(np.float32),
+                            advantages=np.random.normal(size=(n,)).astype(np.float32),
+                            agent_infos=dict(mean=np.zeros((n, action_dim), dtype=np.float32),
+                                             log_std=np.zeros((n, action_dim), dtype=np.float32)))
+                       for n in num_samples]
+
+            # reference: the adapted params of each task from its own graph
+            expected = []
+            for task_params, task_samples in zip(params_vals, samples):
+                params = OrderedDict((key, tf.constant(task_params[key], dtype=tf.float32))
+                                     for key in policy.policy_params_keys)
+                dist_info_new = policy.distribution_info_sym(tf.constant(task_samples['observations']), params=params)
+                dist_info_old = dict((key, tf.constant(value)) for key, value in task_samples['agent_infos'].items())
+                surr_obj = algo._adapt_objective_sym(tf.constant(task_samples['actions']),
+                                                     tf.constant(task_samples['advantages']),
+                                                     dist_info_old, dist_info_new)
+                grads = tf.gradients(surr_obj, list(params.values()))
+                expected.append(sess.run(OrderedDict((key, params[key] - inner_lr * grad)
+                                                     for key, grad in zip(params.keys(), grads))))
+
+            algo._adapt(samples)
+
+            for task_params, expected_params in zip(policy.policies_params_vals, expected):
+                for key in policy.policy_params_keys:
+                    np.testing.assert_allclose(task_params[key], expected_params[key], rtol=1e-4, atol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
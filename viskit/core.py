@@ -20,6 +20,10 @@ def flatten(l):
 
 def load_progress(progress_csv_path):
     print("Reading %s" % progress_csv_path)
+    if progress_csv_path.endswith('.bin'):
+        from asynch_mb.logger.logger import read_columnar_progress
+        entries = read_columnar_progress(progress_csv_path, fill_value=0.)
+        return dict([(k, np.array(v)) for k, v in entries.items()])
     entries = dict()
     with open(progress_csv_path, 'r') as csvfile:
         reader = csv.DictReader(csvfile)
@@ -101,6 +105,8 @@ def load_exps_data(exp_folder_paths, disable_variant=False):
             params_json_path = os.path.join(exp_path, "params.json")
             variant_json_path = os.path.join(exp_path, "variant.json")
             progress_csv_path = os.path.join(exp_path, "progress.csv")
+            if not os.path.exists(progress_csv_path) and os.path.exists(os.path.join(exp_path, "progress.bin")):
+                progress_csv_path = os.path.join(exp_path, "progress.bin")
             progress = load_progress(progress_csv_path)
             if disable_variant:
                 params = load_params(params_json_path)